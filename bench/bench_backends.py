@@ -0,0 +1,82 @@
+"""
+Benchmark: json files against the SQLite backend
+
+For each size, N books, N transactions and N/10 users are generated, then
+both backends are timed on opening the data, a point lookup, a checkout
+(including its save) and a full scan of the books.
+
+Run: `python -m bench.bench_backends [size ...]`
+(defaults to 10000 100000 1000000)
+"""
+
+import contextlib
+import io
+import sys
+import time
+
+from bench.common import temp_storage
+from script.check import TransactionManagement
+from script.storage import Storage
+
+
+def measure(backend: str, size: int) -> dict:
+    """Times the operations on one backend
+
+    Args:
+        backend (str): 'json' or 'sqlite'
+        size (int): number of books and of transactions
+
+    Returns:
+        dict: operation name -> seconds
+    """
+    results = {}
+    with temp_storage(
+        size, max(size // 10, 1), size, journal=True, backend=backend
+    ) as storage:
+        # open again as a later run would, sqlite already imported the
+        # json files on the first open
+        if getattr(storage, "connection", None) is not None:
+            storage.connection.close()
+        Storage._instance = None
+        start = time.perf_counter()
+        storage = Storage()
+        results["open"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(0, size, max(size // 1000, 1)):
+            storage.data["books"].get(f"b{i:07d}")
+        results["1k lookups"] = time.perf_counter() - start
+
+        tm = TransactionManagement(storage)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tm.check_out("1", f"b{size - 1:07d}")
+        results["checkout"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sum(1 for book in storage.data["books"].values() if book["available"])
+        results["scan books"] = time.perf_counter() - start
+    return results
+
+
+def main(*sizes: int):
+    sizes = sizes or (10_000, 100_000, 1_000_000)
+    operations = ["open", "1k lookups", "checkout", "scan books"]
+    print(
+        f"{'size':>9}{'backend':>9}"
+        + "".join(f"{operation:>13}" for operation in operations)
+    )
+    for size in sizes:
+        for backend in ["json", "sqlite"]:
+            results = measure(backend, size)
+            print(
+                f"{size:>9}{backend:>9}"
+                + "".join(
+                    f"{results[operation] * 1000:>11.1f}ms"
+                    for operation in operations
+                )
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""
+Benchmark: batch command runner, against how often it commits
+
+Runs the same generated commands (checkouts and checkins of existing
+books, plus new books) with a save after every command, every 100
+commands, and once at the end. Also times the full load a separate
+launch per command would pay on top.
+
+Run: `python -m bench.bench_batch [commands]` (defaults to 600)
+"""
+
+import io
+import sys
+import time
+
+from bench.common import temp_storage
+from script.batch import BatchRunner
+
+
+def make_commands(count: int, start: int) -> list:
+    """Generates command lines: a checkout, its checkin, then a new book"""
+    lines = []
+    for i in range(start, start + count // 3):
+        lines.append(f"check_out {i % 1000 + 1} b{i:07d}\n")
+        lines.append(f"check_in {i % 1000 + 1} b{i:07d}\n")
+        lines.append(f'add_book "new title {i}" "new author" z{i:07d}\n')
+    return lines
+
+
+def main(count: int = 600):
+    with temp_storage(
+        books=10000, users=1000, transactions=0, journal=True
+    ) as storage:
+        start = time.perf_counter()
+        storage.load_data()
+        load = time.perf_counter() - start
+        print(f"full load, paid by every launch: {load * 1000:.0f} ms\n")
+
+        print(f"{'commit every':>13}{'commits':>9}{'ops/s':>10}")
+        for run, commit_every in enumerate([1, 100, 0]):
+            lines = make_commands(count, run * count)
+            summary = BatchRunner(storage).run(
+                lines, commit_every=commit_every, output=io.StringIO()
+            )
+            label = commit_every or "end"
+            print(
+                f"{label:>13}{summary['commits']:>9}"
+                f"{summary['ops_per_sec']:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,83 @@
+"""
+Benchmark: transaction analytics, record loops against the NumPy columns
+
+Each query is answered once by looping over the transaction records and
+once by the columnar copy from `Storage.transaction_columns()`. Building
+the columns is timed separately, later calls only convert new
+transactions.
+
+Run: `python -m bench.bench_columns [transactions]` (defaults to 1000000)
+"""
+
+import sys
+import time
+from collections import Counter
+
+from bench.common import temp_storage
+
+
+def timed(function, repeat: int = 5) -> tuple:
+    """Runs function repeat times and returns (result, ms per run)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) * 1000 / repeat
+
+
+def main(count: int = 1_000_000):
+    with temp_storage(books=10000, users=1000, transactions=count) as storage:
+        transactions = storage.data["transactions"]
+
+        start = time.perf_counter()
+        columns = storage.transaction_columns()
+        print(
+            f"Built columns of {count} transactions in "
+            f"{time.perf_counter() - start:.2f}s\n"
+        )
+
+        start_time, end_time = "2024-03-17T13:10:00", "2024-03-17T13:20:00"
+        queries = [
+            (
+                "count checkouts",
+                lambda: sum(
+                    1 for item in transactions if item["action"] == "checkout"
+                ),
+                lambda: columns.count(action="checkout"),
+            ),
+            (
+                "user's checkouts",
+                lambda: sum(
+                    1
+                    for item in transactions
+                    if item["user_id"] == "7" and item["action"] == "checkout"
+                ),
+                lambda: columns.count(user_id="7", action="checkout"),
+            ),
+            (
+                "time window",
+                lambda: sum(
+                    1
+                    for item in transactions
+                    if start_time <= item["timestamp"] < end_time
+                ),
+                lambda: columns.count(start=start_time, end=end_time),
+            ),
+            (
+                "counts per book",
+                lambda: len(Counter(item["isbn"] for item in transactions)),
+                lambda: len(columns.counts_by("isbn")),
+            ),
+        ]
+
+        print(f"{'query':<20}{'loop ms':>12}{'columns ms':>12}{'result':>10}")
+        for label, loop, vectorized in queries:
+            expected, loop_ms = timed(loop, repeat=1)
+            result, columns_ms = timed(vectorized)
+            assert result == expected, (label, result, expected)
+            print(
+                f"{label:<20}{loop_ms:>12.1f}{columns_ms:>12.2f}{result:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
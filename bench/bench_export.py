@@ -0,0 +1,56 @@
+"""
+Benchmark: streaming transactions export, memory against history size
+
+Exports a generated transactions journal of growing size to a file, with
+a time window filter. Memory is traced with tracemalloc: the peak should
+stay flat however long the history is, while time grows with it.
+
+Run: `python -m bench.bench_export [transactions ...]`
+(defaults to 100000 1000000)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.common import make_transactions
+from script import storage as storage_module
+from script.export import export_transactions
+
+
+def main(*counts: int):
+    counts = counts or (100_000, 1_000_000)
+    print(f"{'history':>10}{'exported':>10}{'seconds':>10}{'peak KB':>10}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "transactions.jsonl")
+            with open(path, "w") as file:
+                # generated in chunks, to keep the setup's memory low too
+                for first in range(0, count, 100_000):
+                    size = min(100_000, count - first)
+                    for item in make_transactions(size, 1000, 10000):
+                        file.write(json.dumps(item) + "\n")
+
+            original = storage_module.DATA_FILE_PATHS
+            storage_module.DATA_FILE_PATHS = {"transactions": path}
+            try:
+                tracemalloc.start()
+                start = time.perf_counter()
+                exported = export_transactions(
+                    output=os.path.join(tmp_dir, "export.csv"),
+                    start="2024-03-17T13:10:00",
+                    end="2024-03-17T13:20:00",
+                )
+                seconds = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            finally:
+                storage_module.DATA_FILE_PATHS = original
+        print(f"{count:>10}{exported:>10}{seconds:>10.2f}{peak / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
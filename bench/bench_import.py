@@ -0,0 +1,73 @@
+"""
+Benchmark: bulk book import from CSV and JSON lines feeds
+
+Imports a generated publisher feed, with some rejected rows (bad author,
+repeated isbn), into a storage already holding a catalog. Memory is
+traced with tracemalloc: the peak is compared with what the imported
+books hold, the rest being what reading the feed took.
+
+Run: `python -m bench.bench_import [rows]` (defaults to 300000)
+"""
+
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from bench.common import temp_storage
+from script.book import BookManagement
+
+
+def write_feed(path: str, rows: int) -> None:
+    """Writes a books feed as CSV or JSON lines, by the path's extension"""
+    feed_rows = (
+        {
+            # every 100th row repeats the previous isbn
+            "isbn": f"f{i - (i % 100 == 99):07d}",
+            "title": f"feed title {i % 7000} part {i}",
+            # every 1000th row has an invalid author
+            "author": f"writer {i % 499}" + ("!" if i % 1000 == 0 else ""),
+        }
+        for i in range(rows)
+    )
+    with open(path, "w", newline="") as file:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(file, ["isbn", "title", "author"])
+            writer.writeheader()
+            writer.writerows(feed_rows)
+        else:
+            for row in feed_rows:
+                file.write(json.dumps(row) + "\n")
+
+
+def main(rows: int = 300_000):
+    print(f"{'feed':<8}{'rows':>9}{'added':>9}{'rejected':>10}", end="")
+    print(f"{'rows/s':>10}{'peak MB':>10}{'held MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for extension in [".csv", ".jsonl"]:
+            path = os.path.join(tmp_dir, "feed" + extension)
+            write_feed(path, rows)
+            with temp_storage(
+                books=10000, users=10, transactions=0
+            ) as storage:
+                bm = BookManagement(storage)
+                tracemalloc.start()
+                # keep the benchmark output readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    summary = bm.import_books(path)
+                held, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            print(
+                f"{extension[1:]:<8}{summary['read']:>9}"
+                f"{summary['added']:>9}{summary['rejected']:>10}"
+                f"{summary['rows_per_second']:>10.0f}"
+                f"{peak / 2**20:>10.1f}{held / 2**20:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
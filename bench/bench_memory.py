@@ -0,0 +1,63 @@
+"""
+Benchmark: memory held by the transactions, dicts against slotted records
+
+Reads a generated transactions journal the way Storage does, keeping each
+line as the plain dict json gives, or as a `Transaction` record (fields in
+__slots__, repeated values interned). Memory is traced with tracemalloc,
+'held' is what the loaded list keeps alive, 'peak' the most used while
+loading.
+
+Run: `python -m bench.bench_memory [transactions]` (defaults to 1000000)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from bench.common import make_transactions
+from script.records import Transaction
+
+
+def load_dicts(path: str) -> list:
+    """Loads the journal as plain dicts"""
+    with open(path, "rb") as file:
+        return [json.loads(line) for line in file]
+
+
+def load_records(path: str) -> list:
+    """Loads the journal as Transaction records"""
+    with open(path, "rb") as file:
+        return [Transaction.from_dict(json.loads(line)) for line in file]
+
+
+def traced(function, *args) -> tuple:
+    """Runs function under tracemalloc and returns (held, peak) bytes"""
+    tracemalloc.start()
+    result = function(*args)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return held, peak
+
+
+def main(count: int = 1_000_000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "transactions.jsonl")
+        with open(path, "w") as file:
+            for item in make_transactions(count, users=1000, books=10000):
+                file.write(json.dumps(item, separators=(",", ":")) + "\n")
+
+        print(f"{count} transactions\n")
+        print(f"{'layout':<12}{'held MB':>10}{'peak MB':>10}{'B/item':>10}")
+        for label, function in [("dict", load_dicts), ("slots", load_records)]:
+            held, peak = traced(function, path)
+            print(
+                f"{label:<12}{held / 2**20:>10.1f}{peak / 2**20:>10.1f}"
+                f"{held / count:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""
+Benchmark: book title search, token index against the linear scan
+
+The scan is the old `find_book` loop comparing whole titles. The index
+answers single words, multi-word AND queries and prefix queries.
+
+Run: `python -m bench.bench_search [books]` (defaults to 1000000)
+"""
+
+import sys
+import time
+
+from bench.common import make_books
+from script.indexes import TokenIndex
+
+
+def scan(books: dict, title: str) -> list:
+    """The old find_book search: compare every title"""
+    return [
+        isbn
+        for isbn, book_info in books.items()
+        if "title" in book_info and book_info["title"].lower() == title
+    ]
+
+
+def timed(function, *args, repeat: int = 20) -> tuple:
+    """Runs function repeat times and returns (result, ms per run)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return result, (time.perf_counter() - start) * 1000 / repeat
+
+
+def main(count: int = 1_000_000):
+    books = make_books(count)
+    index = TokenIndex("title")
+    start = time.perf_counter()
+    index.build(books.items())
+    print(
+        f"Indexed {count} books in {time.perf_counter() - start:.2f}s, "
+        f"{len(index._vocabulary)} distinct tokens\n"
+    )
+
+    title = books[f"b{count // 2:07d}"]["title"]
+    found, elapsed = timed(scan, books, title, repeat=3)
+    print(f"{'scan, whole title':<32}{elapsed:>10.3f}ms {len(found):>8} hits")
+
+    queries = [
+        ("index, whole title", title),
+        ("index, one word", f"{count // 2 % 5000}"),
+        ("index, AND of 2 words", f"{count // 2 % 5000} volume"),
+        ("index, prefix", f"volume {str(count // 2)[:-1]}*"),
+    ]
+    for label, query in queries:
+        found, elapsed = timed(index.search, query)
+        print(f"{label:<32}{elapsed:>10.3f}ms {len(found):>8} hits")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
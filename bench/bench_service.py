@@ -0,0 +1,128 @@
+"""
+Benchmark: HTTP service lookups under concurrency, while checkouts save
+
+Opens a growing number of concurrent keep-alive connections to the service
+on localhost, each looking books up by title words, first alone and then
+while one more client checks books out and in (every checkout saves and
+syncs). Lookups per second should grow with the clients and hold up
+while the checkouts run, as they never wait on the event loop.
+
+Run: `python -m bench.bench_service [requests per client]` (defaults to 50)
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from bench.common import temp_storage
+from script.service import LibraryService
+
+
+async def send(reader, writer, method: str, path: str, body=None) -> int:
+    """Sends a request on an open connection and reads the response
+
+    Returns:
+        int: response status
+    """
+    payload = b"" if body is None else json.dumps(body).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+    await reader.readexactly(length)
+    return int(head.split(b" ")[1])
+
+
+async def look_up(port: int, client: int, requests: int) -> list:
+    """Looks books up on one connection
+
+    Returns:
+        list: latency of each request, in seconds
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        await send(
+            reader, writer, "GET", f"/books?q=title+{client * i % 5000}"
+        )
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+    return latencies
+
+
+async def check_out_and_in(port: int, stop: asyncio.Event) -> int:
+    """Checks books out and in until stopped
+
+    Returns:
+        int: number of saves made
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    saves = 0
+    while not stop.is_set():
+        item = {"user_id": "1", "isbn": f"b{saves // 2:07d}"}
+        path = "/checkins" if saves % 2 else "/checkouts"
+        await send(reader, writer, "POST", path, item)
+        saves += 1
+    writer.close()
+    return saves
+
+
+async def run(port: int, clients: int, requests: int, saving: bool):
+    """Runs the lookup clients, with a checkout client if saving
+
+    Returns:
+        tuple: (lookups per second, p50 ms, p99 ms, saves made)
+    """
+    stop = asyncio.Event()
+    changes = (
+        asyncio.create_task(check_out_and_in(port, stop)) if saving else None
+    )
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(look_up(port, client, requests) for client in range(clients))
+    )
+    seconds = time.perf_counter() - start
+    stop.set()
+    saves = await changes if changes is not None else 0
+    latencies = sorted(latency for result in results for latency in result)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return (
+        len(latencies) / seconds,
+        statistics.median(latencies) * 1000,
+        p99 * 1000,
+        saves,
+    )
+
+
+async def main(requests: int = 50):
+    with temp_storage(
+        books=10000, users=1000, transactions=0, journal=True
+    ) as storage:
+        service = LibraryService(storage)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        print(
+            f"{'clients':>8}{'checkouts':>11}{'lookups/s':>11}"
+            f"{'p50 ms':>9}{'p99 ms':>9}{'saves':>7}"
+        )
+        for clients in [1, 10, 100, 1000]:
+            for saving in [False, True]:
+                rate, p50, p99, saves = await run(
+                    port, clients, requests, saving
+                )
+                print(
+                    f"{clients:>8}{'yes' if saving else 'no':>11}{rate:>11.0f}"
+                    f"{p50:>9.2f}{p99:>9.2f}{saves:>7}"
+                )
+        server.close()
+        await server.wait_closed()
+        service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:])))
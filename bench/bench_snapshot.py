@@ -0,0 +1,52 @@
+"""
+Benchmark: startup time against history size, with and without a snapshot
+
+Loads a storage whose transactions journal holds the whole history, then
+checkpoints it (snapshot of users and books, journal archived to a
+segment) and loads it again with a short tail of new transactions. The
+load time after the checkpoint should stay flat however long the history.
+
+Run: `python -m bench.bench_snapshot [transactions ...]`
+(defaults to 100000 1000000)
+"""
+
+import sys
+import time
+
+from bench.common import temp_storage
+
+
+def load_seconds(storage) -> float:
+    """Times a full load of the storage's files"""
+    start = time.perf_counter()
+    storage.load_data()
+    return time.perf_counter() - start
+
+
+def main(*counts: int, tail: int = 500):
+    counts = counts or (100_000, 1_000_000)
+    print(f"{'history':>10}{'full load s':>14}{'tail load s':>14}")
+    for count in counts:
+        with temp_storage(
+            books=10000, users=1000, transactions=count, journal=True
+        ) as storage:
+            full = load_seconds(storage)
+            storage.checkpoint()
+            # activity since the snapshot
+            transactions = storage.data["transactions"]
+            for i in range(tail):
+                transactions.append(
+                    {
+                        "user_id": str(i % 1000 + 1),
+                        "isbn": f"b{i:07d}",
+                        "action": "checkout",
+                        "timestamp": "2024-03-18T10:00:00",
+                    }
+                )
+            storage.save_data()
+            after = load_seconds(storage)
+        print(f"{count:>10}{full:>14.2f}{after:>14.3f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
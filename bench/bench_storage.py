@@ -0,0 +1,89 @@
+"""
+Benchmark: bytes written per operation by Storage.save_data
+
+Compares saving only the changed datasets, with transactions kept as a
+json array or as a json lines journal, against rewriting every file
+(the old behaviour, `save_data(force=True)`).
+
+The journal is checkpointed once before the operations, on its own row,
+so the snapshot it writes isn't counted in the first operation.
+
+Run: `python -m bench.bench_storage [books] [users] [transactions]`
+"""
+
+import contextlib
+import io
+import sys
+
+from bench.common import temp_storage
+from script.book import BookManagement
+from script.check import TransactionManagement
+from script.user import UserManagement
+
+
+def run(storage, force: bool) -> dict:
+    """Runs a few typical operations and collects bytes written by each
+
+    Args:
+        storage (Storage): storage to run the operations on
+        force (bool): passed on to atomic
+
+    Returns:
+        dict: operation name -> bytes written
+    """
+    # the managers save in atomic blocks, route them through the chosen
+    # mode
+    atomic = storage.atomic
+    storage.atomic = lambda: atomic(force=force)
+
+    bm = BookManagement(storage)
+    um = UserManagement(storage)
+    tm = TransactionManagement(storage)
+    operations = {
+        # the migrated journal is over SNAPSHOT_INTERVAL
+        "checkpoint": storage.checkpoint,
+        "add_book": lambda: bm.add_book("new book", "someone", "zz00001"),
+        "update_book": lambda: bm.update_book("zz00001", title="renamed"),
+        "create_user": lambda: um.create_user("new user", "new@user.com"),
+        "check_out": lambda: tm.check_out("1", "zz00001"),
+        "check_in": lambda: tm.check_in("1", "zz00001"),
+        "delete_book": lambda: bm.delete_book("zz00001"),
+    }
+    results = {}
+    for name, operation in operations.items():
+        before = storage.bytes_written
+        # keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            operation()
+        results[name] = storage.bytes_written - before
+
+    storage.atomic = atomic
+    return results
+
+
+def main(
+    books: int = 200_000, users: int = 20_000, transactions: int = 500_000
+):
+    print(
+        f"Dataset: {books} books, {users} users, {transactions} transactions"
+    )
+    modes = {
+        "full rewrite": (True, False),
+        "dirty only": (False, False),
+        "dirty+journal": (False, True),
+    }
+    results = {}
+    for mode, (force, journal) in modes.items():
+        with temp_storage(books, users, transactions, journal) as storage:
+            results[mode] = run(storage, force)
+
+    print(f"\n{'operation':<14}" + "".join(f"{mode:>16}" for mode in modes))
+    for operation in results["full rewrite"]:
+        print(
+            f"{operation:<14}"
+            + "".join(f"{results[mode][operation]:>16,}" for mode in modes)
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
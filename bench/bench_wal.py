@@ -0,0 +1,90 @@
+"""
+Benchmark: cost of the write-ahead log, and what group commit saves
+
+First the latency of single saves (a checkout, an added book) with the
+log, where each save waits for one fsync. Then checkouts, each saved by
+its own atomic block, made by a growing number of threads at once: with
+group commit the log fsyncs per save drop as threads are added, and
+saves per second go up.
+
+Run: `python -m bench.bench_wal [saves per thread]` (defaults to 50)
+"""
+
+import contextlib
+import io
+import sys
+import threading
+import time
+
+from bench.common import temp_storage
+from script.book import BookManagement
+from script.check import TransactionManagement
+
+
+def save_latency(storage) -> dict:
+    """Times a few single-operation saves, in ms each"""
+    bm = BookManagement(storage)
+    tm = TransactionManagement(storage)
+    operations = {
+        "check_out": lambda i: tm.check_out("1", f"b{i:07d}"),
+        "add_book": lambda i: bm.add_book("new book", "someone", f"z{i:06d}"),
+    }
+    results = {}
+    for name, operation in operations.items():
+        start = time.perf_counter()
+        # keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(20):
+                operation(i)
+        results[name] = (time.perf_counter() - start) * 1000 / 20
+    return results
+
+
+def group_commit(storage, threads: int, saves: int, start: int) -> tuple:
+    """Checks books out, one atomic block each, from several threads at
+    once
+
+    Returns:
+        tuple: (saves per second, fsyncs of the log per save)
+    """
+    tm = TransactionManagement(storage)
+    syncs = storage.wal.syncs
+
+    def save_many(thread):
+        for i in range(saves):
+            # past the books checked out by save_latency
+            isbn = f"b{1000 + (start + thread) * saves + i:07d}"
+            with storage.atomic():
+                tm._check_out(str(thread + 1), isbn)
+
+    workers = [
+        threading.Thread(target=save_many, args=(thread,))
+        for thread in range(threads)
+    ]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - began
+    total = threads * saves
+    return total / seconds, (storage.wal.syncs - syncs) / total
+
+
+def main(saves: int = 50):
+    with temp_storage(
+        books=10000, users=1000, transactions=0, journal=True
+    ) as storage:
+        for name, ms in save_latency(storage).items():
+            print(f"{name:<12}{ms:>8.2f} ms per save")
+
+        print(f"\n{'threads':>8}{'saves/s':>10}{'fsyncs/save':>13}")
+        start = 0
+        for threads in [1, 2, 4, 8, 16]:
+            rate, syncs = group_commit(storage, threads, saves, start)
+            start += threads
+            print(f"{threads:>8}{rate:>10.0f}{syncs:>13.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
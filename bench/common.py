@@ -0,0 +1,169 @@
+"""
+Helpers shared by the benchmarks
+
+Benchmarks run against a throw-away data directory filled with generated
+records, never against the real `data` directory.
+"""
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from script import sqlite_storage
+from script import storage as storage_module
+from script.storage import Storage
+
+
+def make_books(count: int) -> dict:
+    """Generates books data
+
+    Args:
+        count (int): number of books
+
+    Returns:
+        dict: isbn -> book info
+    """
+    return {
+        f"b{i:07d}": {
+            "title": f"title {i % 5000} volume {i}",
+            "author": f"author {i % 977}",
+            "available": True,
+        }
+        for i in range(count)
+    }
+
+
+def make_users(count: int) -> dict:
+    """Generates users data
+
+    Args:
+        count (int): number of users
+
+    Returns:
+        dict: user id -> user info
+    """
+    return {
+        str(i): {"name": f"user {i % 3001}", "email": f"user{i}@example.com"}
+        for i in range(1, count + 1)
+    }
+
+
+def make_transactions(count: int, users: int, books: int) -> list:
+    """Generates transactions data
+
+    Args:
+        count (int): number of transactions
+        users (int): number of users to spread the transactions over
+        books (int): number of books to spread the transactions over
+
+    Returns:
+        list: transactions
+    """
+    return [
+        {
+            "user_id": str(i % users + 1),
+            "isbn": f"b{i % books:07d}",
+            "action": "checkout" if i % 2 == 0 else "checkin",
+            "timestamp": f"2024-03-17T13:{i // 60 % 60:02d}:{i % 60:02d}",
+        }
+        for i in range(count)
+    ]
+
+
+@contextmanager
+def temp_storage(
+    books: int,
+    users: int,
+    transactions: int,
+    journal: bool = False,
+    backend: str = "json",
+):
+    """Yields a fresh Storage loaded from generated files in a temp dir
+
+    Args:
+        books (int): number of books
+        users (int): number of users
+        transactions (int): number of transactions
+        journal (bool, optional): keep transactions as a json lines
+            journal. Defaults to False.
+        backend (str, optional): storage backend, 'json' or 'sqlite'.
+            The sqlite database is imported from the generated files.
+            Defaults to 'json'.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        content = {
+            "users": make_users(users),
+            "books": make_books(books),
+            "transactions": make_transactions(transactions, users, books),
+        }
+        paths = {}
+        for name, data in content.items():
+            paths[name] = os.path.join(tmp_dir, name + ".json")
+            with open(paths[name], "w") as file:
+                json.dump(data, file, indent=4)
+        if journal:
+            # the storage migrates transactions.json into it on load
+            paths["transactions"] = os.path.join(tmp_dir, "transactions.jsonl")
+
+        # point storage to the temp files and drop the singleton
+        patches = [
+            (storage_module, "DATA_FILE_PATHS", paths),
+            (storage_module, "STORAGE_BACKEND", backend),
+            (
+                storage_module,
+                "META_FILE_PATH",
+                os.path.join(tmp_dir, "meta.json"),
+            ),
+            (
+                storage_module,
+                "META_LOCK_PATH",
+                os.path.join(tmp_dir, "meta.json.lock"),
+            ),
+            (
+                storage_module,
+                "WAL_FILE_PATH",
+                os.path.join(tmp_dir, "wal.jsonl"),
+            ),
+            (
+                storage_module,
+                "VERSIONS_FILE_PATH",
+                os.path.join(tmp_dir, "versions.json"),
+            ),
+            (
+                storage_module,
+                "STORAGE_LOCK_PATH",
+                os.path.join(tmp_dir, "versions.json.lock"),
+            ),
+            (sqlite_storage, "DATA_FILE_PATHS", paths),
+            (
+                sqlite_storage,
+                "SQLITE_DB_PATH",
+                os.path.join(tmp_dir, "library.db"),
+            ),
+        ]
+        originals = [
+            (module, name, getattr(module, name))
+            for module, name, _ in patches
+        ]
+        for module, name, value in patches:
+            setattr(module, name, value)
+        Storage._instance = None
+        try:
+            yield Storage()
+        finally:
+            # the benchmark may have reopened the storage meanwhile
+            if getattr(Storage._instance, "connection", None) is not None:
+                Storage._instance.connection.close()
+            for module, name, value in originals:
+                setattr(module, name, value)
+            Storage._instance = None
+
+
+@contextmanager
+def timer(results: dict, key: str):
+    """Stores the elapsed seconds of the block into results[key]"""
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
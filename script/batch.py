@@ -0,0 +1,275 @@
+"""
+Module to run library commands from a file, without the menus
+
+Each line of the file is one command and its arguments, quoted like in a
+shell. Empty lines and lines starting with '#' are skipped:
+
+    add_book "dune" "frank herbert" a1000
+    create_user "ana lopez" ana@example.com
+    check_out 1 a1000
+    find_book title dune
+
+All the commands run against one loaded Storage, and their changes are
+saved together: once at the end, or every N commands with
+--commit-every, instead of once per command. Other processes wait for a
+commit to save their own changes. Each result is printed as a JSON line
+on stdout, then a summary with the commands per second as a JSON line
+on stderr.
+
+Run: `python -m script.batch FILE [--commit-every N]`, FILE - reads stdin
+"""
+
+import argparse
+import inspect
+import json
+import shlex
+import sys
+import time
+from itertools import islice
+
+from script.book import BookManagement
+from script.check import TransactionManagement
+from script.loggers import LibraryLogger
+from script.service import book_json, transaction_json, user_json
+from script.storage import Storage
+from script.user import UserManagement
+
+logger = LibraryLogger()
+
+
+class CommandFailed(Exception):
+    """Raised by a batch command which can't be done, like a checkout of
+    a book not available. The batch goes on with the next command."""
+
+
+class BatchRunner:
+    """Runs batch commands against one storage
+
+    `Use as: BatchRunner(storage).run(lines, commit_every=100)`
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.bm = BookManagement(storage)
+        self.um = UserManagement(storage)
+        self.tm = TransactionManagement(storage)
+        # command name -> method, its arguments are the command's
+        self.commands = {
+            "add_book": self.add_book,
+            "create_user": self.create_user,
+            "check_out": self.check_out,
+            "check_in": self.check_in,
+            "find_book": self.find_book,
+            "find_user": self.find_user,
+            "available_books": self.available_books,
+            "book_transactions": self.book_transactions,
+            "user_transactions": self.user_transactions,
+        }
+
+    def run(self, lines, commit_every: int = 0, output=None) -> dict:
+        """Runs the commands of lines, writing a JSON line result for each
+
+        Args:
+            lines (iterable): command lines
+            commit_every (int, optional): commands saved together, 0 for
+                all of them at the end. Defaults to 0.
+            output (file, optional): where results are written, stdout
+                if None. Defaults to None.
+
+        Raises:
+            Exception: an unexpected error of a command ends the run, the
+                changes since the last commit are then discarded
+
+        Returns:
+            dict: summary, with the number of commands, failed ones,
+                commits, seconds and commands per second
+        """
+        output = output or sys.stdout
+        commands = self._command_lines(lines)
+        summary = {"commands": 0, "failed": 0, "commits": 0}
+        start = time.perf_counter()
+        pending = True
+        while pending:
+            pending = False
+            # changes are saved once, when the block ends
+            with self.storage.atomic():
+                for line_number, line in islice(
+                    commands, commit_every or None
+                ):
+                    pending = True
+                    result = {"line": line_number, **self.execute(line)}
+                    output.write(json.dumps(result) + "\n")
+                    summary["commands"] += 1
+                    if not result["ok"]:
+                        summary["failed"] += 1
+            if pending:
+                summary["commits"] += 1
+
+        seconds = time.perf_counter() - start
+        summary["seconds"] = round(seconds, 3)
+        summary["ops_per_sec"] = round(
+            summary["commands"] / seconds if seconds else 0.0, 1
+        )
+        logger.info(f"Batch run: {summary}")
+        return summary
+
+    def execute(self, line: str) -> dict:
+        """Runs one command
+
+        Args:
+            line (str): command name and its arguments
+
+        Returns:
+            dict: command, ok, then its result or why it failed
+        """
+        name = None
+        try:
+            try:
+                name, *args = shlex.split(line)
+            except ValueError as error:
+                # like an unclosed quote
+                raise CommandFailed(f"Can't read the command: {error}")
+            method = self.commands.get(name)
+            if method is None:
+                raise CommandFailed(f"Unknown command: {name}")
+            try:
+                inspect.signature(method).bind(*args)
+            except TypeError:
+                usage = " ".join(inspect.signature(method).parameters)
+                raise CommandFailed(f"Usage: {name} {usage.upper()}")
+            return {"command": name, "ok": True, "result": method(*args)}
+        except CommandFailed as error:
+            return {"command": name, "ok": False, "error": str(error)}
+
+    @staticmethod
+    def _command_lines(lines):
+        """Skips the empty lines and comments
+
+        Yields:
+            tuple: (line number, line)
+        """
+        for line_number, line in enumerate(lines, 1):
+            if line.strip() and not line.lstrip().startswith("#"):
+                yield line_number, line
+
+    # Commands, their arguments are those of the command line
+
+    def add_book(self, title, author, isbn) -> dict:
+        """Adds a new book"""
+        isbn = isbn.strip().lower()
+        error = self.bm._add_book(
+            title.strip().lower(), author.strip().lower(), isbn
+        )
+        if error is not None:
+            raise CommandFailed(error)
+        return {"isbn": isbn}
+
+    def create_user(self, name, email) -> dict:
+        """Creates a new user, with a new user id"""
+        user_id, error = self.um._create_user(
+            name.strip().lower(), email.strip().lower()
+        )
+        if error is not None:
+            raise CommandFailed(error)
+        return {"user_id": user_id}
+
+    def check_out(self, user_id, isbn) -> dict:
+        """Checks out a book to a user"""
+        return self._check(self.tm._check_out, user_id, isbn)
+
+    def check_in(self, user_id, isbn) -> dict:
+        """Checks in a book a user borrowed"""
+        return self._check(self.tm._check_in, user_id, isbn)
+
+    def _check(self, apply, user_id: str, isbn: str) -> dict:
+        """Applies a checkout or checkin of the manager"""
+        user_id, isbn = user_id.strip().lower(), isbn.strip().lower()
+        with self.storage.atomic():
+            error = apply(user_id, isbn)
+        if error is not None:
+            raise CommandFailed(error)
+        return {"user_id": user_id, "isbn": isbn}
+
+    def find_book(self, how, value) -> dict:
+        """Finds books by isbn, or by the words of their title or author"""
+        if how not in ["isbn", "title", "author"]:
+            raise CommandFailed("Find by isbn, title or author")
+        with self.storage.reading():
+            found = self.bm._find_books(value.strip().lower(), how=how)
+            return {"books": [book_json(isbn, b) for isbn, b in found.items()]}
+
+    def find_user(self, how, value) -> dict:
+        """Finds users by id (uid), email or name"""
+        if how not in ["uid", "email", "name"]:
+            raise CommandFailed("Find by uid, email or name")
+        with self.storage.reading():
+            found = self.um._find_users(value.strip().lower(), how=how)
+            return {"users": [user_json(uid, u) for uid, u in found.items()]}
+
+    def available_books(self) -> dict:
+        """Lists the books available now"""
+        with self.storage.reading():
+            books_data = self.storage.data["books"]
+            return {
+                "books": [
+                    book_json(isbn, books_data[isbn])
+                    for isbn in self.storage.available_books()
+                ]
+            }
+
+    def book_transactions(self, isbn) -> dict:
+        """Lists the checkins and checkouts of a book"""
+        return self._transactions("isbn", isbn.strip().lower(), "books")
+
+    def user_transactions(self, user_id) -> dict:
+        """Lists the checkins and checkouts of a user"""
+        return self._transactions("user_id", user_id.strip().lower(), "users")
+
+    def _transactions(self, field: str, value: str, dataset: str) -> dict:
+        """Lists the transactions of a book or a user"""
+        with self.storage.reading():
+            if value not in self.storage.data[dataset]:
+                raise CommandFailed(f"No {dataset[:-1]} {value}")
+            transactions = self.storage.find_transactions(field, value)
+            return {
+                "transactions": [transaction_json(t) for t in transactions]
+            }
+
+
+def main(argv: list = None) -> dict:
+    """Runs a batch file from command line arguments
+
+    Args:
+        argv (list, optional): arguments, sys.argv[1:] if None.
+            Defaults to None.
+
+    Returns:
+        dict: summary of the run
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m script.batch",
+        description="Run library commands from a file, one per line.",
+    )
+    parser.add_argument("file", help="commands file path, or - for stdin")
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=0,
+        help="save every N commands, 0 saves once at the end",
+    )
+    args = parser.parse_args(argv)
+    if args.commit_every < 0:
+        parser.error("--commit-every must be 0 or more")
+
+    runner = BatchRunner(Storage())
+    if args.file == "-":
+        summary = runner.run(sys.stdin, commit_every=args.commit_every)
+    else:
+        with open(args.file, "r", encoding="utf-8") as file:
+            summary = runner.run(file, commit_every=args.commit_every)
+    sys.stderr.write(json.dumps({"summary": summary}) + "\n")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,29 @@
 Module to work with Book data
 """
 
-import pandas as pd
+import os
+import time
 
 from script.loggers import LibraryLogger
+from script.records import Book
+from script.settings import PAGE_SIZE
 from script.storage import Storage
-from script.utils import BookValidator, clear_screen
+from script.utils import (
+    BookValidator,
+    clear_screen,
+    format_table,
+    iter_rows,
+    print_pages,
+    read_rows,
+    report_error,
+    report_import,
+)
 
 logger = LibraryLogger()
 
+# Columns of book tables
+BOOK_COLUMNS = ["isbn", "title", "author", "available"]
+
 
 class BookManagement:
     """Class to handle operations on Book data"""
@@ -28,7 +43,8 @@ class BookManagement:
         print("3. List Book")
         print("4. Delete Book")
         print("5. Search Book")
-        print("6. Back")
+        print("6. Import Books from a file")
+        print("7. Back")
 
     def search_book_menu(self):
         """Prints search options and executes the search"""
@@ -44,11 +60,15 @@ class BookManagement:
 
             if choice == "1":
                 how = "title"
+                print("Words of the title, end a word with * to match it")
+                print("as a prefix. Books matching all words are shown.")
                 val = str(input("\nEnter book title: "))
                 logger.info(f"User chose to search by {how}")
 
             elif choice == "2":
                 how = "author"
+                print("Words of the author, end a word with * to match it")
+                print("as a prefix. Books matching all words are shown.")
                 val = str(input("\nEnter book author: "))
                 logger.info(f"User chose to search by {how}")
 
@@ -123,7 +143,7 @@ class BookManagement:
 
             elif user_choice == "3":  # List Books
                 logger.info("List Book: Start")
-                self.list_books()
+                self.list_books(interactive=True)
                 input("\nPress Enter to continue")
                 clear_screen()
 
@@ -141,7 +161,16 @@ class BookManagement:
                 self.search_book_menu()
                 clear_screen()
 
-            elif user_choice == "6":
+            elif user_choice == "6":  # Import Books
+                logger.info("Import Books: Start")
+                print("\nCSV files need an isbn,title,author header line,")
+                print("JSON lines files an object with those keys per line.")
+                path = input("\nEnter path of the .csv or .jsonl file: ")
+                self.import_books(path=path.strip())
+                input("\nPress Enter to continue")
+                clear_screen()
+
+            elif user_choice == "7":
                 logger.info("Move Back")
                 clear_screen()
                 # break current loop and go back to main menu of LMS
@@ -162,32 +191,15 @@ class BookManagement:
             isbn (str): isbn of book
 
         """
-        # get books data for ease of readability
-        books_data = self.storage.data["books"]
-
         # clean input data
         title = title.lower().strip()
         author = author.lower().strip()
         isbn = isbn.lower().strip()
 
         # validate user input and if fails then return None
-        if not BookValidator.validate_book_data(
-            title=title,
-            author=author,
-            isbn=isbn,
-            books_data=books_data,
-        ):
+        if not report_error(self._add_book(title, author, isbn)):
             return None
 
-        # Add the data with isbn as key
-        books_data[isbn] = {
-            "title": title,
-            "author": author,
-            "available": True,
-        }
-
-        # Save all the data back to files
-        self.storage.save_data()
         print(
             f"New Book added with ISBN: {isbn} - Title: {title} - Author: {author}"
         )
@@ -195,6 +207,111 @@ class BookManagement:
             f"New Book added with ISBN: {isbn} - Title: {title} - Author: {author}"
         )
 
+    def _add_book(self, title: str, author: str, isbn: str):
+        """Validates a new book and adds it to the data, saved before
+        other clerks can add the same isbn
+
+        Args:
+            title (str): cleaned title
+            author (str): cleaned author
+            isbn (str): cleaned isbn
+
+        Returns:
+            str | None: why the book can't be added, None if added
+        """
+        with self.storage.atomic():
+            # get books data for ease of readability
+            books_data = self.storage.data["books"]
+            error = BookValidator.book_data_error(
+                title=title,
+                author=author,
+                isbn=isbn,
+                books_data=books_data,
+            )
+            if error is not None:
+                return error
+
+            # Add the data with isbn as key
+            books_data[isbn] = Book(
+                title=title,
+                author=author,
+                available=True,
+            )
+            self.storage.mark_dirty("books", isbn)
+        return None
+
+    def import_books(self, path: str):
+        """Imports books in bulk from a CSV file (with an isbn,title,author
+        header line) or a JSON lines file. Rows are streamed through the
+        BookValidator checks, one at a time. Rows failing them, or
+        repeating an isbn of the catalog or of the file, are rejected with
+        their line number. The valid ones are saved in a single write.
+
+        Args:
+            path (str): .csv or .jsonl file path
+
+        Returns:
+            dict | None: summary with the 'read', 'added' and 'rejected'
+                row counts, 'errors' as (line number, reason) of the
+                rejected rows, 'seconds' and 'rows_per_second'. None if
+                the file can't be imported.
+        """
+        if os.path.splitext(path)[1].lower() not in [".csv", ".jsonl"]:
+            print(f"Unsupported file {path}, use a .csv or .jsonl file")
+            logger.info(f"Unsupported import file: {path}")
+            return None
+        if not os.path.isfile(path):
+            print(f"File {path} does not exist")
+            logger.info(f"Import file {path} does not exist")
+            return None
+
+        # isbn -> line number, of the books added by this import
+        added = {}
+        errors = []
+        read = 0
+        start = time.perf_counter()
+        with self.storage.atomic():
+            # read once in the block, a refresh of the data replaces it
+            books_data = self.storage.data["books"]
+            for line_number, row in read_rows(path):
+                read += 1
+                if row is None:
+                    error = "Unreadable row"
+                else:
+                    # clean input data, like add_book
+                    title = str(row.get("title") or "").lower().strip()
+                    author = str(row.get("author") or "").lower().strip()
+                    isbn = str(row.get("isbn") or "").lower().strip()
+                    if isbn in added:
+                        error = f"Duplicate ISBN of line {added[isbn]}"
+                    else:
+                        error = BookValidator.book_data_error(
+                            title=title,
+                            author=author,
+                            isbn=isbn,
+                            books_data=books_data,
+                        )
+
+                if error is not None:
+                    errors.append((line_number, error))
+                    logger.info(f"Rejected line {line_number}: {error}")
+                    continue
+                books_data[isbn] = Book(
+                    title=title,
+                    author=author,
+                    available=True,
+                )
+                added[isbn] = line_number
+
+            # saved once, when the atomic block ends
+            if added:
+                self.storage.mark_dirty_many("books", added)
+        seconds = time.perf_counter() - start
+
+        return report_import(
+            f"{len(added)} books", path, read, len(added), errors, seconds
+        )
+
     def update_book(
         self, isbn: str, title: str = None, author: str = None
     ) -> None:
@@ -206,14 +323,7 @@ class BookManagement:
             isbn (str, Optional): isbn of book. Defaults to None
 
         """
-        books_data = self.storage.data["books"]
-        # if book doesn't exist, return None
-        if isbn not in books_data:
-            print(f"Book with ISBN {isbn} does not exist")
-            logger.info(f"Book with ISBN {isbn} does not exist")
-            return None
-
-        # clean, validate and assign
+        # clean and validate
         if title:
             title = title.lower().strip()
             if not BookValidator.validate_title(title=title):
@@ -224,14 +334,21 @@ class BookManagement:
             if not BookValidator.validate_author_name(author):
                 return None
 
-        # update if all provided data passed validation
-        if title:
-            books_data[isbn]["title"] = title
-        if author:
-            books_data[isbn]["author"] = author
+        # no other clerk can delete the book before this is saved
+        with self.storage.atomic():
+            books_data = self.storage.data["books"]
+            # if book doesn't exist, return None
+            if isbn not in books_data:
+                print(f"Book with ISBN {isbn} does not exist")
+                logger.info(f"Book with ISBN {isbn} does not exist")
+                return None
 
-        # Save the data to files
-        self.storage.save_data()
+            # update if all provided data passed validation
+            if title:
+                books_data[isbn]["title"] = title
+            if author:
+                books_data[isbn]["author"] = author
+            self.storage.mark_dirty("books", isbn)
         print(f"Book data with ISBN: {isbn}, updated")
         logger.info(f"Book data with ISBN: {isbn}, updated")
 
@@ -241,63 +358,87 @@ class BookManagement:
         Args:
             isbn (str): isbn of the book to be deleted
         """
-        books_data = self.storage.data["books"]
         # clean input
         isbn = isbn.lower().strip()
 
-        # if book doesn't exist, return None
-        if isbn not in books_data:
-            print(f"Book with ISBN {isbn} does not exist")
-            logger.info(f"Book with ISBN {isbn} does not exist")
-            return None
+        # checked and deleted before other clerks can change the book
+        with self.storage.atomic():
+            books_data = self.storage.data["books"]
+            # if book doesn't exist, return None
+            if isbn not in books_data:
+                print(f"Book with ISBN {isbn} does not exist")
+                logger.info(f"Book with ISBN {isbn} does not exist")
+                return None
 
-        # delete the data and save data back to all the files
-        del books_data[isbn]
-        self.storage.save_data()
+            # delete the data, saved when the block ends
+            del books_data[isbn]
+            self.storage.mark_dirty("books", isbn)
         print(f"Book data with ID: {isbn}, deleted")
         logger.info(f"Book data with ID: {isbn}, deleted")
 
-    def list_books(self) -> None:
-        """List down all the books"""
-        books_data = self.storage.data["books"]
-        df = pd.DataFrame(books_data.values(), index=books_data.keys())
-        df.index.name = "isbn"
-        print()
-        print(df.to_string(), end="\n\n")
-        logger.info("Books Listed")
-        logger.debug(f"\n{df.to_string()}")
+    def iter_books(self, offset: int = 0):
+        """Generates the rows of books for a listing, starting at offset
+
+        Args:
+            offset (int, optional): number of books to skip. Defaults to 0.
+
+        Returns:
+            Iterator: rows (isbn, title, author, available)
+        """
+        return iter_rows(
+            self.storage,
+            "books",
+            lambda isbn, book_info: (
+                isbn,
+                book_info.get("title"),
+                book_info.get("author"),
+                book_info.get("available"),
+            ),
+            offset,
+        )
+
+    def list_books(
+        self,
+        offset: int = 0,
+        limit: int = PAGE_SIZE,
+        interactive: bool = False,
+    ) -> int:
+        """List down the books page by page
+
+        Args:
+            offset (int, optional): number of books to skip. Defaults to 0.
+            limit (int, optional): books per page. Defaults to PAGE_SIZE.
+            interactive (bool, optional): offer the next pages after the
+                first one. Defaults to False.
+
+        Returns:
+            int: number of books listed
+        """
+        shown = print_pages(
+            self.iter_books(offset),
+            columns=BOOK_COLUMNS,
+            total=len(self.storage.data["books"]),
+            offset=offset,
+            page_size=limit,
+            interactive=interactive,
+        )
+        logger.info(f"Books Listed: {shown} from {offset + 1}")
+        return shown
 
     def find_book(self, value: str, how: str = "isbn") -> None:
         """Find a book by passing value and set [how = 'isbn' or 'title' or 'author']
 
+        Title and author searches match books containing all words of the
+        value, a word ending with '*' matches as a prefix.
+
         Args:
             value (str): Value passed to search
             how (str, optional): Field on which to search. Defaults to 'isbn'.
         """
         # Clean the data to search
         value = value.strip().lower()
-        # Get books data
-        books_data = self.storage.data["books"]
         # To store books found
-        found_books = {}
-
-        # Check the field chosen to search upon
-        if how == "isbn":
-            # Get book based on isbn and store in found books
-            book_info = books_data.get(value, None)
-            if book_info is not None:
-                found_books[value] = book_info
-
-        elif how in ["author", "title"]:
-            # loop over the books to search
-            for isbn, book_info in books_data.items():
-                # compare
-                if how in book_info and book_info[how].lower() == value:
-                    found_books[isbn] = book_info
-
-        # Case when 'how' don't match any availble options then it is an error
-        else:
-            raise ValueError("Invalid 'how' parameter found.")
+        found_books = self._find_books(value, how)
 
         # If book is found then print data, else notify not found
         if len(found_books) == 0:
@@ -305,15 +446,55 @@ class BookManagement:
             logger.info(f"Book with {how}: {value} not found")
         else:
             print("\nBook Found:\n")
-            df = pd.DataFrame(
-                found_books.values(),
-                index=found_books.keys(),
+            table = format_table(
+                [
+                    (isbn, *(book_info.get(c) for c in BOOK_COLUMNS[1:]))
+                    for isbn, book_info in found_books.items()
+                ],
+                BOOK_COLUMNS,
             )
-            df.index.name = "isbn"
 
             logger.info(f"Book Found with {how}: {value}")
-            logger.debug(f"\n{df.to_string()}")
-            print(df.to_string())
+            logger.table(f"Books with {how}: {value}", table)
+            print(table)
+
+    def _find_books(self, value: str, how: str = "isbn") -> dict:
+        """Finds the books by isbn, or by the words of their title or
+        author
+
+        Args:
+            value (str): cleaned value to search
+            how (str, optional): 'isbn', 'title' or 'author'.
+                Defaults to 'isbn'.
+
+        Raises:
+            ValueError: if 'how' doesn't match any available fields
+
+        Returns:
+            dict: isbn -> book of the books found
+        """
+        # Case when 'how' don't match any availble options then it is an error
+        if how not in ["isbn", "author", "title"]:
+            raise ValueError("Invalid 'how' parameter found.")
+
+        found_books = {}
+        # the books found can't change while they are gathered
+        with self.storage.reading():
+            # Get books data
+            books_data = self.storage.data["books"]
+
+            # Check the field chosen to search upon
+            if how == "isbn":
+                # Get book based on isbn and store in found books
+                book_info = books_data.get(value, None)
+                if book_info is not None:
+                    found_books[value] = book_info
+
+            else:
+                # look up the words in the token index
+                for isbn in self.storage.search_books(value, field=how):
+                    found_books[isbn] = books_data[isbn]
+        return found_books
 
 
 if __name__ == "__main__":
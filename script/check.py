@@ -2,16 +2,24 @@
 Module to work with Transactions Or Checkin/Checkout data
 """
 
+import os
 from datetime import datetime
 
-import pandas as pd
-
+from script.export import EXPORT_FORMATS, export_transactions
 from script.loggers import LibraryLogger
+from script.records import Transaction
 from script.storage import Storage
-from script.utils import clear_screen
+from script.utils import clear_screen, format_table
 
 logger = LibraryLogger()
 
+# Columns of transaction tables
+TRANSACTION_COLUMNS = ["user_id", "isbn", "action", "timestamp"]
+
+
+class BatchFailed(Exception):
+    """Raised inside a batch to roll it back when one of its items failed"""
+
 
 class TransactionManagement:
     """Class to handle operations on Transaction data"""
@@ -29,9 +37,13 @@ class TransactionManagement:
         print("*** Transaction Management ***")
         print("1. Checkout Book")
         print("2. Checkin Book")
-        print("3. List Checkins and checkouts")
-        print("4. List Available Books")
-        print("5. Back")
+        print("3. Checkout several Books")
+        print("4. Checkin several Books")
+        print("5. List Checkins and checkouts of a User")
+        print("6. List Checkins and checkouts of a Book")
+        print("7. List Available Books")
+        print("8. Export Checkins and checkouts to a file")
+        print("9. Back")
 
     def main(self) -> None:
         """Main method for executing the Transaction Management subsystem"""
@@ -67,7 +79,24 @@ class TransactionManagement:
                 input("\nPress Enter to continue")
                 clear_screen()
 
-            elif user_choice == "3":  # List Checkins and Checkouts
+            elif user_choice in ["3", "4"]:  # Checkout/Checkin several
+                logger.info("Checkout/Checkin several Books: Start")
+                user_id = input("\nInput user id: ")
+                isbns = input("\nEnter the isbns of books, comma separated: ")
+                items = [
+                    (user_id, isbn)
+                    for isbn in isbns.split(",")
+                    if isbn.strip()
+                ]
+                # Calling the batch method
+                if user_choice == "3":
+                    self.check_out_many(items)
+                else:
+                    self.check_in_many(items)
+                input("\nPress Enter to continue")
+                clear_screen()
+
+            elif user_choice == "5":  # List Checkins and Checkouts
                 logger.info("List checkins and checkouts: Start")
                 user_id = input("\nInput user id: ")
                 # call list method
@@ -75,14 +104,36 @@ class TransactionManagement:
                 input("\nPress Enter to continue")
                 clear_screen()
 
-            elif user_choice == "4":  # List Available Books
+            elif user_choice == "6":  # List Checkins and Checkouts of a Book
+                logger.info("List checkins and checkouts of book: Start")
+                isbn = input("\nEnter the isbn of book: ")
+                # call list method
+                self.list_book_transactions(isbn=isbn)
+                input("\nPress Enter to continue")
+                clear_screen()
+
+            elif user_choice == "7":  # List Available Books
                 logger.info("List Available Books: Start")
                 # call the method
                 self.check_available_books()
                 input("\nPress Enter to continue")
                 clear_screen()
 
-            elif user_choice == "5":  # Go to previous Menu
+            elif user_choice == "8":  # Export Checkins and Checkouts
+                logger.info("Export checkins and checkouts: Start")
+                print("\nEnter a filter OR just press 'Enter' to not filter.")
+                filters = {
+                    "start": input("\nFrom time (like 2024-03-17): "),
+                    "end": input("\nUntil before time (like 2024-04-01): "),
+                    "user_id": input("\nOf user id: "),
+                    "isbn": input("\nOf book isbn: "),
+                }
+                path = input("\nEnter path of the .csv or .jsonl file: ")
+                self.export(path=path.strip(), **filters)
+                input("\nPress Enter to continue")
+                clear_screen()
+
+            elif user_choice == "9":  # Go to previous Menu
                 logger.info("Move Back")
                 clear_screen()
                 break
@@ -100,42 +151,152 @@ class TransactionManagement:
             user_id (str): user id of the user who checked out the book
             isbn (str): isbn of book which was checked out
         """
+        # Clean the input data
+        user_id = user_id.strip().lower()
+        isbn = isbn.strip().lower()
+
+        # checked against the latest data, saved before other clerks
+        # can check the same book
+        with self.storage.atomic():
+            error = self._check_out(user_id, isbn)
+        if error is not None:
+            print(error)
+            logger.info(error)
+            return None
+
+        print(f"User: {user_id} checked out Book: {isbn}")
+        logger.info(f"User: {user_id} checked out Book: {isbn}")
+
+    def check_in(self, user_id: str, isbn: str) -> None:
+        """Checkin book, update availability and save the data
+
+        Args:
+            user_id (str): user id of the user who checked in the book
+            isbn (str): isbn of book which was checked in
+        """
+        # Clean the input data
+        user_id = user_id.strip().lower()
+        isbn = isbn.strip().lower()
+
+        # checked against the latest data, saved before other clerks
+        # can check the same book
+        with self.storage.atomic():
+            error = self._check_in(user_id, isbn)
+        if error is not None:
+            print(error)
+            logger.info(error)
+            return None
+
+        print(f"User: {user_id} checked in Book: {isbn}")
+        logger.info(f"User: {user_id} checked in Book: {isbn}")
+
+    def check_out_many(self, items: list) -> list:
+        """Checkout several books at once. The whole batch is validated
+        and applied as one unit of work, saved once: if any item fails,
+        none of them is applied.
+
+        Args:
+            items (list): (user_id, isbn) pairs
+
+        Returns:
+            list: (user_id, isbn, error) for each item in order, error is
+                None for items checked out
+        """
+        return self._run_batch(items, self._check_out, "checked out")
+
+    def check_in_many(self, items: list) -> list:
+        """Checkin several books at once. The whole batch is validated
+        and applied as one unit of work, saved once: if any item fails,
+        none of them is applied.
+
+        Args:
+            items (list): (user_id, isbn) pairs
+
+        Returns:
+            list: (user_id, isbn, error) for each item in order, error is
+                None for items checked in
+        """
+        return self._run_batch(items, self._check_in, "checked in")
+
+    def _run_batch(self, items: list, apply, done: str) -> list:
+        """Applies each (user_id, isbn) pair of a batch inside one atomic
+        storage block, rolled back if any item fails
+
+        Args:
+            items (list): (user_id, isbn) pairs
+            apply (callable): _check_out or _check_in
+            done (str): past tense of the action, for the messages
+
+        Returns:
+            list: (user_id, isbn, error) for each item in order
+        """
+        # Clean the input data
+        items = [
+            (user_id.strip().lower(), isbn.strip().lower())
+            for user_id, isbn in items
+        ]
+        results = []
+        try:
+            with self.storage.atomic():
+                # later items see the changes of the earlier ones
+                results = [
+                    (user_id, isbn, apply(user_id, isbn))
+                    for user_id, isbn in items
+                ]
+                if any(error is not None for _, _, error in results):
+                    raise BatchFailed()
+        except BatchFailed:
+            results = [
+                (
+                    user_id,
+                    isbn,
+                    error or "Not applied, another item of the batch failed",
+                )
+                for user_id, isbn, error in results
+            ]
+
+        for user_id, isbn, error in results:
+            message = error or f"User: {user_id} {done} Book: {isbn}"
+            print(message)
+            logger.info(message)
+        return results
+
+    def _check_out(self, user_id: str, isbn: str):
+        """Validates a checkout and applies it to the data, without saving
+
+        Args:
+            user_id (str): cleaned user id
+            isbn (str): cleaned isbn
+
+        Returns:
+            str | None: why the checkout is not possible, None if done
+        """
         # Get data separated for ease of readability
         # All of these are already checked for availability
         transac_data = self.storage.data.get("transactions", None)
         users_data = self.storage.data.get("users", None)
         books_data = self.storage.data.get("books", None)
 
-        # Clean the input data
-        user_id = user_id.strip().lower()
-        isbn = isbn.strip().lower()
-
         # Check if user and book exists:
         user = users_data.get(user_id, None)
         if user is None:
-            print(f"No User with user id: {user_id}")
-            logger.info(f"No User with user id: {user_id}")
-            return None
+            return f"No User with user id: {user_id}"
 
         book = books_data.get(isbn, None)
         if book is None:
-            print(f"No Book with isbn: {isbn}")
-            logger.info(f"No Book with isbn: {isbn}")
-            return None
+            return f"No Book with isbn: {isbn}"
         # check if book is available
         if book.get("available", False) is False:
-            print(f"Book with isbn: {isbn} is not available")
-            logger.info(f"Book with isbn: {isbn} is not available")
-            return None
+            return f"Book with isbn: {isbn} is not available"
 
         # Now both book and user is available
         # create checkout transaction data
-        checkout_data = {
-            "user_id": user_id,
-            "isbn": isbn,
-            "action": self.CHECK_OUT,
-            "timestamp": datetime.now().isoformat(),
-        }
+        checkout_data = Transaction(
+            user_id=user_id,
+            isbn=isbn,
+            action=self.CHECK_OUT,
+            timestamp=datetime.now().isoformat(),
+        )
 
         # Assign data to transactions
         transac_data.append(checkout_data)
@@ -146,19 +307,22 @@ class TransactionManagement:
         if user.get("borrowed", None) is None:
             user["borrowed"] = []
         user["borrowed"].append(isbn)
+        # derived from the transaction, so the files aren't rewritten
+        self.storage.mark_derived("books", isbn)
+        self.storage.mark_derived("users", user_id)
 
-        logger.debug(f"Transaction data added: {checkout_data} to storage")
-        # save the data
-        self.storage.save_data()
-        print(f"User: {user_id} checked out Book: {isbn}")
-        logger.info(f"User: {user_id} checked out Book: {isbn}")
+        logger.debug("Transaction data added: %s to storage", checkout_data)
+        return None
 
-    def check_in(self, user_id: str, isbn: str) -> None:
-        """Checkout book, update availability and save the data
+    def _check_in(self, user_id: str, isbn: str):
+        """Validates a checkin and applies it to the data, without saving
 
         Args:
-            user_id (str): user id of the user who checked out the book
-            isbn (str): isbn of book which was checked out
+            user_id (str): cleaned user id
+            isbn (str): cleaned isbn
+
+        Returns:
+            str | None: why the checkin is not possible, None if done
         """
         # Get data separated for ease of readability
         # All of these are already checked for availability
@@ -166,39 +330,27 @@ class TransactionManagement:
         users_data = self.storage.data.get("users", None)
         books_data = self.storage.data.get("books", None)
 
-        # Clean the input data
-        user_id = user_id.strip().lower()
-        isbn = isbn.strip().lower()
-
         # # Check if user and book exists:
         user = users_data.get(user_id, None)
         if user is None:
-            print(f"No User with user id: {user_id}")
-            logger.info(f"No User with user id: {user_id}")
-            return None
+            return f"No User with user id: {user_id}"
 
         book = books_data.get(isbn, None)
         if book is None:
-            print(f"No Book with isbn: {isbn}")
-            logger.info(f"No Book with isbn: {isbn}")
-            return None
+            return f"No Book with isbn: {isbn}"
 
         # validate checkout
         borrowed = user.get("borrowed", None)
         if borrowed is None or isbn not in borrowed:
-            print(f"User {user_id} has not borrowed book {isbn} at the moment")
-            logger.info(
-                f"User {user_id} has not borrowed book {isbn} at the moment"
-            )
-            return None
+            return f"User {user_id} has not borrowed book {isbn} at the moment"
 
         # create checkout transaction data
-        checkin_data = {
-            "user_id": user_id,
-            "isbn": isbn,
-            "action": self.CHECK_IN,
-            "timestamp": datetime.now().isoformat(),
-        }
+        checkin_data = Transaction(
+            user_id=user_id,
+            isbn=isbn,
+            action=self.CHECK_IN,
+            timestamp=datetime.now().isoformat(),
+        )
 
         # Assign data to transactions
         transac_data.append(checkin_data)
@@ -206,13 +358,12 @@ class TransactionManagement:
         # update book availability and remove book from user's borrowed list
         book["available"] = True
         borrowed.remove(isbn)
+        # derived from the transaction, so the files aren't rewritten
+        self.storage.mark_derived("books", isbn)
+        self.storage.mark_derived("users", user_id)
 
-        logger.debug(f"Transaction data added: {checkin_data} to storage")
-
-        # save the data
-        self.storage.save_data()
-        print(f"User: {user_id} checked in Book: {isbn}")
-        logger.info(f"User: {user_id} checked in Book: {isbn}")
+        logger.debug("Transaction data added: %s to storage", checkin_data)
+        return None
 
     def list_transactions(self, user_id: str) -> None:
         """Method to list transactions for given user
@@ -220,41 +371,111 @@ class TransactionManagement:
         Args:
             user_id (str): id of user
         """
-        # Get required data
-        users_data = self.storage.data["users"]
-        trans_data = self.storage.data["transactions"]
-
         # Clean input data
         user_id = user_id.strip().lower()
 
-        # if user doesnt exist, return None
-        if user_id not in users_data:
-            print(f"User with ID {user_id} does not exist")
-            logger.info(f"User with ID {user_id} does not exist")
-            return None
-
-        # filter data for current user
-        tdf = pd.DataFrame(trans_data)
-        req_df = tdf[tdf["user_id"] == user_id]
-        # print the data frame
+        with self.storage.reading():
+            # if user doesnt exist, return None
+            if user_id not in self.storage.data["users"]:
+                print(f"User with ID {user_id} does not exist")
+                logger.info(f"User with ID {user_id} does not exist")
+                return None
+
+            # get only the current user's transactions from the index
+            rows = [
+                [transaction.get(column) for column in TRANSACTION_COLUMNS]
+                for transaction in self.storage.find_transactions(
+                    "user_id", user_id
+                )
+            ]
+        table = format_table(rows, TRANSACTION_COLUMNS)
+        # print the table
         print(f"All checkins and checkouts of User {user_id}:\n")
-        print(req_df.to_string(index=False), end="\n\n")
+        print(table, end="\n\n")
         logger.info(f"Listed all the checkins and checkout of User: {user_id}")
-        logger.debug(f"\n{req_df.to_string(index=False)}")
+        logger.table(f"Checkins and checkouts of User: {user_id}", table)
+
+    def list_book_transactions(self, isbn: str) -> None:
+        """Method to list transactions for given book
+
+        Args:
+            isbn (str): isbn of book
+        """
+        # Clean input data
+        isbn = isbn.strip().lower()
+
+        with self.storage.reading():
+            # if book doesnt exist, return None
+            if isbn not in self.storage.data["books"]:
+                print(f"Book with ISBN {isbn} does not exist")
+                logger.info(f"Book with ISBN {isbn} does not exist")
+                return None
+
+            # get only the current book's transactions from the index
+            rows = [
+                [transaction.get(column) for column in TRANSACTION_COLUMNS]
+                for transaction in self.storage.find_transactions("isbn", isbn)
+            ]
+        table = format_table(rows, TRANSACTION_COLUMNS)
+        # print the table
+        print(f"All checkins and checkouts of Book {isbn}:\n")
+        print(table, end="\n\n")
+        logger.info(f"Listed all the checkins and checkout of Book: {isbn}")
+        logger.table(f"Checkins and checkouts of Book: {isbn}", table)
+
+    def export(self, path: str, **filters) -> None:
+        """Exports the checkins and checkouts to a CSV or JSON lines file,
+        by its extension
+
+        Args:
+            path (str): .csv or .jsonl file path
+            **filters: start, end, user_id and isbn, empty ones are ignored
+        """
+        file_format = os.path.splitext(path)[1].lower().lstrip(".")
+        if file_format not in EXPORT_FORMATS:
+            print(f"Unsupported file {path}, use a .csv or .jsonl file")
+            logger.info(f"Unsupported export file: {path}")
+            return None
+        filters = {
+            name: value.strip()
+            for name, value in filters.items()
+            if value and value.strip()
+        }
+        try:
+            # streamed from the files, like the command line export, not
+            # loaded whole
+            count = export_transactions(
+                output=path,
+                file_format=file_format,
+                **filters,
+            )
+        except ValueError as error:
+            # times which aren't ISO times
+            print(f"Invalid filter: {error}")
+            logger.info(f"Invalid export filter: {error}")
+            return None
+        print(f"Exported {count} checkins and checkouts to {path}")
 
     def check_available_books(self) -> None:
         """prints all available books"""
-        # Get the books data
-        books_data = self.storage.data["books"]
-        # Make a dataframe from books data
-        df = pd.DataFrame(books_data.values(), index=books_data.keys())
-        df.index.name = "isbn"
-        # Filter available books and print it
-        fil_df = df[df["available"] == True]
-        print("Following are the currently available books:")
-        print(fil_df.to_string(), end="\n\n")
+        with self.storage.reading():
+            # Get the books data
+            books_data = self.storage.data["books"]
+            # Only the available books, straight from the availability index
+            rows = [
+                (
+                    isbn,
+                    books_data[isbn].get("title"),
+                    books_data[isbn].get("author"),
+                    books_data[isbn].get("available"),
+                )
+                for isbn in self.storage.available_books()
+            ]
+        table = format_table(rows, ["isbn", "title", "author", "available"])
+        print(f"Following are the currently available books ({len(rows)}):")
+        print(table, end="\n\n")
         logger.info("Listed all the available books")
-        logger.debug(f"\n{fil_df.to_string()}")
+        logger.table("Available books", table)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+"""
+Module for the columnar copy of the transactions, for analytics
+
+Keeps every transaction field in a NumPy array: user ids and isbns as
+int32 codes, the action as a uint8 code and the timestamp as datetime64.
+Counts, per-user or per-book filters and time windows are then vectorized
+array operations instead of loops over the records.
+
+Like the position indexes, the columns are appended to incrementally:
+`catch_up` only converts the transactions added since its last call.
+Get them through `Storage.transaction_columns()`, which imports NumPy on
+first use only.
+"""
+
+import numpy as np
+from script.indexes import normalize
+
+# timestamp resolution of the columns
+TIME_UNIT = "datetime64[us]"
+
+
+class Codes:
+    """Interning table giving each distinct value a small integer code"""
+
+    def __init__(self):
+        self._codes = {}
+        # code -> value
+        self.values = []
+
+    def encode(self, value) -> int:
+        """Gets the code of a value, adding it if it is new"""
+        if value is not None:
+            value = normalize(value)
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value):
+        """Gets the code of a value, None if it was never encoded"""
+        return self._codes.get(normalize(value))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class TransactionColumns:
+    """Columnar copy of an append-only list of transactions"""
+
+    def __init__(self):
+        self.codes = {"user_id": Codes(), "isbn": Codes(), "action": Codes()}
+        # field -> array, allocated ahead and filled up to `indexed`
+        self._arrays = {
+            "user_id": np.empty(0, dtype=np.int32),
+            "isbn": np.empty(0, dtype=np.int32),
+            "action": np.empty(0, dtype=np.uint8),
+            "timestamp": np.empty(0, dtype=TIME_UNIT),
+        }
+        # number of list items converted so far
+        self.indexed = 0
+
+    def __len__(self) -> int:
+        return self.indexed
+
+    def column(self, field: str) -> np.ndarray:
+        """Gets the filled part of a field's array, codes for the coded
+        fields
+
+        Args:
+            field (str): 'user_id', 'isbn', 'action' or 'timestamp'
+
+        Returns:
+            np.ndarray: read-only view of the column
+        """
+        view = self._arrays[field][: self.indexed]
+        view.flags.writeable = False
+        return view
+
+    def reset(self) -> None:
+        """Forgets the converted transactions, so the next `catch_up`
+        converts the whole list again"""
+        self.indexed = 0
+
+    def catch_up(self, items) -> None:
+        """Converts the items appended to the list since the last call
+
+        Args:
+            items (list): the whole list of transactions
+        """
+        # the list shrank, so the rows can't be trusted anymore
+        if len(items) < self.indexed:
+            self.reset()
+        if len(items) == self.indexed:
+            return None
+
+        new_items = items[self.indexed :]
+        self._reserve(self.indexed + len(new_items))
+        end = self.indexed + len(new_items)
+        for field in ("user_id", "isbn", "action"):
+            encode = self.codes[field].encode
+            self._arrays[field][self.indexed : end] = [
+                encode(item.get(field)) for item in new_items
+            ]
+        # parsed in one go, missing timestamps become NaT
+        self._arrays["timestamp"][self.indexed : end] = np.array(
+            [item.get("timestamp") for item in new_items], dtype=TIME_UNIT
+        )
+        self.indexed = end
+
+    def _reserve(self, size: int) -> None:
+        """Grows the arrays to hold at least size rows, doubling them so
+        appends are amortized"""
+        capacity = len(self._arrays["timestamp"])
+        if size <= capacity:
+            return None
+        capacity = max(size, capacity * 2, 1024)
+        for field, array in self._arrays.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[: self.indexed] = array[: self.indexed]
+            self._arrays[field] = grown
+
+    def mask(
+        self,
+        user_id: str = None,
+        isbn: str = None,
+        action: str = None,
+        start=None,
+        end=None,
+    ) -> np.ndarray:
+        """Selects the transactions matching all the given filters
+
+        Args:
+            user_id (str, optional): only this user's. Defaults to None.
+            isbn (str, optional): only this book's. Defaults to None.
+            action (str, optional): 'checkout' or 'checkin'.
+                Defaults to None.
+            start (str | datetime, optional): only at or after this time.
+                Defaults to None.
+            end (str | datetime, optional): only before this time.
+                Defaults to None.
+
+        Returns:
+            np.ndarray: boolean mask over the transactions
+        """
+        selected = np.ones(self.indexed, dtype=bool)
+        for field, value in (
+            ("user_id", user_id),
+            ("isbn", isbn),
+            ("action", action),
+        ):
+            if value is None:
+                continue
+            code = self.codes[field].get(value)
+            if code is None:
+                # never seen, so nothing matches
+                return np.zeros(self.indexed, dtype=bool)
+            selected &= self.column(field) == code
+
+        timestamps = self.column("timestamp")
+        if start is not None:
+            selected &= timestamps >= np.datetime64(start, "us")
+        if end is not None:
+            selected &= timestamps < np.datetime64(end, "us")
+        return selected
+
+    def count(self, **filters) -> int:
+        """Counts the transactions matching the filters of `mask`"""
+        return int(np.count_nonzero(self.mask(**filters)))
+
+    def positions(self, **filters) -> np.ndarray:
+        """Gets the list positions of the transactions matching the
+        filters of `mask`, in the order they happened"""
+        return np.flatnonzero(self.mask(**filters))
+
+    def counts_by(self, field: str, **filters) -> dict:
+        """Counts the transactions matching the filters of `mask` per
+        value of a coded field
+
+        Args:
+            field (str): 'user_id', 'isbn' or 'action'
+            **filters: filters of `mask`
+
+        Returns:
+            dict: value -> number of transactions, for values having any
+        """
+        codes = self.codes[field]
+        counts = np.bincount(
+            self.column(field)[self.mask(**filters)], minlength=len(codes)
+        )
+        return {
+            codes.values[code]: int(counts[code])
+            for code in np.flatnonzero(counts)
+        }
+
+
+if __name__ == "__main__":
+    pass
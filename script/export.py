@@ -0,0 +1,212 @@
+"""
+Module to export the transaction history, for auditing
+
+Transactions flow through a generator pipeline: read one at a time, from
+the journal file or the database, filtered by time range, user or isbn,
+then written as CSV or JSON lines. Only one transaction is held at a
+time, so memory doesn't grow with the history.
+
+Run: `python -m script.export [--start TIME] [--end TIME] [--user ID]
+[--isbn ISBN] [--format csv|jsonl] [--output PATH]`, output defaults to
+stdout.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+from script import storage as storage_module
+from script.locks import file_lock
+from script.loggers import LibraryLogger
+from script.records import Transaction, to_json
+from script.storage import Storage, iter_journal, journal_segments
+
+logger = LibraryLogger()
+
+# Columns of the exported transactions
+EXPORT_COLUMNS = list(Transaction.__slots__)
+EXPORT_FORMATS = ["csv", "jsonl"]
+
+
+def iter_saved_transactions():
+    """Streams the saved transactions, in the order they happened,
+    without loading the whole history: line by line from the archived
+    json lines segments and then the journal, as they were saved when
+    called, or row by row from the database
+
+    Yields:
+        dict | Record: transaction
+    """
+    path = storage_module.DATA_FILE_PATHS["transactions"]
+    if storage_module.STORAGE_BACKEND == "sqlite":
+        # the sqlite storage reads transactions with a cursor
+        yield from Storage().data["transactions"]
+    elif Storage._is_journal(path):
+        # a checkpoint moves the journal to a new segment: the segments are
+        # listed and the journal opened under the storage lock, so rows are
+        # neither missed nor read twice. Archived segments don't change.
+        with file_lock(storage_module.STORAGE_LOCK_PATH):
+            segments = journal_segments(path)
+            journal = end = None
+            if os.path.exists(path):
+                journal = open(path, "rb")
+                end = os.fstat(journal.fileno()).st_size
+        for segment in segments:
+            for item, _ in iter_journal(segment):
+                yield item
+        if journal is not None:
+            for item, _ in iter_journal(journal, end=end):
+                yield item
+    elif os.path.exists(path):
+        # a json array can't be streamed, it has to be parsed whole
+        with open(path, "r") as file:
+            yield from json.load(file)
+
+
+def filter_transactions(
+    items,
+    start: str = None,
+    end: str = None,
+    user_id: str = None,
+    isbn: str = None,
+):
+    """Passes on the transactions matching all the given filters
+
+    Args:
+        items (iterable): transactions
+        start (str, optional): only at or after this ISO time.
+            Defaults to None.
+        end (str, optional): only before this ISO time. Defaults to None.
+        user_id (str, optional): only this user's. Defaults to None.
+        isbn (str, optional): only this book's. Defaults to None.
+
+    Yields:
+        dict | Record: matching transaction
+    """
+    # ISO times of the same layout sort like the times they stand for
+    if start is not None:
+        start = datetime.fromisoformat(start).isoformat()
+    if end is not None:
+        end = datetime.fromisoformat(end).isoformat()
+    user_id = None if user_id is None else user_id.strip().lower()
+    isbn = None if isbn is None else isbn.strip().lower()
+
+    for item in items:
+        if user_id is not None and item.get("user_id") != user_id:
+            continue
+        if isbn is not None and item.get("isbn") != isbn:
+            continue
+        timestamp = item.get("timestamp") or ""
+        if start is not None and timestamp < start:
+            continue
+        if end is not None and timestamp >= end:
+            continue
+        yield item
+
+
+def write_transactions(items, file, file_format: str = "csv") -> int:
+    """Writes transactions to an open text file as they come
+
+    Args:
+        items (iterable): transactions
+        file (TextIO): file to write to
+        file_format (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+
+    Returns:
+        int: number of transactions written
+    """
+    count = 0
+    if file_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_COLUMNS)
+        for item in items:
+            writer.writerow([item.get(column) for column in EXPORT_COLUMNS])
+            count += 1
+    else:
+        for item in items:
+            file.write(
+                json.dumps(item, separators=(",", ":"), default=to_json) + "\n"
+            )
+            count += 1
+    return count
+
+
+def export_transactions(
+    items=None, output: str = "-", file_format: str = "csv", **filters
+) -> int:
+    """Exports the transactions matching the filters of
+    `filter_transactions` to a file or stdout
+
+    Args:
+        items (iterable, optional): transactions, the saved ones are
+            streamed if None. Defaults to None.
+        output (str, optional): file path, '-' for stdout. Defaults to '-'.
+        file_format (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+        **filters: start, end, user_id and isbn filters
+
+    Returns:
+        int: number of transactions exported
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    if items is None:
+        items = iter_saved_transactions()
+
+    selected = filter_transactions(items, **filters)
+    if output == "-":
+        count = write_transactions(selected, sys.stdout, file_format)
+    else:
+        with open(output, "w", newline="", encoding="utf-8") as file:
+            count = write_transactions(selected, file, file_format)
+    logger.info(
+        f"Exported {count} transactions as {file_format} to {output} "
+        f"with filters {filters}"
+    )
+    return count
+
+
+def main(argv: list = None) -> int:
+    """Runs the export from command line arguments
+
+    Args:
+        argv (list, optional): arguments, sys.argv[1:] if None.
+            Defaults to None.
+
+    Returns:
+        int: number of transactions exported
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m script.export",
+        description="Export the transaction history as CSV or JSON lines.",
+    )
+    parser.add_argument("--start", help="only at or after this ISO time")
+    parser.add_argument("--end", help="only before this ISO time")
+    parser.add_argument("--user", dest="user_id", help="only this user's")
+    parser.add_argument("--isbn", help="only this book's")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--output", default="-", help="file path or -")
+    args = parser.parse_args(argv)
+
+    for name in ["start", "end"]:
+        value = getattr(args, name)
+        if value is not None:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                parser.error(f"--{name} is not an ISO time: {value}")
+
+    return export_transactions(
+        output=args.output,
+        file_format=args.format,
+        start=args.start,
+        end=args.end,
+        user_id=args.user_id,
+        isbn=args.isbn,
+    )
+
+
+if __name__ == "__main__":
+    main()
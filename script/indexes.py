@@ -0,0 +1,325 @@
+"""
+Module for in-memory secondary indexes over the datasets
+
+An index maps a normalized field value to the keys of the records having
+it. Storage builds them on load and updates them for every record marked
+with `Storage.mark_dirty`, so lookups don't have to scan the dataset.
+"""
+
+import bisect
+import re
+
+# marks a search term to be matched as a prefix, like 'moun*'
+PREFIX_MARK = "*"
+
+
+def normalize(value) -> str:
+    """Normalizes a field value for case-insensitive lookups"""
+    return str(value).strip().lower()
+
+
+class UniqueIndex:
+    """Index of a field whose value is unique: value -> key"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._keys = {}
+        # key -> indexed value, to find the old value on updates
+        self._values = {}
+
+    def build(self, items) -> None:
+        """Rebuilds the index from (key, record) pairs"""
+        self._keys.clear()
+        self._values.clear()
+        for key, record in items:
+            self.update(key, record)
+
+    def update(self, key: str, record) -> None:
+        """Re-indexes a record, pass None for a deleted record
+
+        Args:
+            key (str): key of the record
+            record (dict | None): current record
+        """
+        old_value = self._values.pop(key, None)
+        if old_value is not None and self._keys.get(old_value) == key:
+            del self._keys[old_value]
+
+        value = None if record is None else record.get(self.field)
+        if value is not None:
+            value = normalize(value)
+            self._values[key] = value
+            self._keys[value] = key
+
+    def get(self, value):
+        """Gets the key of the record with the value, None if not found"""
+        return self._keys.get(normalize(value))
+
+
+class MultiIndex:
+    """Index of a field shared by many records: value -> [keys]"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._keys = {}
+        # key -> indexed value, to find the old value on updates
+        self._values = {}
+
+    def build(self, items) -> None:
+        """Rebuilds the index from (key, record) pairs"""
+        self._keys.clear()
+        self._values.clear()
+        for key, record in items:
+            self.update(key, record)
+
+    def update(self, key: str, record) -> None:
+        """Re-indexes a record, pass None for a deleted record
+
+        Args:
+            key (str): key of the record
+            record (dict | None): current record
+        """
+        old_value = self._values.pop(key, None)
+        if old_value is not None:
+            keys = self._keys[old_value]
+            # dicts keep the keys in insertion order, unlike sets
+            del keys[key]
+            if not keys:
+                del self._keys[old_value]
+
+        value = None if record is None else record.get(self.field)
+        if value is not None:
+            value = normalize(value)
+            self._values[key] = value
+            self._keys.setdefault(value, {})[key] = None
+
+    def get(self, value) -> list:
+        """Gets the keys of all records with the value"""
+        return list(self._keys.get(normalize(value), ()))
+
+
+class FlagIndex:
+    """Index of the records whose boolean field is set: {keys}"""
+
+    def __init__(self, field: str):
+        self.field = field
+        # dict used as an ordered set
+        self._keys = {}
+
+    def build(self, items) -> None:
+        """Rebuilds the index from (key, record) pairs"""
+        self._keys = {
+            key: None for key, record in items if record.get(self.field)
+        }
+
+    def update(self, key: str, record) -> None:
+        """Re-indexes a record, pass None for a deleted record
+
+        Args:
+            key (str): key of the record
+            record (dict | None): current record
+        """
+        if record is not None and record.get(self.field):
+            self._keys[key] = None
+        else:
+            self._keys.pop(key, None)
+
+    def keys(self) -> list:
+        """Gets the keys of the records with the field set"""
+        return list(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class PositionIndex:
+    """Index of a field over an append-only list: value -> [positions].
+
+    Items appended to the list are indexed by `catch_up`, so each item is
+    indexed only once however often the index is queried.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._positions = {}
+        # number of list items indexed so far
+        self.indexed = 0
+
+    def build(self, items) -> None:
+        """Rebuilds the index from (position, record) pairs"""
+        self._positions.clear()
+        self.indexed = 0
+        for position, record in items:
+            self._add(position, record)
+            self.indexed = position + 1
+
+    def _add(self, position: int, record) -> None:
+        """Indexes the record at a position"""
+        value = record.get(self.field)
+        if value is not None:
+            self._positions.setdefault(normalize(value), []).append(position)
+
+    def catch_up(self, items) -> None:
+        """Indexes the items appended to the list since the last call
+
+        Args:
+            items (list): the whole indexed list
+        """
+        # the list shrank, so positions can't be trusted anymore
+        if len(items) < self.indexed:
+            self.build(enumerate(items))
+            return None
+        for position in range(self.indexed, len(items)):
+            self._add(position, items[position])
+        self.indexed = len(items)
+
+    def get(self, value) -> list:
+        """Gets the positions of all items with the value, in list order"""
+        return list(self._positions.get(normalize(value), ()))
+
+
+def tokenize(text) -> list:
+    """Splits a text into normalized word tokens"""
+    return re.findall(r"\w+", str(text).lower())
+
+
+def parse_query(query: str) -> list:
+    """Splits a search query into (token, is_prefix) terms. A term ending
+    with '*' matches every token starting with it.
+
+    Args:
+        query (str): search query, like 'deep moun*'
+
+    Returns:
+        list: (token, is_prefix) pairs
+    """
+    terms = []
+    for word in query.split():
+        tokens = tokenize(word)
+        terms.extend((token, False) for token in tokens)
+        if tokens and word.endswith(PREFIX_MARK):
+            terms[-1] = (tokens[-1], True)
+    return terms
+
+
+def text_matches(terms: list, text) -> bool:
+    """Checks if a text contains all the query terms, without an index
+
+    Args:
+        terms (list): (token, is_prefix) pairs from parse_query
+        text (str): text to check
+
+    Returns:
+        bool: True if every term matches a token of the text
+    """
+    tokens = set(tokenize(text))
+    return all(
+        (
+            any(t.startswith(token) for t in tokens)
+            if is_prefix
+            else token in tokens
+        )
+        for token, is_prefix in terms
+    )
+
+
+class TokenIndex:
+    """Inverted index of the words of a text field: token -> {keys}"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._keys = {}
+        # key -> indexed tokens, to find the old tokens on updates
+        self._tokens = {}
+        # sorted distinct tokens, for prefix searches
+        self._vocabulary = []
+
+    def build(self, items) -> None:
+        """Rebuilds the index from (key, record) pairs"""
+        self._keys.clear()
+        self._tokens.clear()
+        for key, record in items:
+            tokens = self._record_tokens(record)
+            self._tokens[key] = tokens
+            for token in tokens:
+                self._keys.setdefault(token, set()).add(key)
+        self._vocabulary = sorted(self._keys)
+
+    def _record_tokens(self, record) -> tuple:
+        """Gets the distinct tokens of the record's field"""
+        if record is None or record.get(self.field) is None:
+            return ()
+        return tuple(set(tokenize(record[self.field])))
+
+    def update(self, key: str, record) -> None:
+        """Re-indexes a record, pass None for a deleted record
+
+        Args:
+            key (str): key of the record
+            record (dict | None): current record
+        """
+        for token in self._tokens.pop(key, ()):
+            keys = self._keys[token]
+            keys.discard(key)
+            if not keys:
+                del self._keys[token]
+                position = bisect.bisect_left(self._vocabulary, token)
+                del self._vocabulary[position]
+
+        tokens = self._record_tokens(record)
+        if tokens:
+            self._tokens[key] = tokens
+        for token in tokens:
+            if token not in self._keys:
+                self._keys[token] = set()
+                bisect.insort(self._vocabulary, token)
+            self._keys[token].add(key)
+
+    def _prefix_keys(self, prefix: str) -> set:
+        """Gets the keys of records having any token starting with prefix"""
+        keys = set()
+        position = bisect.bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[
+            position
+        ].startswith(prefix):
+            keys |= self._keys[self._vocabulary[position]]
+            position += 1
+        return keys
+
+    def search(self, query: str) -> set:
+        """Finds the records whose field contains all words of the query
+
+        Args:
+            query (str): words to search, a word ending with '*' is
+                matched as a prefix
+
+        Returns:
+            set: keys of the matching records
+        """
+        terms = parse_query(query)
+        if not terms:
+            return set()
+
+        matches = []
+        for token, is_prefix in terms:
+            keys = (
+                self._prefix_keys(token)
+                if is_prefix
+                else self._keys.get(token, set())
+            )
+            if not keys:
+                return set()
+            matches.append(keys)
+
+        # intersect starting from the smallest set
+        matches.sort(key=len)
+        result = set(matches[0])
+        for keys in matches[1:]:
+            result &= keys
+            if not result:
+                break
+        return result
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,120 @@
+"""
+Module for locks shared between processes and threads working on the same
+data
+"""
+
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path: str):
+    """Holds an exclusive lock on the file at path (created if missing)
+    for the duration of the block. Other processes asking for the same
+    lock wait until it is released.
+
+    `Use as: with file_lock(path): ...`
+
+    Args:
+        path (str): path of the lock file
+    """
+    file = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            # lock the first byte, blocking until it is free
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        file.close()
+
+
+class ReadWriteLock:
+    """Lock between the threads of a process, shared by any number of
+    readers or held by a single writer.
+
+    The writer may take it again, to read or write, inside its own block.
+    A reader can't start writing inside its block, that would wait forever
+    for itself: take the write side first. Readers don't start while a
+    writer waits, so a stream of lookups can't starve the writers.
+
+    `Use as: with lock.reading(): ... or with lock.writing(): ...`
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        # thread id -> depth of its `reading` blocks
+        self._readers = {}
+        # thread id of the writer and depth of its `writing` blocks
+        self._writer = None
+        self._depth = 0
+        # writers waiting for the readers to leave
+        self._waiting = 0
+
+    @contextmanager
+    def reading(self):
+        """Holds the lock shared with the other readers for the duration
+        of the block"""
+        me = threading.get_ident()
+        with self._condition:
+            # already holding it, waiting for a writer would never end
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting:
+                    self._condition.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers[me] -= 1
+                if not self._readers[me]:
+                    del self._readers[me]
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        """Holds the lock alone for the duration of the block
+
+        Raises:
+            RuntimeError: if the thread is inside a `reading` block only
+        """
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                if me in self._readers:
+                    raise RuntimeError("Can't write inside a reading block")
+                self._waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._waiting -= 1
+                self._writer = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._condition.notify_all()
+
+
+if __name__ == "__main__":
+    pass
@@ -1,13 +1,50 @@
 """
 Module for loggers
 
-Using Singleton design for logger.
+Using Singleton design for logger. With LOG_QUEUED, records are put on a
+queue and written to the files by a background thread, so logging doesn't
+wait on the disk. The queue is written out when the program exits.
+
+Messages take %-style arguments, or are callables, both only formatted or
+called when their level is enabled:
+
+    logger.debug("Saved %s records", count)
+    logger.debug(lambda: f"Index: {describe(index)}")
+
+Table dumps go to their own size capped file, see `LibraryLogger.table`.
 """
 
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import os
+import queue
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+
+from script.settings import (
+    LOG_DUMP_FILE_PATH,
+    LOG_DUMP_MAX_BYTES,
+    LOG_ERR_FILE_PATH,
+    LOG_FILE_PATH,
+    LOG_LEVEL,
+    LOG_QUEUED,
+)
+
 
-from script.settings import LOG_ERR_FILE_PATH, LOG_FILE_PATH, LOG_LEVEL
+class RecordQueueHandler(QueueHandler):
+    """Queue handler leaving the formatting to the writer thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Queues the record as it is. QueueHandler formats it here, in the
+        logging thread, so it can be pickled to another process. The queue
+        stays in this process, the file handlers format it when writing.
+        The arguments are formatted late: they must not be changed after
+        the logging call."""
+        return record
 
 
 class LibraryLogger:
@@ -20,73 +57,211 @@ class LibraryLogger:
             cls._instance = super().__new__(cls)
             # Get logger and configure it
             cls._instance.logger = logging.getLogger("Library_Logger")
-            # Set the level for logs
-            cls._instance.logger.setLevel(LOG_LEVEL)
+            # Its records reach the handlers of logger, which send them to
+            # the dump file only
+            cls._instance.dumps = logging.getLogger("Library_Logger.dumps")
+            cls._instance._listener = None
+            cls._instance.configure()
+            # Write out the queued records on exit
+            atexit.register(cls._instance.shutdown)
+            # A forked child has no writer thread, it starts its own. No
+            # fork on Windows
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(
+                    before=cls._instance._hold_files,
+                    after_in_parent=cls._instance._release_files,
+                    after_in_child=cls._instance._restart,
+                )
 
-            # Set the format for logger
-            formatter = logging.Formatter(
-                "%(asctime)s - %(levelname)s - %(message)s",
-                datefmt="%Y-%m-%d %H:%M:%S",
+            # Log the starting message
+            cls._instance.logger.info(
+                "~~~~~~~~~~~~~~~~~~ Logger Initialized ~~~~~~~~~~~~~~~~~~~"
             )
 
-            # File handler for normal logs with daily rotation
-            file_handler = TimedRotatingFileHandler(
-                LOG_FILE_PATH, when="midnight", interval=1, backupCount=5
-            )
-            file_handler.setFormatter(formatter)
-            cls._instance.logger.addHandler(file_handler)
+        return cls._instance
+
+    def configure(
+        self,
+        level=LOG_LEVEL,
+        queued: bool = LOG_QUEUED,
+        file_path: str = LOG_FILE_PATH,
+        err_file_path: str = LOG_ERR_FILE_PATH,
+        dump_file_path: str = LOG_DUMP_FILE_PATH,
+    ):
+        """Sets the level and the log files, replacing the current handlers
+
+        Args:
+            level (int | str, optional): level, or its name. Defaults to
+                LOG_LEVEL.
+            queued (bool, optional): write the files from a background
+                thread, else in the logging call. Defaults to LOG_QUEUED.
+            file_path (str, optional): log file. Defaults to LOG_FILE_PATH.
+            err_file_path (str, optional): error log file. Defaults to
+                LOG_ERR_FILE_PATH.
+            dump_file_path (str, optional): table dumps file. Defaults to
+                LOG_DUMP_FILE_PATH.
+        """
+        handlers = list(self.logger.handlers)
+        if self._listener is not None:
+            handlers.extend(self._listener.handlers)
+        self.shutdown()
+        for handler in handlers:
+            self.logger.removeHandler(handler)
+            handler.close()
+        # Set the level for logs
+        self.logger.setLevel(level)
+
+        # Set the format for logger
+        formatter = logging.Formatter(
+            "%(asctime)s - %(levelname)s - %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+
+        # File handler for normal logs with daily rotation
+        file_handler = TimedRotatingFileHandler(
+            file_path, when="midnight", interval=1, backupCount=5
+        )
+        file_handler.setFormatter(formatter)
+        file_handler.addFilter(self._not_dump)
+
+        # File handler for error logs with daily rotation
+        error_handler = TimedRotatingFileHandler(
+            err_file_path, when="midnight", interval=1, backupCount=5
+        )
+        error_handler.setLevel(logging.ERROR)
+        error_handler.setFormatter(formatter)
 
-            # File handler for error logs with daily rotation
-            error_handler = TimedRotatingFileHandler(
-                LOG_ERR_FILE_PATH, when="midnight", interval=1, backupCount=5
+        # Size capped file handler for table dumps
+        dump_handler = RotatingFileHandler(
+            dump_file_path, maxBytes=LOG_DUMP_MAX_BYTES, backupCount=1
+        )
+        dump_handler.setFormatter(formatter)
+        dump_handler.addFilter(self._is_dump)
+
+        if queued:
+            records = queue.SimpleQueue()
+            self.logger.addHandler(RecordQueueHandler(records))
+            self._listener = QueueListener(
+                records,
+                file_handler,
+                error_handler,
+                dump_handler,
+                respect_handler_level=True,
             )
-            error_handler.setLevel(logging.ERROR)
-            error_handler.setFormatter(formatter)
-            cls._instance.logger.addHandler(error_handler)
+            self._listener.start()
+        else:
+            self.logger.addHandler(file_handler)
+            self.logger.addHandler(error_handler)
+            self.logger.addHandler(dump_handler)
 
-            # Log the starting message
-            cls._instance.logger.info(
-                "~~~~~~~~~~~~~~~~~~ Logger Initialized ~~~~~~~~~~~~~~~~~~~"
+    def shutdown(self):
+        """Writes out the queued records and stops the writer thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def _hold_files(self):
+        """Waits for the writer thread to finish its write before a fork,
+        a child can't use a file left in the middle of one"""
+        if self._listener is not None:
+            for handler in self._listener.handlers:
+                handler.acquire()
+
+    def _release_files(self):
+        """Lets the writer thread go on after a fork"""
+        if self._listener is not None:
+            for handler in self._listener.handlers:
+                handler.release()
+
+    def _restart(self):
+        """Starts a new writer thread, with a new queue, in a forked child.
+        The records queued by the parent are its own to write. The handler
+        locks were reset by logging."""
+        if self._listener is not None:
+            file_handler, error_handler, dump_handler = self._listener.handlers
+            # the parent's thread isn't there to be stopped
+            self._listener = None
+            for handler in [file_handler, error_handler, dump_handler]:
+                handler.close()
+            self.configure(
+                self.logger.level,
+                queued=True,
+                file_path=file_handler.baseFilename,
+                err_file_path=error_handler.baseFilename,
+                dump_file_path=dump_handler.baseFilename,
             )
 
-        return cls._instance
+    def _is_dump(self, record: logging.LogRecord) -> bool:
+        """Filter of the dump file handler"""
+        return record.name == self.dumps.name
+
+    def _not_dump(self, record: logging.LogRecord) -> bool:
+        """Filter of the log file handler"""
+        return record.name != self.dumps.name
 
-    def info(self, message: str):
+    def _log(self, level: int, message, args: tuple):
+        """Logs a message, if its level is enabled
+
+        Args:
+            level (int): level of the message
+            message (str | callable): message, %-style formatted with args,
+                or a callable returning it
+            args (tuple): arguments of message
+        """
+        if self.logger.isEnabledFor(level):
+            if callable(message):
+                message = message()
+            self.logger.log(level, message, *args)
+
+    def info(self, message, *args):
         """Log INFO level message
 
         Args:
-            message (str): message to log
+            message (str | callable): message to log, see `_log`
         """
-        self.logger.info(message)
+        self._log(logging.INFO, message, args)
 
-    def debug(self, message: str):
+    def debug(self, message, *args):
         """Log DEBUG level message
 
         Args:
-            message (str): message to log
+            message (str | callable): message to log, see `_log`
         """
-        self.logger.debug(message)
+        self._log(logging.DEBUG, message, args)
 
-    def error(self, message: str):
+    def error(self, message, *args):
         """Log ERROR level message
 
         Args:
-            message (str): message to log
+            message (str | callable): message to log, see `_log`
         """
-        self.logger.error(message)
+        self._log(logging.ERROR, message, args)
 
-    def warn(self, message: str):
+    def warn(self, message, *args):
         """Log WARNING level message
 
         Args:
-            message (str): message to log
+            message (str | callable): message to log, see `_log`
         """
-        self.logger.warning(message)
+        self._log(logging.WARNING, message, args)
 
-    def critical(self, message: str):
+    def critical(self, message, *args):
         """Log CRITICAL level message
 
         Args:
-            message (str): message to log
+            message (str | callable): message to log, see `_log`
+        """
+        self._log(logging.CRITICAL, message, args)
+
+    def table(self, title: str, table):
+        """Log a table at DEBUG level, into the size capped dump file
+        instead of the log file
+
+        Args:
+            title (str): what the table lists
+            table (str | callable): table, or a callable rendering it
         """
-        self.logger.critical(message)
+        if self.dumps.isEnabledFor(logging.DEBUG):
+            if callable(table):
+                table = table()
+            self.dumps.debug("%s\n%s", title, table)
@@ -0,0 +1,124 @@
+"""
+Module for the record types held by Storage
+
+Each record type keeps its fields in `__slots__` instead of a per-record
+dict, which is most of the memory taken by large datasets. Records still
+behave like the dicts of the json files (`record["title"]`,
+`record.get("borrowed")`, `"available" in record`), so the managers and
+indexes work on them unchanged. A field set to None counts as missing,
+just like a key left out of the json files.
+"""
+
+import sys
+from collections.abc import MutableMapping
+
+
+class Record(MutableMapping):
+    """Base of the record types, a mapping over the fields in __slots__"""
+
+    __slots__ = ()
+    # fields whose values repeat a lot, interned so records share them
+    INTERNED = ()
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            value = fields.pop(field, None)
+            if field in self.INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(self, field, value)
+        if fields:
+            raise KeyError(
+                f"Unknown {type(self).__name__} fields: {sorted(fields)}"
+            )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Record":
+        """Creates a record from its json layout"""
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        """Converts the record to its json layout, without unset fields"""
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__
+            if getattr(self, field) is not None
+        }
+
+    def __getitem__(self, field: str):
+        value = getattr(self, field, None) if field in self.__slots__ else None
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __setitem__(self, field: str, value) -> None:
+        if field not in self.__slots__:
+            raise KeyError(field)
+        object.__setattr__(self, field, value)
+
+    def __delitem__(self, field: str) -> None:
+        # raises KeyError for unset fields, like dicts do
+        self[field]
+        object.__setattr__(self, field, None)
+
+    def __iter__(self):
+        for field in self.__slots__:
+            if getattr(self, field) is not None:
+                yield field
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()})"
+
+
+class User(Record):
+    """A user: name, email and the isbns of the borrowed books"""
+
+    __slots__ = ("name", "email", "borrowed")
+
+
+class Book(Record):
+    """A book: title, author and availability"""
+
+    __slots__ = ("title", "author", "available")
+
+
+class Transaction(Record):
+    """A checkin or checkout of a book by a user"""
+
+    __slots__ = ("user_id", "isbn", "action", "timestamp")
+    INTERNED = ("user_id", "isbn", "action")
+
+
+# dataset name -> type of its records
+RECORD_TYPES = {"users": User, "books": Book, "transactions": Transaction}
+
+
+def to_records(name: str, content):
+    """Converts a dataset from its json layout to records
+
+    Args:
+        name (str): name of the dataset
+        content (dict | list): key -> record dicts, or a list of them
+
+    Returns:
+        dict | list: the same layout holding records
+    """
+    record_type = RECORD_TYPES[name]
+    if isinstance(content, list):
+        return [record_type.from_dict(item) for item in content]
+    return {key: record_type.from_dict(item) for key, item in content.items()}
+
+
+def to_json(record) -> dict:
+    """json `default` hook, serializes records in their json layout"""
+    if isinstance(record, Record):
+        return record.to_dict()
+    raise TypeError(
+        f"Object of type {type(record).__name__} is not JSON serializable"
+    )
+
+
+if __name__ == "__main__":
+    pass
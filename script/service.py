@@ -0,0 +1,567 @@
+"""
+Module for the JSON HTTP service over the library data
+
+Kiosks and web front ends work on the same data as the menus through it:
+the book, user and checkout operations of the managers, answered as JSON
+by an asyncio server from the standard library. Lookups are answered by a
+pool of threads reading the storage side by side, and changes are applied
+one at a time by a single thread, so the event loop keeps taking requests
+while a save waits on the disk.
+
+Routes:
+    GET  /books?q=WORDS&field=title|author   or   ?available=1
+         or   ?offset=N&limit=N
+    GET  /books/{isbn}
+    GET  /books/{isbn}/transactions
+    POST /books         {"title": ..., "author": ..., "isbn": ...}
+    GET  /users?name=NAME   or   ?email=EMAIL   or   ?offset=N&limit=N
+    GET  /users/{id}
+    GET  /users/{id}/transactions
+    POST /users         {"name": ..., "email": ...}
+    POST /checkouts     {"user_id": ..., "isbn": ...}
+    POST /checkins      {"user_id": ..., "isbn": ...}
+
+Run: `python -m script.service [--host HOST] [--port PORT]`
+"""
+
+import argparse
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from itertools import islice
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from script.book import BookManagement
+from script.check import TRANSACTION_COLUMNS, TransactionManagement
+from script.loggers import LibraryLogger
+from script.settings import (
+    PAGE_SIZE,
+    SERVICE_HOST,
+    SERVICE_LOOKUP_THREADS,
+    SERVICE_PORT,
+)
+from script.storage import Storage
+from script.user import UserManagement
+
+logger = LibraryLogger()
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 2**20
+# Most books or users listed by one request
+MAX_PAGE_SIZE = 1000
+
+
+class HTTPError(Exception):
+    """Raised while answering a request, to answer with an error status"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """Reads one HTTP/1.1 request off a connection
+
+    Args:
+        reader (asyncio.StreamReader): the connection's reader
+
+    Raises:
+        HTTPError: for a malformed or too large request
+
+    Returns:
+        tuple | None: (method, target, headers, body), None once the
+            client closed the connection
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as error:
+        if not error.partial:
+            return None
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Incomplete request")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(
+            HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Headers too large"
+        )
+
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = request_line.split(" ")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(
+            HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            f"Body larger than {MAX_BODY_SIZE} bytes",
+        )
+    try:
+        body = await reader.readexactly(length) if length else b""
+    except asyncio.IncompleteReadError:
+        return None
+    return method.upper(), target, headers, body
+
+
+def format_response(status: HTTPStatus, payload, keep_alive: bool) -> bytes:
+    """Formats an HTTP/1.1 response with a JSON body
+
+    Args:
+        status (HTTPStatus): response status
+        payload: json serializable body
+        keep_alive (bool): the connection stays open for the next request
+
+    Returns:
+        bytes: the response
+    """
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+def book_json(isbn: str, book) -> dict:
+    """Copies a book into a plain dict, safe to serialize out of the lock"""
+    return {
+        "isbn": isbn,
+        "title": book.get("title"),
+        "author": book.get("author"),
+        "available": book.get("available", False),
+    }
+
+
+def user_json(user_id: str, user) -> dict:
+    """Copies a user into a plain dict, safe to serialize out of the lock"""
+    return {
+        "user_id": user_id,
+        "name": user.get("name"),
+        "email": user.get("email"),
+        "borrowed": list(user.get("borrowed") or []),
+    }
+
+
+def transaction_json(transaction) -> dict:
+    """Copies a transaction into a plain dict"""
+    return {column: transaction.get(column) for column in TRANSACTION_COLUMNS}
+
+
+def get_fields(data: dict, *names: str) -> list:
+    """Gets the cleaned string fields of a request body
+
+    Args:
+        data (dict): request body
+        *names (str): names of the required fields
+
+    Raises:
+        HTTPError: if a field is missing or not a string
+
+    Returns:
+        list: stripped and lowercased values, in the order of names
+    """
+    values = []
+    for name in names:
+        value = data.get(name)
+        if not isinstance(value, str):
+            raise HTTPError(
+                HTTPStatus.BAD_REQUEST, f"Field {name} must be a string"
+            )
+        values.append(value.strip().lower())
+    return values
+
+
+def get_page(query: dict) -> tuple:
+    """Gets the offset and limit of a listing from the query string
+
+    Args:
+        query (dict): query string parameters
+
+    Raises:
+        HTTPError: if they aren't numbers in range
+
+    Returns:
+        tuple: (offset, limit)
+    """
+    try:
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "offset and limit: numbers")
+    if offset < 0 or not 0 < limit <= MAX_PAGE_SIZE:
+        raise HTTPError(
+            HTTPStatus.BAD_REQUEST,
+            f"offset from 0, limit from 1 to {MAX_PAGE_SIZE}",
+        )
+    return offset, limit
+
+
+class LibraryService:
+    """HTTP service answering requests with the managers' operations on
+    a storage
+
+    `Use as: server = await LibraryService(storage).start(host, port)`
+    """
+
+    def __init__(
+        self, storage: Storage, lookup_threads: int = SERVICE_LOOKUP_THREADS
+    ):
+        self.storage = storage
+        self.bm = BookManagement(storage)
+        self.um = UserManagement(storage)
+        self.tm = TransactionManagement(storage)
+        # both off the event loop: lookups side by side, changes one at a
+        # time, which they would be anyway under the storage lock
+        self._lookups = ThreadPoolExecutor(
+            lookup_threads, thread_name_prefix="lookup"
+        )
+        self._changes = ThreadPoolExecutor(1, thread_name_prefix="change")
+        # (method, path pattern, handler), handlers get the path groups
+        # then the query string (GET) or the json body (POST)
+        self.routes = [
+            (method, re.compile(pattern), handler)
+            for method, pattern, handler in [
+                ("GET", r"/books", self.get_books),
+                ("POST", r"/books", self.add_book),
+                ("GET", r"/books/([^/]+)", self.get_book),
+                ("GET", r"/books/([^/]+)/transactions", self.get_book_log),
+                ("GET", r"/users", self.get_users),
+                ("POST", r"/users", self.create_user),
+                ("GET", r"/users/([^/]+)", self.get_user),
+                ("GET", r"/users/([^/]+)/transactions", self.get_user_log),
+                ("POST", r"/checkouts", self.check_out),
+                ("POST", r"/checkins", self.check_in),
+            ]
+        ]
+
+    async def start(
+        self, host: str = SERVICE_HOST, port: int = SERVICE_PORT
+    ) -> asyncio.Server:
+        """Starts listening, port 0 picks a free one
+
+        Args:
+            host (str, optional): address. Defaults to SERVICE_HOST.
+            port (int, optional): port. Defaults to SERVICE_PORT.
+
+        Returns:
+            asyncio.Server: the listening server
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        logger.info(f"Service listening on http://{host}:{port}")
+        return server
+
+    def close(self) -> None:
+        """Waits for the operations still running, then stops the threads"""
+        self._lookups.shutdown()
+        self._changes.shutdown()
+
+    async def handle(self, reader, writer) -> None:
+        """Answers the requests of one connection, kept open between them
+        unless the client asks to close it
+
+        Args:
+            reader (asyncio.StreamReader): the connection's reader
+            writer (asyncio.StreamWriter): the connection's writer
+        """
+        try:
+            while True:
+                request = None
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    status, payload = await self.respond(method, target, body)
+                except HTTPError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except Exception as error:
+                    logger.error(f"Service request failed: {error!r}")
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {"error": "Internal error"}
+
+                # after a malformed request the next one can't be found
+                keep_alive = (
+                    request is not None
+                    and request[2].get("connection", "").lower() != "close"
+                )
+                writer.write(format_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            # the client went away
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, method: str, target: str, body: bytes) -> tuple:
+        """Runs the handler of a request in its threads
+
+        Args:
+            method (str): request method
+            target (str): request path and query string
+            body (bytes): request body
+
+        Raises:
+            HTTPError: if there is no such route, or the body isn't a
+                JSON object
+
+        Returns:
+            tuple: (status, json serializable payload)
+        """
+        url = urlsplit(target)
+        handler, args = self.route(method, url.path.rstrip("/") or "/")
+        if method == "POST":
+            try:
+                data = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not JSON")
+            if not isinstance(data, dict):
+                raise HTTPError(
+                    HTTPStatus.BAD_REQUEST, "Body must be a JSON object"
+                )
+            executor = self._changes
+        else:
+            data = dict(parse_qsl(url.query))
+            executor = self._lookups
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, partial(handler, *args, data)
+        )
+
+    def route(self, method: str, path: str) -> tuple:
+        """Finds the handler of a request
+
+        Args:
+            method (str): request method
+            path (str): request path
+
+        Raises:
+            HTTPError: if no route has the path, or not with the method
+
+        Returns:
+            tuple: (handler, list of the decoded path groups)
+        """
+        path_found = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method == method:
+                return handler, [unquote(group) for group in match.groups()]
+            path_found = True
+        if path_found:
+            raise HTTPError(
+                HTTPStatus.METHOD_NOT_ALLOWED,
+                f"{method} not allowed on {path}",
+            )
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+
+    # Lookups, run by the lookup threads
+
+    def get_books(self, query: dict) -> tuple:
+        """Books with all the words of 'q' in their 'field' (title or
+        author), the books available now with 'available', or a page of
+        all the books"""
+        if query.get("available", "0") not in ["0", "false"]:
+            return self.get_available_books(query)
+        words = query.get("q", "").strip().lower()
+        field = query.get("field", "title")
+        if words and field not in ["title", "author"]:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "field: title or author")
+        with self.storage.reading():
+            if words:
+                books = self.bm._find_books(words, how=field).items()
+            else:
+                offset, limit = get_page(query)
+                books_data = self.storage.data["books"]
+                books = islice(books_data.items(), offset, offset + limit)
+            books = [book_json(isbn, book) for isbn, book in books]
+        return HTTPStatus.OK, {"books": books}
+
+    def get_available_books(self, query: dict) -> tuple:
+        """The books available now, from the availability index"""
+        with self.storage.reading():
+            books_data = self.storage.data["books"]
+            books = [
+                book_json(isbn, books_data[isbn])
+                for isbn in self.storage.available_books()
+            ]
+        return HTTPStatus.OK, {"books": books}
+
+    def get_book(self, isbn: str, query: dict) -> tuple:
+        """A book by isbn"""
+        isbn = isbn.strip().lower()
+        with self.storage.reading():
+            found = self.bm._find_books(isbn, how="isbn")
+            if not found:
+                raise HTTPError(
+                    HTTPStatus.NOT_FOUND,
+                    f"Book with ISBN {isbn} does not exist",
+                )
+            return HTTPStatus.OK, book_json(isbn, found[isbn])
+
+    def get_book_log(self, isbn: str, query: dict) -> tuple:
+        """Checkins and checkouts of a book, in the order they happened"""
+        isbn = isbn.strip().lower()
+        with self.storage.reading():
+            if isbn not in self.storage.data["books"]:
+                raise HTTPError(
+                    HTTPStatus.NOT_FOUND,
+                    f"Book with ISBN {isbn} does not exist",
+                )
+            transactions = self.storage.find_transactions("isbn", isbn)
+        return HTTPStatus.OK, {
+            "transactions": [transaction_json(t) for t in transactions]
+        }
+
+    def get_users(self, query: dict) -> tuple:
+        """Users with a 'name' or an 'email', or a page of all the users"""
+        how = next((how for how in ["email", "name"] if how in query), None)
+        with self.storage.reading():
+            if how is not None:
+                value = query[how].strip().lower()
+                users = self.um._find_users(value, how=how).items()
+            else:
+                offset, limit = get_page(query)
+                users_data = self.storage.data["users"]
+                users = islice(users_data.items(), offset, offset + limit)
+            users = [user_json(user_id, user) for user_id, user in users]
+        return HTTPStatus.OK, {"users": users}
+
+    def get_user(self, user_id: str, query: dict) -> tuple:
+        """A user by id"""
+        user_id = user_id.strip().lower()
+        with self.storage.reading():
+            found = self.um._find_users(user_id, how="uid")
+            if not found:
+                raise HTTPError(
+                    HTTPStatus.NOT_FOUND,
+                    f"User with ID {user_id} does not exist",
+                )
+            return HTTPStatus.OK, user_json(user_id, found[user_id])
+
+    def get_user_log(self, user_id: str, query: dict) -> tuple:
+        """Checkins and checkouts of a user, in the order they happened"""
+        user_id = user_id.strip().lower()
+        with self.storage.reading():
+            if user_id not in self.storage.data["users"]:
+                raise HTTPError(
+                    HTTPStatus.NOT_FOUND,
+                    f"User with ID {user_id} does not exist",
+                )
+            transactions = self.storage.find_transactions("user_id", user_id)
+        return HTTPStatus.OK, {
+            "transactions": [transaction_json(t) for t in transactions]
+        }
+
+    # Changes, run by the change thread
+
+    def add_book(self, data: dict) -> tuple:
+        """Adds a new book"""
+        title, author, isbn = get_fields(data, "title", "author", "isbn")
+        error = self.bm._add_book(title, author, isbn)
+        if error is not None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, error)
+        logger.info(f"Service added Book with ISBN: {isbn}")
+        return HTTPStatus.CREATED, {"isbn": isbn}
+
+    def create_user(self, data: dict) -> tuple:
+        """Creates a new user, with a new user id"""
+        name, email = get_fields(data, "name", "email")
+        user_id, error = self.um._create_user(name, email)
+        if error is not None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, error)
+        logger.info(f"Service added User with ID: {user_id}")
+        return HTTPStatus.CREATED, {"user_id": user_id}
+
+    def check_out(self, data: dict) -> tuple:
+        """Checks out a book to a user"""
+        return self._check(data, self.tm._check_out, "checked out")
+
+    def check_in(self, data: dict) -> tuple:
+        """Checks in a book a user borrowed"""
+        return self._check(data, self.tm._check_in, "checked in")
+
+    def _check(self, data: dict, apply, done: str) -> tuple:
+        """Applies a checkout or checkin and saves it
+
+        Args:
+            data (dict): request body with user_id and isbn
+            apply (callable): _check_out or _check_in of the manager
+            done (str): past tense of the action, for the log
+
+        Returns:
+            tuple: (status, payload)
+        """
+        user_id, isbn = get_fields(data, "user_id", "isbn")
+        with self.storage.atomic():
+            # a missing user or book isn't a conflict with the data
+            missing = (
+                user_id not in self.storage.data["users"]
+                or isbn not in self.storage.data["books"]
+            )
+            error = apply(user_id, isbn)
+        if error is not None:
+            status = HTTPStatus.NOT_FOUND if missing else HTTPStatus.CONFLICT
+            raise HTTPError(status, error)
+        logger.info(f"Service: User: {user_id} {done} Book: {isbn}")
+        return HTTPStatus.OK, {"user_id": user_id, "isbn": isbn}
+
+
+async def serve(host: str, port: int) -> None:
+    """Serves the library data until interrupted
+
+    Args:
+        host (str): address
+        port (int): port
+    """
+    service = LibraryService(Storage())
+    server = await service.start(host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv: list = None) -> None:
+    """Runs the service from command line arguments
+
+    Args:
+        argv (list, optional): arguments, sys.argv[1:] if None.
+            Defaults to None.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m script.service",
+        description="Serve the library data as a JSON HTTP service.",
+    )
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("Service stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 """Script to contain configurations and settings"""
 
 import os
-from logging import DEBUG  # INFO,; WARNING,; ERROR
 
 # Project Root Settings --
 ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,17 +20,73 @@ DATA_FILE_PATHS = {
     file_name: os.path.join(DATA_PATH, file_name + file_extension)
     for file_name in DATA_FILE_NAMES
 }
+# Keep transactions as an append-only json lines journal, so a checkout
+# appends one line instead of rewriting the whole history.
+# An existing transactions.json is migrated into it on first load.
+TRANSACTIONS_JOURNAL = True
+if TRANSACTIONS_JOURNAL:
+    DATA_FILE_PATHS["transactions"] = os.path.join(
+        DATA_PATH, "transactions.jsonl"
+    )
+# Transactions in the journal before a snapshot: the books and users files
+# are then rewritten with the state the transactions led to, and the
+# journal is moved to an archived segment (transactions.000001.jsonl, ...).
+# Checkouts and checkins in between only append to the journal, which is
+# replayed over the books and users files on load.
+SNAPSHOT_INTERVAL = 1000
+# Write-ahead log: each save is recorded and synced here before the data
+# files are written, and redone on load if a crash cut it short. It is
+# emptied at snapshots, or once it grows past WAL_MAX_SIZE bytes.
+WAL_FILE_PATH = os.path.join(DATA_PATH, "wal.jsonl")
+WAL_MAX_SIZE = 4 * 2**20
+# Storage metadata, like the next free user id, and the lock guarding it
+META_FILE_PATH = os.path.join(DATA_PATH, "meta.json")
+META_LOCK_PATH = META_FILE_PATH + ".lock"
+# Version counter of each dataset, bumped by every save, so a process can
+# tell another one saved since it last read the data. The lock is held by
+# a process while it saves (or runs an `atomic` block), so several
+# processes can share the data directory.
+VERSIONS_FILE_PATH = os.path.join(DATA_PATH, "versions.json")
+STORAGE_LOCK_PATH = VERSIONS_FILE_PATH + ".lock"
+
+# Storage backend: "json" keeps each dataset in the files above,
+# "sqlite" keeps them in a SQLite database (imported from the json
+# files on first use)
+STORAGE_BACKEND = "json"
+SQLITE_DB_PATH = os.path.join(DATA_PATH, "library.db")
+
+# HTTP service (script/service.py): address it listens on, and threads
+# answering lookups while changes are applied one at a time
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_LOOKUP_THREADS = 8
+
+
+# Display Related Settings --
+# Rows per page when listing books and users
+PAGE_SIZE = 20
+# Rejected rows printed by bulk imports, all of them are logged
+IMPORT_REPORT_LIMIT = 20
 
 
 # LOG Related Settings --
-LOG_LEVEL = DEBUG
+# Level name (DEBUG, INFO, WARNING, ERROR), set per deployment with the
+# LIBRARY_LOG_LEVEL environment variable
+LOG_LEVEL = os.environ.get("LIBRARY_LOG_LEVEL", "DEBUG").upper()
+# Write the log files from a background thread, LIBRARY_LOG_QUEUED=0 writes
+# them in the logging call
+LOG_QUEUED = os.environ.get("LIBRARY_LOG_QUEUED", "1") != "0"
 LOG_DIR = "log"
 LOG_FILE_NAME = "library.log"
 LOG_ERR_FILE_NAME = "error.log"
+# Table dumps of the listings, at DEBUG level, capped in size
+LOG_DUMP_FILE_NAME = "tables.log"
+LOG_DUMP_MAX_BYTES = 5 * 1024 * 1024
 # log dir and file paths
 LOG_DIR_PATH = os.path.join(ROOT_PATH, LOG_DIR)
 LOG_FILE_PATH = os.path.join(LOG_DIR_PATH, LOG_FILE_NAME)
 LOG_ERR_FILE_PATH = os.path.join(LOG_DIR_PATH, LOG_ERR_FILE_NAME)
+LOG_DUMP_FILE_PATH = os.path.join(LOG_DIR_PATH, LOG_DUMP_FILE_NAME)
 
 # Create required dir, if doesn't exist already
 if not os.path.exists(LOG_DIR_PATH):
@@ -0,0 +1,869 @@
+"""
+Module for the SQLite storage backend
+
+Keeps users, books and transactions in indexed SQLite tables, while
+exposing them through the same `Storage.data` contract the managers use:
+users and books as mappings (key -> record) and transactions as an
+appendable sequence. Records are read from the database on access and only
+the changed ones are written back by `save_data`, in a single transaction.
+
+Select it with `STORAGE_BACKEND = "sqlite"` in script/settings.py.
+"""
+
+import json
+import os
+import sqlite3
+from collections.abc import ItemsView, MutableMapping, Sequence, ValuesView
+
+from script.indexes import normalize, parse_query, text_matches, tokenize
+from script.loggers import LibraryLogger
+from script.records import RECORD_TYPES
+from script.settings import DATA_FILE_PATHS, SQLITE_DB_PATH
+from script.storage import Storage, journal_segments, replay_transactions
+
+logger = LibraryLogger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    borrowed TEXT
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS users_name ON users (name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS books (
+    isbn TEXT PRIMARY KEY,
+    title TEXT,
+    author TEXT,
+    available INTEGER
+);
+CREATE INDEX IF NOT EXISTS books_title ON books (title);
+CREATE INDEX IF NOT EXISTS books_author ON books (author);
+CREATE INDEX IF NOT EXISTS books_available ON books (available);
+
+CREATE TABLE IF NOT EXISTS book_tokens (
+    field TEXT,
+    token TEXT,
+    isbn TEXT
+);
+CREATE INDEX IF NOT EXISTS book_tokens_token ON book_tokens (field, token);
+CREATE INDEX IF NOT EXISTS book_tokens_isbn ON book_tokens (isbn);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT,
+    isbn TEXT,
+    action TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_user ON transactions (user_id);
+CREATE INDEX IF NOT EXISTS transactions_isbn ON transactions (isbn);
+CREATE INDEX IF NOT EXISTS transactions_time ON transactions (timestamp);
+"""
+
+# dataset name -> (key column, record columns)
+TABLES = {
+    "users": ("id", ("name", "email", "borrowed")),
+    "books": ("isbn", ("title", "author", "available")),
+}
+TRANSACTION_COLUMNS = ("user_id", "isbn", "action", "timestamp")
+# dataset name -> (tokens table, columns whose words are kept in it)
+TOKEN_TABLES = {"books": ("book_tokens", ("title", "author"))}
+# columns holding lists, stored as json text
+JSON_COLUMNS = {"borrowed"}
+# columns holding booleans, stored as 0/1
+BOOL_COLUMNS = {"available"}
+
+
+def encode_value(column: str, value):
+    """Converts a record value to its SQLite column value"""
+    if value is None:
+        return None
+    if column in JSON_COLUMNS:
+        return json.dumps(value)
+    if column in BOOL_COLUMNS:
+        return int(bool(value))
+    return value
+
+
+def decode_row(record_type: type, columns: tuple, row: tuple):
+    """Converts a table row back to a record. NULL columns are left out,
+    just like missing keys in the json files.
+
+    Args:
+        record_type (type): record type from script/records.py
+        columns (tuple): column names of the row
+        row (tuple): row values
+
+    Returns:
+        Record: record
+    """
+    record = {}
+    for column, value in zip(columns, row):
+        if value is None:
+            continue
+        if column in JSON_COLUMNS:
+            value = json.loads(value)
+        elif column in BOOL_COLUMNS:
+            value = bool(value)
+        record[column] = value
+    return record_type(**record)
+
+
+class _TableItems(ItemsView):
+    """Items view reading the whole table with one query"""
+
+    def __iter__(self):
+        yield from self._mapping._iter_items()
+
+
+class _TableValues(ValuesView):
+    """Values view reading the whole table with one query"""
+
+    def __iter__(self):
+        for _, record in self._mapping._iter_items():
+            yield record
+
+
+class SQLiteTable(MutableMapping):
+    """
+    Mapping facade over a table: key -> record.
+
+    Records handed out are cached until the next save, so changes made to
+    them in place (then marked with `Storage.mark_dirty`) are the ones
+    written back. Records met while iterating are not cached.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, table: str):
+        self.connection = connection
+        self.table = table
+        self.key, self.columns = TABLES[table]
+        self.record_type = RECORD_TYPES[table]
+        # key -> record handed out or set since the last save
+        self._cache = {}
+        # keys set which are not in the table yet
+        self._new = set()
+        # keys deleted which are still in the table
+        self._removed = set()
+        # keys set or deleted through the mapping since the last save
+        self.changed = set()
+
+    def _select(self, key: str):
+        """Reads a single record from the table, None if not there"""
+        row = self.connection.execute(
+            f"SELECT {', '.join(self.columns)} FROM {self.table} "
+            f"WHERE {self.key} = ?",
+            (key,),
+        ).fetchone()
+        return (
+            None
+            if row is None
+            else decode_row(self.record_type, self.columns, row)
+        )
+
+    def __getitem__(self, key: str) -> dict:
+        if key in self._cache:
+            return self._cache[key]
+        if key in self._removed:
+            raise KeyError(key)
+        record = self._select(key)
+        if record is None:
+            raise KeyError(key)
+        self._cache[key] = record
+        return record
+
+    def __contains__(self, key) -> bool:
+        if key in self._cache:
+            return True
+        if key in self._removed:
+            return False
+        return (
+            self.connection.execute(
+                f"SELECT 1 FROM {self.table} WHERE {self.key} = ?", (key,)
+            ).fetchone()
+            is not None
+        )
+
+    def __setitem__(self, key: str, record: dict) -> None:
+        if key not in self._cache and key not in self:
+            self._new.add(key)
+        self._removed.discard(key)
+        self._cache[key] = record
+        self.changed.add(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        if key in self._new:
+            self._new.discard(key)
+        else:
+            self._removed.add(key)
+        self.changed.add(key)
+
+    def __iter__(self):
+        for (key,) in self.connection.execute(
+            f"SELECT {self.key} FROM {self.table} ORDER BY rowid"
+        ):
+            if key not in self._removed:
+                yield key
+        yield from [key for key in self._cache if key in self._new]
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute(
+            f"SELECT COUNT(*) FROM {self.table}"
+        ).fetchone()
+        return count - len(self._removed) + len(self._new)
+
+    def _iter_items(self):
+        """Streams (key, record) pairs with one query, taking the cached
+        version of records which were handed out"""
+        cursor = self.connection.execute(
+            f"SELECT {self.key}, {', '.join(self.columns)} "
+            f"FROM {self.table} ORDER BY rowid"
+        )
+        for row in cursor:
+            key = row[0]
+            if key in self._removed:
+                continue
+            if key in self._cache:
+                yield key, self._cache[key]
+            else:
+                yield key, decode_row(self.record_type, self.columns, row[1:])
+        yield from [
+            (key, record)
+            for key, record in self._cache.items()
+            if key in self._new
+        ]
+
+    def find(self, column: str, value: str) -> list:
+        """Finds the keys of records whose column equals value, ignoring
+        case, through the column's index. Unsaved changes are taken into
+        account.
+
+        Args:
+            column (str): column to look in
+            value (str): value to look for
+
+        Returns:
+            list: keys of the matching records
+        """
+        value = normalize(value)
+        keys = [
+            key
+            for (key,) in self.connection.execute(
+                f"SELECT {self.key} FROM {self.table} "
+                f"WHERE {column} = ? COLLATE NOCASE ORDER BY rowid",
+                (value,),
+            )
+            if key not in self._removed and key not in self._cache
+        ]
+        # records changed since the last save are matched in memory
+        keys.extend(
+            key
+            for key, record in self._cache.items()
+            if record.get(column) is not None
+            and normalize(record[column]) == value
+        )
+        return keys
+
+    def flagged(self, column: str) -> list:
+        """Finds the keys of records whose boolean column is set, through
+        the column's index. Unsaved changes are taken into account.
+
+        Args:
+            column (str): boolean column
+
+        Returns:
+            list: keys of the matching records, sorted
+        """
+        keys = {
+            key
+            for (key,) in self.connection.execute(
+                f"SELECT {self.key} FROM {self.table} WHERE {column} = 1"
+            )
+            if key not in self._removed and key not in self._cache
+        }
+        # records changed since the last save are checked in memory
+        keys.update(
+            key for key, record in self._cache.items() if record.get(column)
+        )
+        return sorted(keys)
+
+    def items(self):
+        return _TableItems(self)
+
+    def values(self):
+        return _TableValues(self)
+
+    def flush(self, keys: set) -> int:
+        """Writes the given changed records to the table. Must be called
+        inside a database transaction.
+
+        Args:
+            keys (set): keys of the records to write
+
+        Returns:
+            int: number of rows written
+        """
+        upserts, deletes = [], []
+        for key in keys:
+            if key in self._removed:
+                deletes.append((key,))
+            elif key in self._cache:
+                record = self._cache[key]
+                upserts.append(
+                    (key,)
+                    + tuple(
+                        encode_value(column, record.get(column))
+                        for column in self.columns
+                    )
+                )
+        if deletes:
+            self.connection.executemany(
+                f"DELETE FROM {self.table} WHERE {self.key} = ?", deletes
+            )
+        if upserts:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} "
+                f"({self.key}, {', '.join(self.columns)}) "
+                f"VALUES ({', '.join('?' * (len(self.columns) + 1))})",
+                upserts,
+            )
+        if self.table in TOKEN_TABLES:
+            self.write_tokens(
+                [key for (key,) in deletes] + [row[0] for row in upserts]
+            )
+        return len(upserts) + len(deletes)
+
+    def write_tokens(self, keys: list) -> None:
+        """Replaces the tokens of the given records in the tokens table by
+        the words of their current (cached or stored) text columns. Must be
+        called inside a database transaction.
+
+        Args:
+            keys (list): keys of the records
+        """
+        tokens_table, columns = TOKEN_TABLES[self.table]
+        self.connection.executemany(
+            f"DELETE FROM {tokens_table} WHERE {self.key} = ?",
+            [(key,) for key in keys],
+        )
+        rows = []
+        for key in keys:
+            record = self._cache.get(key) or self._select(key)
+            if record is None:
+                continue
+            for column in columns:
+                rows.extend(
+                    (column, token, key)
+                    for token in set(tokenize(record.get(column, "")))
+                )
+        self.connection.executemany(
+            f"INSERT INTO {tokens_table} (field, token, {self.key}) "
+            "VALUES (?, ?, ?)",
+            rows,
+        )
+
+    def search(self, column: str, query: str) -> list:
+        """Finds the keys of records whose column contains every word of
+        the query, through the tokens table. A word ending with '*' matches
+        as a prefix. Unsaved changes are taken into account.
+
+        Args:
+            column (str): text column to search in
+            query (str): words to search for
+
+        Returns:
+            list: keys of the matching records, sorted
+        """
+        terms = parse_query(query)
+        if not terms:
+            return []
+
+        tokens_table, _ = TOKEN_TABLES[self.table]
+        selects, params = [], []
+        for token, is_prefix in terms:
+            if is_prefix:
+                selects.append(
+                    f"SELECT {self.key} FROM {tokens_table} "
+                    "WHERE field = ? AND token >= ? AND token < ?"
+                )
+                params.extend([column, token, token + "\U0010ffff"])
+            else:
+                selects.append(
+                    f"SELECT {self.key} FROM {tokens_table} "
+                    "WHERE field = ? AND token = ?"
+                )
+                params.extend([column, token])
+
+        keys = {
+            key
+            for (key,) in self.connection.execute(
+                " INTERSECT ".join(selects), params
+            )
+            if key not in self._removed and key not in self._cache
+        }
+        # records changed since the last save are matched in memory
+        keys.update(
+            key
+            for key, record in self._cache.items()
+            if record.get(column) is not None
+            and text_matches(terms, record[column])
+        )
+        return sorted(keys)
+
+    def reset(self) -> None:
+        """Forgets cached records and pending changes"""
+        self._cache.clear()
+        self._new.clear()
+        self._removed.clear()
+        self.changed.clear()
+
+
+class SQLiteLog(Sequence):
+    """
+    Appendable sequence facade over the transactions table.
+
+    Row ids are the 1-based positions in the sequence, so items can be
+    fetched by index. Appended items are pending until the next save.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, table: str):
+        self.connection = connection
+        self.table = table
+        self.columns = TRANSACTION_COLUMNS
+        self.record_type = RECORD_TYPES[table]
+        self.pending = []
+        self.recount()
+
+    def recount(self) -> None:
+        """Re-reads the number of stored items"""
+        (self._count,) = self.connection.execute(
+            f"SELECT COUNT(*) FROM {self.table}"
+        ).fetchone()
+
+    def __len__(self) -> int:
+        return self._count + len(self.pending)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transaction index out of range")
+        if index >= self._count:
+            return self.pending[index - self._count]
+        row = self.connection.execute(
+            f"SELECT {', '.join(self.columns)} FROM {self.table} "
+            "WHERE id = ?",
+            (index + 1,),
+        ).fetchone()
+        return decode_row(self.record_type, self.columns, row)
+
+    def __iter__(self):
+        cursor = self.connection.execute(
+            f"SELECT {', '.join(self.columns)} FROM {self.table} "
+            "ORDER BY id"
+        )
+        for row in cursor:
+            yield decode_row(self.record_type, self.columns, row)
+        yield from list(self.pending)
+
+    def append(self, item: dict) -> None:
+        """Adds an item, stored on the next save"""
+        self.pending.append(item)
+
+    def extend(self, items) -> None:
+        """Adds items, stored on the next save"""
+        self.pending.extend(items)
+
+    def find(self, column: str, value: str) -> list:
+        """Finds the items whose column equals value, in order, through
+        the column's index. Pending items are taken into account.
+
+        Args:
+            column (str): column to look in
+            value (str): value to look for
+
+        Returns:
+            list: matching items
+        """
+        value = normalize(value)
+        items = [
+            decode_row(self.record_type, self.columns, row)
+            for row in self.connection.execute(
+                f"SELECT {', '.join(self.columns)} FROM {self.table} "
+                f"WHERE {column} = ? ORDER BY id",
+                (value,),
+            )
+        ]
+        items.extend(
+            item
+            for item in self.pending
+            if item.get(column) is not None
+            and normalize(item[column]) == value
+        )
+        return items
+
+    def flush(self) -> int:
+        """Writes the pending items to the table. Must be called inside a
+        database transaction.
+
+        Returns:
+            int: number of rows written
+        """
+        rows = [
+            (self._count + position,)
+            + tuple(item.get(column) for column in self.columns)
+            for position, item in enumerate(self.pending, start=1)
+        ]
+        self.connection.executemany(
+            f"INSERT INTO {self.table} (id, {', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' * (len(self.columns) + 1))})",
+            rows,
+        )
+        return len(rows)
+
+    def reset(self) -> None:
+        """Forgets pending items and re-reads the number of stored ones"""
+        self.pending = []
+        self.recount()
+
+
+class SQLiteStorage(Storage):
+    """
+    Storage keeping the datasets in a SQLite database.
+
+    `Created by Storage() when STORAGE_BACKEND is 'sqlite'.`
+    """
+
+    connection = None
+
+    def load_data(self) -> None:
+        """Connects to the database and exposes its tables in instance.data"""
+        if self.connection is None:
+            # shared by the threads, whose writes the storage lock
+            # serializes
+            self.connection = sqlite3.connect(
+                SQLITE_DB_PATH, check_same_thread=False
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+            self._import_json_files()
+            self._backfill_tokens()
+
+        for name in TABLES:
+            self.data[name] = SQLiteTable(self.connection, name)
+        self.data["transactions"] = SQLiteLog(self.connection, "transactions")
+        # lookups are answered by the table indexes instead
+        self.indexes = {}
+        if self._transaction_columns is not None:
+            self._transaction_columns.reset()
+        self._dirty.clear()
+        self._data_version = self._get_data_version()
+        logger.debug(f"Loaded data from Database: {SQLITE_DB_PATH}")
+
+    def changed_datasets(self) -> list:
+        """Finds the datasets with changes not saved to the database
+
+        Returns:
+            list: names of the changed datasets
+        """
+        changed = [
+            name
+            for name in TABLES
+            if name in self._dirty or self.data[name].changed
+        ]
+        if self.data["transactions"].pending:
+            changed.append("transactions")
+        return changed
+
+    def _start_save(self, force: bool = False) -> None:
+        """Writes the changed records to the database, all in one database
+        transaction, under the storage lock: the database syncs its own
+        write-ahead log, there is nothing left for `_finish_save`
+
+        Args:
+            force (bool, optional): kept for compatibility with Storage,
+                only changed records are ever written. Defaults to False.
+        """
+        rows = 0
+        with self.connection:
+            for name in TABLES:
+                table = self.data[name]
+                keys = self._dirty.pop(name, set()) | table.changed
+                rows += table.flush(keys)
+            rows += self.data["transactions"].flush()
+
+        # committed, so cached records and pending items can go
+        for name in TABLES:
+            self.data[name].reset()
+        self.data["transactions"].reset()
+        self._data_version = self._get_data_version()
+        logger.debug(f"Saved {rows} changed rows into Database")
+
+    def discard_changes(self) -> None:
+        """Drops the changes not saved yet, back to the data as last saved"""
+        for name in TABLES:
+            self.data[name].reset()
+        self.data["transactions"].reset()
+        self._dirty.clear()
+        logger.debug("Discarded unsaved changes")
+
+    def mark_derived(self, name: str, key: str) -> None:
+        """Marks a record changed by a transaction, which the database
+        saves with the record itself, like `mark_dirty`
+
+        Args:
+            name (str): name of the dataset, 'books' or 'users'
+            key (str): key of the changed record
+        """
+        self.mark_dirty(name, key)
+
+    def checkpoint(self) -> None:
+        """Saves the changes, then folds the write-ahead log into the
+        database file and truncates it"""
+        with self.locked():
+            # checkpointed when the atomic block saves
+            if self._in_atomic:
+                return None
+            self.save_data()
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info("Checkpoint: write-ahead log folded into the Database")
+
+    def transaction_history(self):
+        """Gets all the transactions, in the order they happened
+
+        Returns:
+            SQLiteLog: the transactions table
+        """
+        return self.data["transactions"]
+
+    def find_user_by_email(self, email: str):
+        """Finds a user by email, ignoring case, using the email index
+
+        Args:
+            email (str): email to look for
+
+        Returns:
+            str | None: user id, None if no user has the email
+        """
+        with self.reading():
+            keys = self.data["users"].find("email", email)
+        return keys[0] if keys else None
+
+    def find_users_by_name(self, name: str) -> list:
+        """Finds the users with a name, ignoring case, using the name index
+
+        Args:
+            name (str): name to look for
+
+        Returns:
+            list: user ids
+        """
+        with self.reading():
+            return self.data["users"].find("name", name)
+
+    def refresh_data(self) -> None:
+        """Drops cached records if another connection changed the database
+        since the last load or save"""
+        with self.locked():
+            data_version = self._get_data_version()
+            if data_version == self._data_version:
+                return None
+
+            for name in TABLES:
+                if name not in self.changed_datasets():
+                    self.data[name].reset()
+            self.data["transactions"].recount()
+            self._data_version = data_version
+            logger.debug("Refreshed data changed by another connection")
+
+    def _catch_up(self) -> None:
+        """Brings the data up to date with the other connections' commits,
+        told apart by the database's data version instead of the dataset
+        versions"""
+        self.refresh_data()
+
+    def available_books(self) -> list:
+        """Gets the books currently available, using the availability index
+
+        Returns:
+            list: isbns of the available books, sorted
+        """
+        with self.reading():
+            return self.data["books"].flagged("available")
+
+    def count_available_books(self) -> int:
+        """Counts the books currently available, using the availability
+        index
+
+        Returns:
+            int: number of available books
+        """
+        return len(self.available_books())
+
+    def find_transactions(self, field: str, value: str) -> list:
+        """Finds the transactions of a user or a book, in the order they
+        happened, using the transactions table indexes.
+
+        Args:
+            field (str): 'user_id' or 'isbn'
+            value (str): user id or isbn to look for
+
+        Returns:
+            list: matching transactions
+        """
+        with self.reading():
+            return self.data["transactions"].find(field, value)
+
+    def allocate_user_ids(self, count: int = 1) -> list:
+        """Allocates a contiguous block of new user ids from the next free
+        user id kept in the meta table. The database write lock makes it
+        safe for several processes at once.
+
+        Args:
+            count (int, optional): number of ids needed. Defaults to 1.
+
+        Returns:
+            list: the new user ids
+        """
+        # the connection is shared, no other thread may be writing with it
+        with self.locked():
+            next_id = self._allocate_user_ids(count)
+        logger.debug(f"Allocated {count} user ids from {next_id}")
+        return [str(user_id) for user_id in range(next_id, next_id + count)]
+
+    def _allocate_user_ids(self, count: int) -> int:
+        """Takes count ids off the meta table's counter, in a database
+        transaction holding its write lock
+
+        Returns:
+            int: first of the allocated ids
+        """
+        # take the write lock before reading the counter
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'next_user_id'"
+            ).fetchone()
+            if row is None:
+                # first allocation, start after the existing ids
+                (max_id,) = self.connection.execute(
+                    "SELECT COALESCE(MAX(CAST(id AS INTEGER)), 0) FROM users "
+                    "WHERE id NOT GLOB '*[^0-9]*'"
+                ).fetchone()
+                next_id = max_id + 1
+            else:
+                next_id = row[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) "
+                "VALUES ('next_user_id', ?)",
+                (next_id + count,),
+            )
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+
+        self._data_version = self._get_data_version()
+        return next_id
+
+    def search_books(self, query: str, field: str = "title") -> list:
+        """Finds the books whose field contains every word of the query,
+        using the book tokens table. A word ending with '*' matches as a
+        prefix.
+
+        Args:
+            query (str): words to search for
+            field (str, optional): 'title' or 'author'. Defaults to 'title'.
+
+        Returns:
+            list: isbns of the matching books, sorted
+        """
+        with self.reading():
+            return self.data["books"].search(field, query)
+
+    def _backfill_tokens(self) -> None:
+        """Fills the tokens table of a database made before it existed"""
+        has_books = self.connection.execute(
+            "SELECT 1 FROM books LIMIT 1"
+        ).fetchone()
+        has_tokens = self.connection.execute(
+            "SELECT 1 FROM book_tokens LIMIT 1"
+        ).fetchone()
+        if has_books is None or has_tokens is not None:
+            return None
+
+        books = SQLiteTable(self.connection, "books")
+        with self.connection:
+            books.write_tokens(list(books))
+        logger.info("Filled the book tokens table")
+
+    def _get_data_version(self) -> int:
+        """Gets the database's data version, which changes whenever another
+        connection commits"""
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _import_json_files(self) -> None:
+        """One-time import of the json data files into an empty database"""
+        (rows,) = self.connection.execute(
+            "SELECT (SELECT COUNT(*) FROM users) + (SELECT COUNT(*) FROM books)"
+            " + (SELECT COUNT(*) FROM transactions)"
+        ).fetchone()
+        if rows:
+            return None
+
+        contents, live = {}, []
+        for name, path in DATA_FILE_PATHS.items():
+            if self._is_journal(path) and not os.path.exists(path):
+                # not migrated to a journal yet
+                path = os.path.splitext(path)[0] + ".json"
+            if not os.path.exists(path):
+                continue
+
+            if self._is_journal(path):
+                # archived segments first, then the live journal
+                contents[name] = []
+                for segment in journal_segments(path):
+                    items, _ = self._read_journal(segment)
+                    contents[name].extend(items)
+                live, _ = self._read_journal(path)
+                contents[name].extend(live)
+            else:
+                with open(path, "r") as file:
+                    contents[name] = json.load(file)
+        # users and books files are a snapshot older than the journal
+        replay_transactions(
+            contents.get("users", {}), contents.get("books", {}), live
+        )
+
+        with self.connection:
+            for name, content in contents.items():
+                if name in TABLES:
+                    table = SQLiteTable(self.connection, name)
+                    table._cache = content
+                    table._new = set(content)
+                    table.flush(set(content))
+                else:
+                    log = SQLiteLog(self.connection, name)
+                    log.extend(content)
+                    log.flush()
+                logger.info(
+                    f"Imported {len(content)} {name} into Database "
+                    f"from File: {DATA_FILE_PATHS[name]}"
+                )
+
+
+if __name__ == "__main__":
+    pass
@@ -2,78 +2,1503 @@
 This module consists of logics for data storage and retrieval related tasks.
 
 Singleton Design to interact with the datasets.
-Pandas to perform operations on them.
+Datasets are kept in json files by default, or in a SQLite database
+(see script/sqlite_storage.py) when STORAGE_BACKEND is 'sqlite'.
 
 """
 
+import glob
 import json
 import os
+import threading
+from collections.abc import Sequence
+from contextlib import contextmanager
+from itertools import chain
 
+from script.indexes import (
+    FlagIndex,
+    MultiIndex,
+    PositionIndex,
+    TokenIndex,
+    UniqueIndex,
+)
+from script.locks import ReadWriteLock, file_lock
 from script.loggers import LibraryLogger
-from script.settings import DATA_FILE_PATHS
+from script.records import to_json, to_records
+from script.settings import (
+    DATA_FILE_PATHS,
+    META_FILE_PATH,
+    META_LOCK_PATH,
+    SNAPSHOT_INTERVAL,
+    STORAGE_BACKEND,
+    STORAGE_LOCK_PATH,
+    VERSIONS_FILE_PATH,
+    WAL_FILE_PATH,
+    WAL_MAX_SIZE,
+)
+from script.wal import WriteAheadLog, sync_directory
 
 logger = LibraryLogger()
 
 
+def iter_journal(path, offset: int = 0, end: int = None):
+    """Streams the items of a json lines journal file, one line at a time
+
+    Args:
+        path (str | BinaryIO): journal file path, or the journal already
+            opened in binary mode, closed once read
+        offset (int, optional): byte offset to start reading from.
+            Defaults to 0.
+        end (int, optional): byte offset to stop at, the end of the file
+            if None. Defaults to None.
+
+    Yields:
+        tuple: (item, byte offset after its line)
+    """
+    file = open(path, "rb") if isinstance(path, str) else path
+    path = file.name
+    with file:
+        file.seek(offset)
+        for line in file:
+            # lines appended since end are left out
+            if end is not None and offset >= end:
+                break
+            # a torn last line (crash while appending) is left out,
+            # anything else which doesn't parse is real corruption
+            if not line.endswith(b"\n"):
+                logger.error(
+                    f"Ignored incomplete line at byte {offset} "
+                    f"of File: {path}"
+                )
+                break
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line), offset
+
+
+def journal_segments(path: str) -> list:
+    """Finds the archived segments of a journal, oldest first
+
+    Args:
+        path (str): journal file path, like 'transactions.jsonl'
+
+    Returns:
+        list: segment paths, like 'transactions.000001.jsonl'
+    """
+    base = os.path.splitext(path)[0]
+    segments = [
+        segment
+        for segment in glob.glob(glob.escape(base) + ".*.jsonl")
+        if segment[len(base) + 1 : -len(".jsonl")].isdigit()
+    ]
+    return sorted(segments)
+
+
+def replay_transactions(users, books, items) -> tuple:
+    """Applies transactions to the users and books they name: a checkout
+    makes the book unavailable and adds it to the user's borrowed books,
+    a checkin undoes that. Replaying a transaction twice changes nothing,
+    so a journal can be replayed over a snapshot taken after some of it.
+    Users and books which don't exist anymore are skipped.
+
+    Args:
+        users (dict): user id -> user
+        books (dict): isbn -> book
+        items (iterable): transactions, in the order they happened
+
+    Returns:
+        tuple: (set of changed user ids, set of changed isbns)
+    """
+    user_ids, isbns = set(), set()
+    for item in items:
+        user_id, isbn = item.get("user_id"), item.get("isbn")
+        checkout = item.get("action") == "checkout"
+        book = books.get(isbn)
+        if book is not None and book.get("available") != (not checkout):
+            book["available"] = not checkout
+            isbns.add(isbn)
+        user = users.get(user_id)
+        if user is None:
+            continue
+        borrowed = user.get("borrowed") or []
+        if checkout and isbn not in borrowed:
+            user["borrowed"] = borrowed + [isbn]
+            user_ids.add(user_id)
+        elif not checkout and isbn in borrowed:
+            user["borrowed"] = [other for other in borrowed if other != isbn]
+            user_ids.add(user_id)
+    return user_ids, isbns
+
+
+class TransactionHistory(Sequence):
+    """Read-only sequence of the archived transactions followed by the
+    live ones. Positions in it don't change when the live journal is
+    archived, so position indexes over it stay valid."""
+
+    def __init__(self, archive: list, live: list):
+        self.archive = archive
+        self.live = live
+
+    def __len__(self) -> int:
+        return len(self.archive) + len(self.live)
+
+    def __getitem__(self, index):
+        archived = len(self.archive)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return (
+                self.archive[start:stop]
+                + self.live[max(start - archived, 0) : max(stop - archived, 0)]
+            )
+        if index < 0:
+            index += len(self)
+        if index < archived:
+            return self.archive[index]
+        return self.live[index - archived]
+
+    def __iter__(self):
+        return chain(self.archive, self.live)
+
+
 class Storage:
     """
     Storage class to handle the data storage and retrieval
 
     `Following a Singleton Design: Only a single instance will be made and
     returned.`
+
+    The instance can be shared by the threads of a process: lookups run
+    side by side under `reading`, while changes and `atomic` blocks hold it
+    alone, see `locked`. A save holds it only to log its changes: the disk
+    writes happen after, shared by the saves made meanwhile, while the
+    lookups go on. See `save_data`.
     """
 
     _instance = None
+    # so threads asking for the instance at once get the same one
+    _instance_lock = threading.Lock()
 
     def __new__(cls):
         """
         Overriding the default, so it creates only one instance and returns
         the same one everytime.
         """
-        # check if instance already exists, if not then create a new one
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            logger.info("Singleton Storage Instantiated")
-            cls._instance.data = {}
-            cls._instance.load_data()
+        with Storage._instance_lock:
+            # check if instance already exists, if not then create a new one
+            if Storage._instance is None:
+                # the configured backend decides the class of the instance
+                if cls is Storage and STORAGE_BACKEND == "sqlite":
+                    from script.sqlite_storage import SQLiteStorage
+
+                    cls = SQLiteStorage
 
-        return cls._instance
+                instance = object.__new__(cls)
+                Storage._instance = instance
+                logger.info(f"Singleton {cls.__name__} Instantiated")
+                instance.data = {}
+                # dataset name -> keys of records changed since last save
+                instance._dirty = {}
+                # list dataset name -> number of items already on disk
+                instance._saved_lengths = {}
+                # running count of bytes written to data files
+                instance.bytes_written = 0
+                # dataset name -> (mtime, size, inode) of its file when last
+                # loaded or saved, to skip re-parsing unchanged files
+                instance._signatures = {}
+                # journal dataset name -> byte offset up to which it was read
+                instance._journal_offsets = {}
+                # dataset name -> {field: index} of its secondary indexes
+                instance.indexes = {
+                    "users": {
+                        "email": UniqueIndex("email"),
+                        "name": MultiIndex("name"),
+                    },
+                    "books": {
+                        "title": TokenIndex("title"),
+                        "author": TokenIndex("author"),
+                        "available": FlagIndex("available"),
+                    },
+                    "transactions": {
+                        "user_id": PositionIndex("user_id"),
+                        "isbn": PositionIndex("isbn"),
+                    },
+                }
+                # columnar copy of the transactions, made on first use
+                instance._transaction_columns = None
+                # True inside an `atomic` block, which defers the saves
+                instance._in_atomic = False
+                # transactions of the archived journal segments, loaded on
+                # first use of the whole history
+                instance._archive = None
+                # datasets with changes derived from unsaved transactions
+                instance._derived = set()
+                # saves are logged here before their files are written
+                instance.wal = WriteAheadLog(WAL_FILE_PATH)
+                # dataset name -> version of it the data is up to date with
+                instance._versions = {}
+                # nesting depth of `locked` blocks
+                instance._lock_depth = 0
+                # threads holding the storage file lock for the process,
+                # and the held lock, see `_hold_file_lock`
+                instance._holders = 0
+                instance._holders_lock = threading.Lock()
+                instance._file_lock = None
+                # saves logged but not written yet, in log order, and the
+                # number not finished, see `_finish_save`
+                instance._queued = []
+                instance._saving = 0
+                # guards the two above, and tells a thread writes them
+                instance._save_turns = threading.Condition()
+                instance._writing = False
+                # error of a failed write, the data is reloaded before the
+                # next save
+                instance._save_error = None
+                # signature of the write-ahead log when it was last found
+                # without saves cut short, see `_wal_interrupted`
+                instance._wal_seen = None
+                # lookups of threads share it, writes hold it alone
+                instance._rwlock = ReadWriteLock()
+                # guards the lookup caches filled under the shared lock
+                instance._cache_lock = threading.Lock()
+                instance.load_data()
+
+            return Storage._instance
 
     def load_data(self) -> None:
-        """Loads the files data into instance.data as dict for each file"""
-        for name, path in DATA_FILE_PATHS.items():
-            # load data and save it in storage instance
-            if os.path.exists(path):
+        """Loads the files data into instance.data as dict for each file,
+        holding the records as the types of script/records.py. Users and
+        books are loaded from their last snapshot, then the transactions
+        journaled since are replayed over them. Saves a crash cut short
+        are redone from the write-ahead log."""
+        # no other process saves, and no thread reads, meanwhile
+        with self.locked():
+            self._versions = self._read_versions()
+            for name, path in DATA_FILE_PATHS.items():
+                if self._is_journal(path):
+                    self._migrate_to_journal(path)
+                self._load_dataset(name, path)
+            self._recover()
+            if self._journaled():
+                self._apply_transactions(self.data["transactions"])
+            self._wal_seen = self._file_signature(self.wal.path)
+
+    def _load_dataset(self, name: str, path: str) -> None:
+        """Loads a single file's data into instance.data[name]
+
+        Args:
+            name (str): name of the dataset
+            path (str): path of its file
+        """
+        if name == "transactions":
+            # the segments may have changed along with the journal
+            self._archive = None
+        # load data and save it in storage instance
+        if os.path.exists(path):
+            if self._is_journal(path):
+                content, offset = self._read_journal(path)
+                self._journal_offsets[name] = offset
+                # cut off a torn last line, so new lines append cleanly
+                if offset < os.path.getsize(path):
+                    os.truncate(path, offset)
+            else:
                 with open(path, "r") as file:
-                    self.data[name] = json.load(file)
+                    content = json.load(file)
+            self.data[name] = to_records(name, content)
+        else:
+            # If file doesn't exist, create one with empty json data
+            if name == "transactions":
+                self.data[name] = []
             else:
-                # If file doesn't exist, create one with empty json data
-                if name == "transactions":
-                    self.data[name] = []
-                else:
-                    self.data[name] = {}
+                self.data[name] = {}
 
-                with open(path, "w") as file:
-                    json.dump({}, file)
-            logger.debug(
-                f"Loaded data into storage instance from File: {path}"
+            self._write_file(path, self.data[name])
+            self._journal_offsets[name] = 0
+
+        # whatever was just loaded is exactly what is on disk
+        if isinstance(self.data[name], list):
+            self._saved_lengths[name] = len(self.data[name])
+        self._dirty.pop(name, None)
+        self._signatures[name] = self._file_signature(path)
+        self._build_indexes(name)
+        logger.debug(f"Loaded data into storage instance from File: {path}")
+
+    def _build_indexes(self, name: str) -> None:
+        """Rebuilds the secondary indexes of a dataset from its data
+
+        Args:
+            name (str): name of the dataset
+        """
+        data = self.data[name]
+        if name == "transactions":
+            # positions are in the whole history, which is indexed lazily
+            items = ()
+        elif isinstance(data, list):
+            items = enumerate(data)
+        else:
+            items = data.items()
+        for index in self.indexes.get(name, {}).values():
+            index.build(items)
+        # converted again on its next use
+        if name == "transactions" and self._transaction_columns is not None:
+            self._transaction_columns.reset()
+
+    def mark_dirty(self, name: str, key: str = None) -> None:
+        """Marks a dataset as changed since the last save, so that
+        `save_data` rewrites only that dataset's file.
+
+        Args:
+            name (str): name of the dataset, like 'books' or 'users'
+            key (str, optional): key of the changed record. Defaults to None.
+        """
+        keys = self._dirty.setdefault(name, set())
+        if key is not None:
+            keys.add(key)
+            # keep the secondary indexes in step with the record
+            for index in self.indexes.get(name, {}).values():
+                index.update(key, self.data[name].get(key))
+
+    def mark_dirty_many(self, name: str, keys) -> None:
+        """Marks many records of a dataset as changed, like `mark_dirty`,
+        but rebuilds the secondary indexes once instead of updating them
+        record by record, which is faster for bulk changes.
+
+        Args:
+            name (str): name of the dataset, like 'books' or 'users'
+            keys (iterable): keys of the changed records
+        """
+        self._dirty.setdefault(name, set()).update(keys)
+        self._build_indexes(name)
+
+    def mark_derived(self, name: str, key: str) -> None:
+        """Marks a record changed only as the result of a journaled
+        transaction, like a book's availability after a checkout. Its file
+        isn't rewritten on save: the journal already holds the change and
+        is replayed over the last snapshot on load. Without a journal it
+        is the same as `mark_dirty`.
+
+        Args:
+            name (str): name of the dataset, 'books' or 'users'
+            key (str): key of the changed record
+        """
+        if not self._journaled():
+            return self.mark_dirty(name, key)
+        self._derived.add(name)
+        for index in self.indexes.get(name, {}).values():
+            index.update(key, self.data[name].get(key))
+
+    def _apply_transactions(self, items) -> None:
+        """Replays transactions over the users and books, see
+        `replay_transactions`, keeping their indexes in step
+
+        Args:
+            items (iterable): transactions, in the order they happened
+        """
+        changed = replay_transactions(
+            self.data["users"], self.data["books"], items
+        )
+        for name, keys in zip(["users", "books"], changed):
+            for key in keys:
+                for index in self.indexes.get(name, {}).values():
+                    index.update(key, self.data[name].get(key))
+        logger.debug(
+            "Replayed transactions over %d users and %d books",
+            len(changed[0]),
+            len(changed[1]),
+        )
+
+    @staticmethod
+    def _journaled() -> bool:
+        """Checks if transactions are kept in a journal, which the users
+        and books state is then derived from"""
+        return Storage._is_journal(DATA_FILE_PATHS["transactions"])
+
+    def find_user_by_email(self, email: str):
+        """Finds a user by email, ignoring case, using the email index
+
+        Args:
+            email (str): email to look for
+
+        Returns:
+            str | None: user id, None if no user has the email
+        """
+        with self.reading():
+            return self.indexes["users"]["email"].get(email)
+
+    def find_users_by_name(self, name: str) -> list:
+        """Finds the users with a name, ignoring case, using the name index
+
+        Args:
+            name (str): name to look for
+
+        Returns:
+            list: user ids
+        """
+        with self.reading():
+            return self.indexes["users"]["name"].get(name)
+
+    def available_books(self) -> list:
+        """Gets the books currently available, from the availability index
+
+        Returns:
+            list: isbns of the available books, sorted
+        """
+        with self.reading():
+            return sorted(self.indexes["books"]["available"].keys())
+
+    def count_available_books(self) -> int:
+        """Counts the books currently available, from the availability index
+
+        Returns:
+            int: number of available books
+        """
+        with self.reading():
+            return len(self.indexes["books"]["available"])
+
+    def find_transactions(self, field: str, value: str) -> list:
+        """Finds the transactions of a user or a book, in the order they
+        happened, using the transaction position indexes. Transactions
+        appended since the last lookup are indexed first.
+
+        Args:
+            field (str): 'user_id' or 'isbn'
+            value (str): user id or isbn to look for
+
+        Returns:
+            list: matching transactions
+        """
+        with self.reading():
+            transactions = self.transaction_history()
+            index = self.indexes["transactions"][field]
+            # other readers may be catching it up too
+            with self._cache_lock:
+                index.catch_up(transactions)
+                positions = index.get(value)
+            return [transactions[position] for position in positions]
+
+    def transaction_columns(self):
+        """Gets the columnar copy of the transactions for vectorized
+        analytics, see script/columns.py. Made on first use, which imports
+        NumPy, then only transactions appended since the last call are
+        converted.
+
+        Returns:
+            TransactionColumns: columns of all the transactions
+        """
+        with self.reading():
+            history = self.transaction_history()
+            with self._cache_lock:
+                if self._transaction_columns is None:
+                    from script.columns import TransactionColumns
+
+                    self._transaction_columns = TransactionColumns()
+                self._transaction_columns.catch_up(history)
+            return self._transaction_columns
+
+    def transaction_history(self):
+        """Gets all the transactions, in the order they happened: those of
+        the archived journal segments, read on first use, then the live
+        ones of data['transactions']
+
+        Returns:
+            Sequence: transactions
+        """
+        if not self._journaled():
+            return self.data["transactions"]
+        with self.reading(), self._cache_lock:
+            if self._archive is None:
+                archive = []
+                path = DATA_FILE_PATHS["transactions"]
+                for segment in journal_segments(path):
+                    items, _ = self._read_journal(segment)
+                    archive.extend(to_records("transactions", items))
+                # set once complete, for the readers not holding the lock
+                self._archive = archive
+            return TransactionHistory(self._archive, self.data["transactions"])
+
+    def allocate_user_ids(self, count: int = 1) -> list:
+        """Allocates a contiguous block of new user ids from the next free
+        user id kept in the metadata file. Ids are never handed out twice,
+        even to several processes at once, and deleted ids aren't reused.
+
+        Args:
+            count (int, optional): number of ids needed. Defaults to 1.
+
+        Returns:
+            list: the new user ids
+        """
+        with file_lock(META_LOCK_PATH):
+            meta = self._read_meta()
+            next_id = meta.get("next_user_id")
+            if next_id is None:
+                # first allocation, start after the existing ids
+                next_id = self._max_user_id() + 1
+            meta["next_user_id"] = next_id + count
+            self._write_meta(meta)
+
+        logger.debug(f"Allocated {count} user ids from {next_id}")
+        return [str(user_id) for user_id in range(next_id, next_id + count)]
+
+    def _max_user_id(self) -> int:
+        """Finds the highest numeric user id, 0 if there is none"""
+        user_ids = [
+            int(user_id)
+            for user_id in self.data["users"].keys()
+            if user_id.isdigit()
+        ]
+        return max(user_ids, default=0)
+
+    def _read_meta(self) -> dict:
+        """Reads the metadata file, empty if it doesn't exist"""
+        try:
+            with open(META_FILE_PATH, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _write_meta(self, meta: dict) -> None:
+        """Replaces the metadata file, written aside first so a crash can't
+        leave it half written"""
+        temp_path = META_FILE_PATH + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(meta, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, META_FILE_PATH)
+
+    def search_books(self, query: str, field: str = "title") -> list:
+        """Finds the books whose field contains every word of the query,
+        using the field's token index. A word ending with '*' matches
+        as a prefix.
+
+        Args:
+            query (str): words to search for
+            field (str, optional): 'title' or 'author'. Defaults to 'title'.
+
+        Returns:
+            list: isbns of the matching books, sorted
+        """
+        with self.reading():
+            return sorted(self.indexes["books"][field].search(query))
+
+    @contextmanager
+    def reading(self):
+        """Holds the storage shared with the other threads only reading it,
+        for the duration of the block. Lookups and listings read under it,
+        while changes wait for it to end.
+
+        Yields:
+            Storage: this storage
+        """
+        with self._rwlock.reading():
+            yield self
+
+    @contextmanager
+    def locked(self):
+        """Holds the storage lock, shared with the other processes using
+        the same data files, and the storage alone among the threads, for
+        the duration of the block. Nested blocks are part of the outer one.
+
+        Yields:
+            Storage: this storage
+        """
+        with self._rwlock.writing():
+            # only the thread holding the storage gets here
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._lock_depth -= 1
+                return None
+
+            self._hold_file_lock()
+            self._lock_depth = 1
+            try:
+                yield self
+            finally:
+                self._lock_depth = 0
+                self._release_file_lock()
+
+    def _hold_file_lock(self) -> None:
+        """Takes the storage file lock for the process, or counts one more
+        holder if it already has it: a `locked` block, or a save until its
+        files are written."""
+        with self._holders_lock:
+            if not self._holders:
+                self._file_lock = file_lock(STORAGE_LOCK_PATH)
+                self._file_lock.__enter__()
+            self._holders += 1
+
+    def _release_file_lock(self) -> None:
+        """Releases the storage file lock once its last holder is done"""
+        with self._holders_lock:
+            self._holders -= 1
+            if not self._holders:
+                self._file_lock.__exit__(None, None, None)
+                self._file_lock = None
+
+    def _read_versions(self) -> dict:
+        """Reads the version counter of each dataset, empty if none was
+        saved yet"""
+        try:
+            with open(VERSIONS_FILE_PATH, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _bump_versions(self, names) -> None:
+        """Counts a new version of datasets just saved, under the storage
+        lock. Not synced: after a crash every process loads afresh anyway.
+
+        Args:
+            names (iterable): names of the saved datasets
+        """
+        versions = self._read_versions()
+        for name in names:
+            versions[name] = versions.get(name, 0) + 1
+        temp_path = VERSIONS_FILE_PATH + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(versions, file)
+        os.replace(temp_path, VERSIONS_FILE_PATH)
+        self._versions = versions
+
+    def _catch_up(self) -> None:
+        """Brings the data up to date if another process saved since it
+        was last read, or crashed in the middle of a save. Unsaved changes
+        are kept, merged over the data saved by the other process."""
+        with self._save_turns:
+            # the file lock was held since the saves in flight started, no
+            # other process saved
+            if self._saving:
+                return None
+        if self._wal_interrupted():
+            logger.warn(
+                "Saves cut short by another process found in the "
+                f"write-ahead log File: {self.wal.path}, redoing them"
             )
+            self._recover_others()
+        elif self._read_versions() != self._versions or any(
+            # a crashed save may have written files without counting a
+            # new version
+            self._file_signature(path) != self._signatures.get(name)
+            for name, path in DATA_FILE_PATHS.items()
+        ):
+            logger.debug("Datasets saved by another process, refreshing")
+            self.refresh_data()
+
+    def _wal_interrupted(self) -> bool:
+        """Checks the write-ahead log for saves another process logged but
+        didn't mark as applied, under the storage lock. A live process
+        holds the lock until its saves are written, so the process which
+        logged them crashed. Only what was written since the last check
+        is read.
 
-    def save_data(self) -> None:
-        """Saves the datasets into their respective files"""
+        Returns:
+            bool: True if saves were cut short, or the log ends with a
+                torn entry
+        """
+        path = self.wal.path
+        signature = self._file_signature(path)
+        seen = self._wal_seen
+        if signature is None or signature == seen:
+            return False
+        # from the start if another process emptied the log meanwhile
+        start = 0
+        if seen is not None and seen[2] == signature[2]:
+            start = min(seen[1], signature[1])
+
+        entries, end = set(), start
+        for item, offset in iter_journal(path, start):
+            if "applied" in item:
+                entries.discard(item["applied"])
+            else:
+                entries.add(end)
+            end = offset
+        if entries or end < signature[1]:
+            return True
+        self._wal_seen = signature
+        return False
+
+    def _recover_others(self) -> None:
+        """Loads the data again, which redoes the saves a crashed process
+        left in the write-ahead log, then merges the unsaved changes back
+        over it, like `refresh_data` does"""
+        unsaved = {
+            name: self._unsaved_changes(name) for name in DATA_FILE_PATHS
+        }
+        # a failed save of this process is redone along with them
+        self._save_error = None
+        self.load_data()
+        for name, changes in unsaved.items():
+            if changes is not None:
+                self._merge_changes(name, changes)
+        if self._journaled():
+            self._apply_transactions(self.data["transactions"])
+
+    @contextmanager
+    def atomic(self, force: bool = False):
+        """Groups the changes made inside the block into one unit of work.
+        `save_data` calls inside it are deferred and the changes are saved
+        once when the block ends. If the block raises, its changes are
+        discarded, back to the data as last saved. The block holds the
+        storage lock and starts from the latest saved data, so checks made
+        in it can't be invalidated by another process before the save.
+
+        Args:
+            force (bool, optional): rewrite every file when the block
+                ends, see `save_data`. Defaults to False.
+
+        Yields:
+            Storage: this storage
+        """
+        # other processes and threads can't save until the block ends, so
+        # what it reads stays true until it is saved
+        with self.locked():
+            # nested blocks are part of the outer one
+            if self._in_atomic:
+                yield self
+                return None
+
+            self._catch_up()
+            # start from a saved state, so a rollback drops only this block
+            self.save_data()
+            self._in_atomic = True
+            try:
+                yield self
+                self._in_atomic = False
+                save = self._start_save(force)
+            except BaseException:
+                self._in_atomic = False
+                self.discard_changes()
+                logger.warn("Changes of a failed unit of work discarded")
+                raise
+        # written once the storage is free, see `save_data`
+        self._finish_save(save)
+
+    def discard_changes(self) -> None:
+        """Drops the changes not saved yet, back to the data as last saved"""
+        # the files reloaded must hold the saves in flight
+        self._drain_saves()
+        # derived changes are dropped by reloading the snapshot
+        reload = set(self._derived)
+        for name in self.changed_datasets():
+            data = self.data[name]
+            if isinstance(data, list) and name not in self._dirty:
+                # only appended to, so cut the unsaved items off
+                del data[self._saved_lengths.get(name, 0) :]
+                self._build_indexes(name)
+            else:
+                reload.add(name)
+            logger.debug(f"Discarded unsaved changes of {name}")
 
         for name, path in DATA_FILE_PATHS.items():
-            with open(path, "w") as file:
-                json.dump(self.data[name], file, indent=4)
-            logger.debug(f"Saved data into File: {path}")
+            if name in reload:
+                self._load_dataset(name, path)
+        # bring the reloaded snapshot up to the saved transactions
+        if reload and self._journaled():
+            self._apply_transactions(self.data["transactions"])
+        self._derived.clear()
 
-        # Refresh storage instance data after every update to files
-        self.refresh_data()
+    def changed_datasets(self) -> list:
+        """Finds the datasets which differ from their files on disk
 
-    def refresh_data(self) -> None:
-        """Reloads the data from each file"""
+        Returns:
+            list: names of the changed datasets
+        """
+        changed = []
+        for name in DATA_FILE_PATHS.keys():
+            if name in self._dirty:
+                changed.append(name)
+            # appends to a list dataset are detected from its length
+            elif isinstance(self.data.get(name), list) and len(
+                self.data[name]
+            ) != self._saved_lengths.get(name):
+                changed.append(name)
+        return changed
+
+    def save_data(self, force: bool = False) -> None:
+        """Saves the changed datasets into their respective files. The
+        changes are first logged to the write-ahead log and synced, then
+        the files are written and the log entry marked as applied.
+
+        Only the logging holds the storage, see `_start_save`. The sync
+        and the writes happen after it is released, see `_finish_save`,
+        so lookups go on meanwhile and the saves of other threads share
+        them (group commit). Returns once the changes are on the disk.
+
+        Args:
+            force (bool, optional): rewrite every file even if unchanged.
+                Defaults to False.
+        """
+        with self.locked():
+            # saved once when the atomic block ends
+            if self._in_atomic:
+                return None
+            save = self._start_save(force)
+        self._finish_save(save)
+
+    def _start_save(self, force: bool = False):
+        """Logs the changes to the write-ahead log, not synced yet, and
+        serializes what their files get. Done under the storage lock, the
+        changes then count as saved, though they reach the disk with
+        `_finish_save`. The process keeps the file lock until then.
+
+        Args:
+            force (bool, optional): rewrite every file even if unchanged.
+                Defaults to False.
+
+        Returns:
+            dict | None: the save for `_finish_save`, None if nothing
+                changed
+        """
+        if self._save_error is not None:
+            self._reload()
+        # merge what other processes saved meanwhile, instead of writing
+        # over it, and redo what a crashed one didn't finish before the
+        # log is emptied
+        self._catch_up()
+        if self.wal.size() >= WAL_MAX_SIZE:
+            self._reset_wal()
+        names = (
+            list(DATA_FILE_PATHS.keys()) if force else self.changed_datasets()
+        )
+        save = None
+        if names:
+            writes = self._prepare_writes(names, force)
+            # a save cut short by a crash is redone from it on the next
+            # load, once synced
+            offset = self.wal.append(self._log_entry(names, force))
+            self._mark_saved(names)
+            save = {
+                "offset": offset,
+                "writes": writes,
+                "error": None,
+                "done": False,
+            }
+            self._hold_file_lock()
+            with self._save_turns:
+                self._queued.append(save)
+                self._saving += 1
+        else:
+            logger.debug("No changes to save")
+        # derived changes are now in the saved journal
+        self._derived.clear()
+        return save
+
+    def _finish_save(self, save) -> None:
+        """Waits until a save of `_start_save` is on the disk. The first
+        thread to get here writes every save queued so far, with one sync
+        of the log for all of them, while the others wait for it.
+
+        Args:
+            save (dict | None): the save, None if there was nothing to save
+
+        Raises:
+            OSError: if the save, or one queued before it, failed
+        """
+        if save is None:
+            return None
+        try:
+            while True:
+                with self._save_turns:
+                    while self._writing and not save["done"]:
+                        self._save_turns.wait()
+                    if save["done"]:
+                        break
+                    self._writing = True
+                    batch, self._queued = self._queued, []
+                try:
+                    self._commit_saves(batch)
+                finally:
+                    with self._save_turns:
+                        self._writing = False
+                        self._save_turns.notify_all()
+        finally:
+            self._release_file_lock()
+            with self._save_turns:
+                self._saving -= 1
+                self._save_turns.notify_all()
+        if save["error"] is not None:
+            raise save["error"]
+        self._checkpoint_if_due()
+
+    def _commit_saves(self, batch: list) -> None:
+        """Syncs the log once for a batch of saves, writes their files and
+        marks their log entries as applied. A file replaced by several of
+        them is written once, with the content of the last.
+
+        Args:
+            batch (list): saves of `_start_save`, in log order
+        """
+        error = self._save_error
+        if error is None:
+            try:
+                # syncs the entries before it too
+                self.wal.sync(batch[-1]["offset"])
+                names = self._write_prepared(
+                    [write for save in batch for write in save["writes"]]
+                )
+                for save in batch:
+                    self.wal.mark_applied(save["offset"])
+                self._bump_versions(names)
+            except Exception as exception:
+                error = self._save_error = exception
+                logger.error(
+                    f"Save failed, the data is reloaded before the next "
+                    f"one: {exception}"
+                )
+        with self._save_turns:
+            for save in batch:
+                save["error"] = error
+                save["done"] = True
+
+    def _drain_saves(self) -> None:
+        """Waits until the saves in flight are on the disk, before reading
+        or replacing files they write"""
+        with self._save_turns:
+            while self._saving:
+                self._save_turns.wait()
+
+    def _reload(self) -> None:
+        """Loads the data again after a failed save, like after a crash:
+        what the write-ahead log holds of it is redone"""
+        self._drain_saves()
+        self._save_error = None
+        self._dirty.clear()
+        self._derived.clear()
+        self.wal.close()
         self.load_data()
-        logger.debug("Refreshed/reloaded the fresh data from files")
+        logger.warn("Data reloaded after a failed save")
+
+    def _checkpoint_if_due(self) -> None:
+        """Checkpoints once SNAPSHOT_INTERVAL transactions are journaled
+        since the last checkpoint"""
+        if not self._journaled():
+            return None
+        with self.locked():
+            # another process may have saved since the lock was released
+            self._catch_up()
+            # the snapshot and the archived journal take saved data only
+            if (
+                not self._in_atomic
+                and not self.changed_datasets()
+                and len(self.data["transactions"]) >= SNAPSHOT_INTERVAL
+            ):
+                self._checkpoint()
+
+    def _log_entry(self, names: list, force: bool = False) -> dict:
+        """Describes the unsaved changes of datasets as a write-ahead log
+        entry, which `_redo` can apply again: the changed and deleted
+        records of a dict dataset, or the items of a list dataset from
+        the first unsaved position.
+
+        Args:
+            names (list): names of the changed datasets
+            force (bool, optional): log every record. Defaults to False.
+
+        Returns:
+            dict: dataset name -> its changes
+        """
+        entry = {}
+        for name in names:
+            data = self.data[name]
+            if isinstance(data, list):
+                position = 0 if force else self._saved_lengths.get(name, 0)
+                position = min(position, len(data))
+                entry[name] = {"position": position, "items": data[position:]}
+                continue
+            keys = None if force else self._dirty.get(name)
+            if not keys:
+                # changed without telling which records, log them all
+                entry[name] = {"replace": True, "set": data}
+                continue
+            entry[name] = {
+                "set": {key: data[key] for key in keys if key in data},
+                "delete": [key for key in keys if key not in data],
+            }
+        return entry
+
+    def _redo(self, entry: dict) -> None:
+        """Applies a write-ahead log entry of `_log_entry` to the data,
+        marking what it changed as unsaved. Applying it again changes
+        nothing.
+
+        Args:
+            entry (dict): dataset name -> its changes
+        """
+        for name, change in entry.items():
+            data = self.data[name]
+            if "position" in change:
+                del data[change["position"] :]
+                data.extend(to_records(name, change["items"]))
+                continue
+            keys = self._dirty.setdefault(name, set())
+            if change.get("replace"):
+                keys.update(data.keys())
+                data.clear()
+            for key in change.get("delete", []):
+                data.pop(key, None)
+                keys.add(key)
+            data.update(to_records(name, change["set"]))
+            keys.update(change["set"].keys())
+
+    def _recover(self) -> None:
+        """Redoes the saves which the write-ahead log holds but didn't
+        mark as applied, as a crash cut them short, and writes their data
+        files. The log is emptied once they are on the disk."""
+        path = self.wal.path
+        if not os.path.exists(path):
+            return None
+
+        entries, applied, start = {}, set(), 0
+        for item, end in iter_journal(path):
+            if "applied" in item:
+                applied.add(item["applied"])
+            else:
+                entries[start] = item
+            start = end
+        # cut off a torn last entry, so new entries append cleanly
+        if start < os.path.getsize(path):
+            os.truncate(path, start)
+        pending = [
+            entry for offset, entry in entries.items() if offset not in applied
+        ]
+        if not pending:
+            return None
+
+        names = []
+        for entry in pending:
+            self._redo(entry)
+            names.extend(name for name in entry if name not in names)
+        for name in names:
+            self._build_indexes(name)
+        self._write_datasets(names)
+        self._bump_versions(names)
+        self._reset_wal()
+        logger.warn(
+            f"Recovered {len(pending)} interrupted saves of {names} "
+            f"from the write-ahead log File: {path}"
+        )
+
+    def _reset_wal(self) -> None:
+        """Empties the write-ahead log, after making sure everything it
+        holds is on the disk: the data files are synced as they are
+        written, the journals and the renames are synced here."""
+        # the entries of the saves in flight are not applied yet
+        self._drain_saves()
+        for path in DATA_FILE_PATHS.values():
+            if self._is_journal(path) and os.path.exists(path):
+                with open(path, "rb") as file:
+                    os.fsync(file.fileno())
+        for directory in {
+            os.path.dirname(p) for p in DATA_FILE_PATHS.values()
+        }:
+            sync_directory(directory)
+        self.wal.reset()
+
+    def _write_datasets(self, names: list, force: bool = False) -> None:
+        """Writes the changes of datasets to their files: journals get
+        their new items appended, other files are replaced whole
+
+        Args:
+            names (list): names of the changed datasets
+            force (bool, optional): rewrite journals whole too.
+                Defaults to False.
+        """
+        writes = self._prepare_writes(names, force)
+        self._mark_saved(names)
+        self._write_prepared(writes)
+
+    def _prepare_writes(self, names: list, force: bool = False) -> list:
+        """Serializes the changes of datasets for `_write_prepared`: the
+        new items of a journal, or the whole content of other files
+
+        Args:
+            names (list): names of the changed datasets
+            force (bool, optional): rewrite journals whole too.
+                Defaults to False.
+
+        Returns:
+            list: (name, 'append' or 'replace', payload bytes, changed
+                keys or None) for each dataset
+        """
+        writes = []
+        for name in names:
+            path = DATA_FILE_PATHS[name]
+            items = self.data[name]
+            saved = self._saved_lengths.get(name, 0)
+            # items removed can't be appended, the journal is replaced
+            if self._is_journal(path) and not force and len(items) >= saved:
+                payload = "".join(
+                    self._journal_line(item) for item in items[saved:]
+                ).encode("utf-8")
+                writes.append((name, "append", payload, None))
+            else:
+                payload = self._serialize(path, items)
+                writes.append(
+                    (name, "replace", payload, self._dirty.get(name))
+                )
+        return writes
+
+    def _mark_saved(self, names: list) -> None:
+        """Counts the changes of datasets as saved, once prepared
+
+        Args:
+            names (list): names of the saved datasets
+        """
+        for name in names:
+            self._dirty.pop(name, None)
+            if isinstance(self.data[name], list):
+                self._saved_lengths[name] = len(self.data[name])
+
+    def _write_prepared(self, writes: list) -> list:
+        """Writes what `_prepare_writes` serialized, in order. Only the
+        last replacement of a file and the appends after it are written.
+
+        Args:
+            writes (list): prepared writes
+
+        Returns:
+            list: names of the written datasets
+        """
+        by_name = {}
+        for name, kind, payload, keys in writes:
+            by_name.setdefault(name, []).append((kind, payload, keys))
+        # journals first: a snapshot must never be ahead of the journal
+        names = sorted(
+            by_name,
+            key=lambda name: not self._is_journal(DATA_FILE_PATHS[name]),
+        )
+        for name in names:
+            path = DATA_FILE_PATHS[name]
+            kinds = [kind for kind, _, _ in by_name[name]]
+            size, pending = 0, by_name[name]
+            if "replace" in kinds:
+                last = len(kinds) - 1 - kinds[::-1].index("replace")
+                size += self._replace_file(path, pending[last][1])
+                pending = pending[last + 1 :]
+            if pending:
+                payload = b"".join(payload for _, payload, _ in pending)
+                size += self._append_journal(path, payload)
+            keys = set().union(*(keys or () for _, _, keys in by_name[name]))
+            # remember the file as written, so refresh won't reload it
+            self._signatures[name] = self._file_signature(path)
+            if self._is_journal(path):
+                self._journal_offsets[name] = self._signatures[name][1]
+            logger.debug(
+                lambda: f"Saved data into File: {path} ({size} bytes, "
+                f"changed records: {sorted(keys) if keys else 'n/a'})"
+            )
+        return names
+
+    def checkpoint(self) -> None:
+        """Saves the changes, then snapshots the users and books and
+        archives the transactions journal, see `_checkpoint`. Done by
+        `save_data` every SNAPSHOT_INTERVAL transactions."""
+        with self.locked():
+            # checkpointed when the atomic block saves
+            if self._in_atomic:
+                return None
+            self.save_data()
+            if self._journaled() and self.data["transactions"]:
+                self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        """Writes the users and books files as a snapshot of the state the
+        journaled transactions led to, then moves the journal to the next
+        archived segment and starts an empty one. Loading then replays
+        only the transactions since this snapshot.
+
+        A crash between the steps is harmless: replaying a journal over a
+        newer snapshot changes nothing, and a missing journal is created
+        empty on load.
+        """
+        # the snapshot must not get ahead of the saves in flight
+        self._drain_saves()
+        path = DATA_FILE_PATHS["transactions"]
+        for name in ["users", "books"]:
+            snapshot_path = DATA_FILE_PATHS[name]
+            self._replace_file(snapshot_path, self.data[name])
+            self._signatures[name] = self._file_signature(snapshot_path)
+        # the snapshot holds all the log did
+        self._reset_wal()
+
+        segments = journal_segments(path)
+        number = int(segments[-1].split(".")[-2]) + 1 if segments else 1
+        segment = f"{os.path.splitext(path)[0]}.{number:06d}.jsonl"
+        os.replace(path, segment)
+        self._write_file(path, [])
+
+        live = self.data["transactions"]
+        # history positions don't change, so its indexes stay valid
+        if self._archive is not None:
+            self._archive.extend(live)
+        self.data["transactions"] = []
+        self._saved_lengths["transactions"] = 0
+        self._journal_offsets["transactions"] = 0
+        self._signatures["transactions"] = self._file_signature(path)
+        self._bump_versions(["users", "books", "transactions"])
+        logger.info(
+            f"Checkpoint: snapshot of users and books saved, "
+            f"{len(live)} transactions archived to File: {segment}"
+        )
+
+    def _replace_file(self, path: str, content) -> int:
+        """Replaces the file at path with content, written aside and synced
+        first so a crash can't leave it half written
+
+        Args:
+            path (str): file path
+            content (dict | list | bytes): data to be written
+
+        Returns:
+            int: number of bytes written
+        """
+        # keeps the extension, which decides the file format
+        base, extension = os.path.splitext(path)
+        temp_path = f"{base}.tmp{extension}"
+        size = self._write_file(temp_path, content, sync=True)
+        os.replace(temp_path, path)
+        return size
+
+    def _write_file(self, path: str, content, sync: bool = False) -> int:
+        """Writes content to the file at path, as indented json or as
+        json lines for journal files
+
+        Args:
+            path (str): file path
+            content (dict | list | bytes): data to be written, or its
+                `_serialize` payload
+            sync (bool, optional): wait until the data is on the disk.
+                Defaults to False.
+
+        Returns:
+            int: number of bytes written
+        """
+        payload = (
+            content
+            if isinstance(content, bytes)
+            else self._serialize(path, content)
+        )
+        with open(path, "wb") as file:
+            file.write(payload)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        self.bytes_written += len(payload)
+        return len(payload)
+
+    def _serialize(self, path: str, content) -> bytes:
+        """Serializes content for the file at path, as indented json or as
+        json lines for journal files
+
+        Args:
+            path (str): file path
+            content (dict | list): data to be written
+
+        Returns:
+            bytes: the file content
+        """
+        if self._is_journal(path):
+            payload = "".join(self._journal_line(item) for item in content)
+        else:
+            payload = json.dumps(content, indent=4, default=to_json)
+        return payload.encode("utf-8")
+
+    def _append_journal(self, path: str, payload: bytes) -> int:
+        """Appends json lines to a journal file
+
+        Args:
+            path (str): journal file path
+            payload (bytes): the lines
+
+        Returns:
+            int: number of bytes written
+        """
+        with open(path, "ab") as file:
+            file.write(payload)
+        self.bytes_written += len(payload)
+        return len(payload)
+
+    @staticmethod
+    def _journal_line(item) -> str:
+        """Serializes one item as a json line"""
+        return json.dumps(item, separators=(",", ":"), default=to_json) + "\n"
+
+    @staticmethod
+    def _is_journal(path: str) -> bool:
+        """Checks if the file at path is a json lines journal"""
+        return path.endswith(".jsonl")
+
+    def _read_journal(self, path: str, offset: int = 0) -> tuple:
+        """Streams the journal file line by line into a list
+
+        Args:
+            path (str): journal file path
+            offset (int, optional): byte offset to start reading from.
+                Defaults to 0.
+
+        Returns:
+            tuple: (items of the journal, byte offset after the line of
+                the last item)
+        """
+        items = []
+        for item, offset in iter_journal(path, offset=offset):
+            items.append(item)
+        return items, offset
+
+    def _migrate_to_journal(self, path: str) -> None:
+        """One-time migration of a json array file (like transactions.json)
+        into the journal at path, if the journal doesn't exist yet.
+        The old file is kept with a '.migrated' suffix.
+
+        Args:
+            path (str): journal file path
+        """
+        legacy_path = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(path) or not os.path.exists(legacy_path):
+            return None
+
+        with open(legacy_path, "r") as file:
+            items = json.load(file)
+        # write aside and move in place, so a crash can't leave half a journal
+        temp_path = os.path.splitext(path)[0] + ".migrating.jsonl"
+        self._write_file(temp_path, items)
+        os.replace(temp_path, path)
+        os.replace(legacy_path, legacy_path + ".migrated")
+        logger.info(
+            f"Migrated {len(items)} items from File: {legacy_path} "
+            f"to journal File: {path}"
+        )
+
+    def refresh_data(self) -> None:
+        """Reloads the data of each file which changed on disk since it was
+        last loaded or saved, judged by its mtime, size and inode.
+        Appends to a journal are read from where the last read stopped,
+        and replayed over the users and books. Unsaved changes are kept,
+        merged over the reloaded data.
+        """
+        with self.locked():
+            # the signatures must match the files the saves in flight write
+            self._drain_saves()
+            # read first, so a save made while refreshing is caught next time
+            versions = self._read_versions()
+            reloaded, appended = set(), []
+            for name, path in DATA_FILE_PATHS.items():
+                old_signature = self._signatures.get(name)
+                new_signature = self._file_signature(path)
+                if (
+                    new_signature is not None
+                    and new_signature == old_signature
+                ):
+                    continue
+
+                if (
+                    self._is_journal(path)
+                    and old_signature is not None
+                    and new_signature is not None
+                    # same file which only grew, so it was appended to
+                    and new_signature[2] == old_signature[2]
+                    and new_signature[1] > old_signature[1]
+                    and name not in self._dirty
+                ):
+                    appended.extend(self._read_journal_tail(name, path))
+                    self._signatures[name] = new_signature
+                else:
+                    unsaved = self._unsaved_changes(name)
+                    self._load_dataset(name, path)
+                    reloaded.add(name)
+                    if unsaved is not None:
+                        self._merge_changes(name, unsaved)
+                        logger.info(
+                            f"Unsaved changes of {name} merged over File: "
+                            f"{path}, which was changed outside this storage"
+                        )
+                logger.debug(f"Refreshed/reloaded the fresh data from {path}")
+            self._versions = versions
+
+            # replayed whole, as unsaved transactions now come after the ones
+            # read, and a reloaded snapshot needs all of them
+            if self._journaled() and (reloaded or appended):
+                self._apply_transactions(self.data["transactions"])
+
+    def _unsaved_changes(self, name: str):
+        """Gets the unsaved changes of a dataset, to merge them again
+        with `_merge_changes` after it is reloaded
+
+        Args:
+            name (str): name of the dataset
+
+        Returns:
+            list | dict | None: unsaved items of a list dataset, or the
+                `_log_entry` changes of a dict dataset, None if none
+        """
+        data = self.data[name]
+        if isinstance(data, list):
+            saved = self._saved_lengths.get(name, 0)
+            return data[saved:] if len(data) > saved else None
+        if name not in self._dirty:
+            return None
+        return self._log_entry([name])[name]
+
+    def _merge_changes(self, name: str, changes) -> None:
+        """Applies unsaved changes of `_unsaved_changes` again over the
+        reloaded dataset. On a record changed by both, these win.
+
+        Args:
+            name (str): name of the dataset
+            changes (list | dict): the unsaved changes
+        """
+        if isinstance(changes, list):
+            # positions aren't indexed up front, see `_build_indexes`
+            self.data[name].extend(changes)
+            return None
+        self._redo({name: changes})
+        self._build_indexes(name)
+
+    def _read_journal_tail(self, name: str, path: str) -> list:
+        """Reads the items appended to the journal since the last read and
+        adds them after the already saved items
+
+        Args:
+            name (str): name of the list dataset
+            path (str): journal file path
+
+        Returns:
+            list: the items read
+        """
+        items, offset = self._read_journal(
+            path, offset=self._journal_offsets.get(name, 0)
+        )
+        items = to_records(name, items)
+        saved = self._saved_lengths.get(name, 0)
+        unsaved = len(self.data[name]) > saved
+        # keep the unsaved local items after the ones already on disk
+        self.data[name][saved:saved] = items
+        self._saved_lengths[name] = saved + len(items)
+        self._journal_offsets[name] = offset
+        # unsaved items moved, so their indexed positions are stale
+        if unsaved and items:
+            self._build_indexes(name)
+        return items
+
+    @staticmethod
+    def _file_signature(path: str):
+        """Gets the (mtime, size, inode) of a file to detect its changes
+
+        Args:
+            path (str): file path
+
+        Returns:
+            tuple | None: signature, None if the file doesn't exist
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
 
     def validate_storage(self) -> None:
         """Validates if all important file data exists in
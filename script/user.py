@@ -2,14 +2,29 @@
 Module to work with User data
 """
 
-import pandas as pd
+import os
+import time
 
 from script.loggers import LibraryLogger
+from script.records import User
+from script.settings import PAGE_SIZE
 from script.storage import Storage
-from script.utils import UserValidator, clear_screen
+from script.utils import (
+    UserValidator,
+    clear_screen,
+    format_table,
+    iter_rows,
+    print_pages,
+    read_rows,
+    report_error,
+    report_import,
+)
 
 logger = LibraryLogger()
 
+# Columns of user tables
+USER_COLUMNS = ["id", "name", "email", "borrowed"]
+
 
 class UserManagement:
     """Class to handle operations on User data"""
@@ -28,7 +43,8 @@ class UserManagement:
         print("3. List Users")
         print("4. Delete User")
         print("5. Search User")
-        print("6. Back")
+        print("6. Create Users from a file")
+        print("7. Back")
 
     def search_user_menu(self):
         """Prints search options and executes the search"""
@@ -111,7 +127,7 @@ class UserManagement:
 
             elif user_choice == "3":  # List Users
                 logger.info("List User: Start")
-                self.list_users()
+                self.list_users(interactive=True)
                 input("\nPress Enter to continue")
                 clear_screen()
 
@@ -128,7 +144,16 @@ class UserManagement:
                 self.search_user_menu()
                 clear_screen()
 
-            elif user_choice == "6":
+            elif user_choice == "6":  # Create Users from a file
+                logger.info("Create Users from a file: Start")
+                print("\nCSV files need a name,email header line,")
+                print("JSON lines files an object with those keys per line.")
+                path = input("\nEnter path of the .csv or .jsonl file: ")
+                self.create_users(path=path.strip())
+                input("\nPress Enter to continue")
+                clear_screen()
+
+            elif user_choice == "7":
                 logger.info("Move Back")
                 clear_screen()
                 # break current loop and go back to main menu of LMS
@@ -149,24 +174,15 @@ class UserManagement:
             name (str): name of user
             email (str): email address of user
         """
-        # get users_data for ease of readability
-        users_data = self.storage.data["users"]
-
         # clean input data
         name = name.lower().strip()
         email = email.lower().strip()
 
         # validate user input and if fails then return None
-        if not UserValidator.validate_user_data(
-            name=name, email=email, users_data=users_data
-        ):
+        new_uid, error = self._create_user(name, email)
+        if not report_error(error):
             return None
-        # Get available user id and Add data to storage instance
-        new_uid = self._get_available_uid()
-        users_data[new_uid] = {"name": name, "email": email}
 
-        # Save all the data back to files
-        self.storage.save_data()
         print(
             f"New user added with ID: {new_uid} - Name: {name} - Email: {email}"
         )
@@ -174,6 +190,112 @@ class UserManagement:
             f"New user added with ID: {new_uid} - Name: {name} - Email: {email}"
         )
 
+    def _create_user(self, name: str, email: str) -> tuple:
+        """Validates a new user and adds it to the data with a new user
+        id, saved before other clerks can use the same email
+
+        Args:
+            name (str): cleaned name
+            email (str): cleaned email
+
+        Returns:
+            tuple: (user id, None) if added, else (None, why it can't be)
+        """
+        with self.storage.atomic():
+            error = UserValidator.user_data_error(
+                name=name, email=email, storage=self.storage
+            )
+            if error is not None:
+                return None, error
+            # Get available user id and Add data to storage instance
+            new_uid = self._get_available_uid()
+            self.storage.data["users"][new_uid] = User(name=name, email=email)
+            self.storage.mark_dirty("users", new_uid)
+        return new_uid, None
+
+    def create_users(self, path: str):
+        """Creates users in bulk from a CSV file (with a name,email header
+        line) or a JSON lines file. Rows are streamed through the
+        UserValidator checks. Rows failing them, or repeating an email of
+        another user or of the file, are rejected with their line number.
+        The valid users get a contiguous block of new ids and are saved in
+        a single write.
+
+        Args:
+            path (str): .csv or .jsonl file path
+
+        Returns:
+            dict | None: summary with the 'read', 'added' and 'rejected'
+                row counts, 'errors' as (line number, reason) of the
+                rejected rows, 'seconds' and 'rows_per_second'. None if
+                the file can't be imported.
+        """
+        if os.path.splitext(path)[1].lower() not in [".csv", ".jsonl"]:
+            print(f"Unsupported file {path}, use a .csv or .jsonl file")
+            logger.info(f"Unsupported import file: {path}")
+            return None
+        if not os.path.isfile(path):
+            print(f"File {path} does not exist")
+            logger.info(f"Import file {path} does not exist")
+            return None
+
+        # email -> (line number, name), of the users to create
+        new_users = {}
+        errors = []
+        read = 0
+        start = time.perf_counter()
+        # checked and added in one block, so no other process can take an
+        # email between the check and the save
+        with self.storage.atomic():
+            for line_number, row in read_rows(path):
+                read += 1
+                if row is None:
+                    error = "Unreadable row"
+                else:
+                    # clean input data, like create_user
+                    name = str(row.get("name") or "").lower().strip()
+                    email = str(row.get("email") or "").lower().strip()
+                    if email in new_users:
+                        error = (
+                            f"Duplicate email of line {new_users[email][0]}"
+                        )
+                    else:
+                        error = UserValidator.user_data_error(
+                            name=name, email=email, storage=self.storage
+                        )
+
+                if error is not None:
+                    errors.append((line_number, error))
+                    logger.info(f"Rejected line {line_number}: {error}")
+                    continue
+                new_users[email] = (line_number, name)
+
+            if new_users:
+                # one block of ids for the whole batch
+                user_ids = self.storage.allocate_user_ids(count=len(new_users))
+                # read once in the block, a refresh of the data replaces it
+                users_data = self.storage.data["users"]
+                for user_id, (email, (_, name)) in zip(
+                    user_ids, new_users.items()
+                ):
+                    users_data[user_id] = User(name=name, email=email)
+                # saved once, when the atomic block ends
+                self.storage.mark_dirty_many("users", user_ids)
+        if new_users:
+            logger.info(
+                f"New users added with IDs: {user_ids[0]} to {user_ids[-1]}"
+            )
+        seconds = time.perf_counter() - start
+
+        return report_import(
+            f"{len(new_users)} users",
+            path,
+            read,
+            len(new_users),
+            errors,
+            seconds,
+        )
+
     def update_user(
         self, user_id: str, name: str = None, email: str = None
     ) -> None:
@@ -184,30 +306,36 @@ class UserManagement:
             name (str, optional): New name. Defaults to None.
             email (str, optional): new email. Defaults to None.
         """
-        users_data = self.storage.data["users"]
-        # if user doesn't exist, return None
-        if user_id not in users_data:
-            print(f"User with ID {user_id} does not exist")
-            logger.info(f"User with ID {user_id} does not exist")
-            return None
-
-        # clean, validate and assign
-        if name:
-            name = name.lower().strip()
-            if not UserValidator.validate_name(name):
-                return None
-        if email:
-            email = email.lower().strip()
-            if UserValidator.validate_email(email):
+        # the email is checked unique against the latest data, and saved
+        # before other clerks can take it
+        with self.storage.atomic():
+            users_data = self.storage.data["users"]
+            # if user doesn't exist, return None
+            if user_id not in users_data:
+                print(f"User with ID {user_id} does not exist")
+                logger.info(f"User with ID {user_id} does not exist")
                 return None
 
-        # update if all provided data passed validation
-        if name:
-            users_data[user_id]["name"] = name
-        if email:
-            users_data[user_id]["email"] = email
-        # Save the data to files
-        self.storage.save_data()
+            # clean, validate and assign
+            if name:
+                name = name.lower().strip()
+                if not UserValidator.validate_name(name):
+                    return None
+            if email:
+                email = email.lower().strip()
+                if not UserValidator.validate_email(
+                    email
+                ) or not UserValidator.validate_unique(
+                    self.storage, email, user_id=user_id
+                ):
+                    return None
+
+            # update if all provided data passed validation
+            if name:
+                users_data[user_id]["name"] = name
+            if email:
+                users_data[user_id]["email"] = email
+            self.storage.mark_dirty("users", user_id)
         print(f"User data with ID: {user_id}, updated")
         logger.info(f"User data with ID: {user_id}, updated")
 
@@ -217,35 +345,73 @@ class UserManagement:
         Args:
             user_id (str): ID of user to be deleted
         """
-        users_data = self.storage.data["users"]
         # clean input
         user_id = user_id.lower().strip()
 
-        # if user doesnt exist, return None
-        if user_id not in users_data:
-            print(f"User with ID {user_id} does not exist")
-            logger.info(f"User with ID {user_id} does not exist")
-            return None
+        # checked and deleted before other clerks can change the user
+        with self.storage.atomic():
+            users_data = self.storage.data["users"]
+            # if user doesnt exist, return None
+            if user_id not in users_data:
+                print(f"User with ID {user_id} does not exist")
+                logger.info(f"User with ID {user_id} does not exist")
+                return None
 
-        # delete the data and save data back to all the files
-        del users_data[user_id]
-        self.storage.save_data()
+            # delete the data, saved when the block ends
+            del users_data[user_id]
+            self.storage.mark_dirty("users", user_id)
         print(f"User data with ID: {user_id}, deleted")
         logger.info(f"User data with ID: {user_id}, deleted")
 
-    def list_users(self) -> None:
+    def iter_users(self, offset: int = 0):
+        """Generates the rows of users for a listing, starting at offset
+
+        Args:
+            offset (int, optional): number of users to skip. Defaults to 0.
+
+        Returns:
+            Iterator: rows (id, name, email, borrowed)
         """
-        Lists all the users with their data in tabular form
+        return iter_rows(
+            self.storage,
+            "users",
+            lambda user_id, user_info: (
+                user_id,
+                user_info.get("name"),
+                user_info.get("email"),
+                user_info.get("borrowed"),
+            ),
+            offset,
+        )
 
+    def list_users(
+        self,
+        offset: int = 0,
+        limit: int = PAGE_SIZE,
+        interactive: bool = False,
+    ) -> int:
         """
-        users_data = self.storage.data["users"]
-        # using pandas to provide tabular structure to the data
-        data_frame = pd.DataFrame(users_data.values(), index=users_data.keys())
-        data_frame.index.name = "id"
-        print()
-        print(data_frame.to_string(), end="\n\n")
-        logger.info("Users Listed")
-        logger.debug(f"\n{data_frame.to_string()}")
+        Lists the users with their data in tabular form, page by page
+
+        Args:
+            offset (int, optional): number of users to skip. Defaults to 0.
+            limit (int, optional): users per page. Defaults to PAGE_SIZE.
+            interactive (bool, optional): offer the next pages after the
+                first one. Defaults to False.
+
+        Returns:
+            int: number of users listed
+        """
+        shown = print_pages(
+            self.iter_users(offset),
+            columns=USER_COLUMNS,
+            total=len(self.storage.data["users"]),
+            offset=offset,
+            page_size=limit,
+            interactive=interactive,
+        )
+        logger.info(f"Users Listed: {shown} from {offset + 1}")
+        return shown
 
     def find_user(self, value: str, how: str = "uid"):
         """Find a user by passing value and set how = 'uid' or 'name' or 'email'
@@ -260,60 +426,75 @@ class UserManagement:
         # clean the searched value
         value = value.lower().strip()
 
-        # Get users data for readability
-        users = self.storage.data["users"]
-
-        # Check which field has been selected to search upon
-        if how == "uid":
-            user_info = users.get(value, None)
-            if user_info is None:
-                user = None
-            else:
-                user = (value, user_info)
-
-        elif how in ["name", "email"]:
-            # Loop over the users to search
-            for user_id, user_info in users.items():
-                # matching
-                if how in user_info and user_info[how].lower() == value:
-                    user = (user_id, user_info)
-                    break
-                else:
-                    user = None
-        # if how didn't match with any then it is an error
-        else:
-            raise ValueError("Invalid 'how' parameter found.")
+        # To store users found
+        found_users = self._find_users(value, how)
 
         # If user was found then print data, else notify
-        if user is None:
+        if len(found_users) == 0:
             print(f"User with {how}: {value} not found")
             logger.info(f"User with {how}: {value} not found")
         else:
             print(f"\nUser Found: \n")
-            df = pd.DataFrame(
-                user[1],  # user data
-                index=[
-                    user[0],  # uid
+            table = format_table(
+                [
+                    (user_id, *(user_info.get(c) for c in USER_COLUMNS[1:]))
+                    for user_id, user_info in found_users.items()
                 ],
+                USER_COLUMNS,
             )
-            df.index.name = "id"  # rename index column
             logger.info(f"User Found with {how}: {value}")
-            logger.debug(f"\n{df.to_string()}")
-            print(df.to_string())
+            logger.table(f"Users with {how}: {value}", table)
+            print(table)
+
+    def _find_users(self, value: str, how: str = "uid") -> dict:
+        """Finds the users by id, email or name
+
+        Args:
+            value (str): cleaned value to search
+            how (str, optional): 'uid', 'email' or 'name'. Defaults to 'uid'.
+
+        Raises:
+            ValueError: if 'how' doesn't match any available fields
+
+        Returns:
+            dict: user id -> user of the users found
+        """
+        # if how didn't match with any then it is an error
+        if how not in ["uid", "email", "name"]:
+            raise ValueError("Invalid 'how' parameter found.")
+
+        found_users = {}
+        # the users found can't change while they are gathered
+        with self.storage.reading():
+            # Get users data for readability
+            users = self.storage.data["users"]
+
+            # Check which field has been selected to search upon
+            if how == "uid":
+                user_info = users.get(value, None)
+                if user_info is not None:
+                    found_users[value] = user_info
+
+            elif how == "email":
+                # Look up the email index
+                user_id = self.storage.find_user_by_email(value)
+                if user_id is not None:
+                    found_users[user_id] = users[user_id]
+
+            else:
+                # Look up the name index, many users may share a name
+                for user_id in self.storage.find_users_by_name(value):
+                    found_users[user_id] = users[user_id]
+        return found_users
 
     def _get_available_uid(self) -> str:
-        """Find an available(max of all + 1) uid to assign to new user
+        """Get a new uid from the storage's user id counter, to assign to
+        a new user
 
         Returns:
             str: available uid
         """
-        user_ids = [
-            int(user_id)
-            for user_id in self.storage.data["users"].keys()
-            if user_id.isdigit()
-        ]
-        new_user_id = str(max(user_ids) + 1) if user_ids else "1"
-        return new_user_id
+        return self.storage.allocate_user_ids(count=1)[0]
 
 
 if __name__ == "__main__":
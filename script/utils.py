@@ -2,11 +2,15 @@
 Utilities for our LMS
 """
 
+import csv
+import json
 import os
 import re
 import sys
+from itertools import islice
 
 from script.loggers import LibraryLogger
+from script.settings import IMPORT_REPORT_LIMIT, PAGE_SIZE
 from script.storage import Storage
 
 # Get the logger instance
@@ -18,6 +22,205 @@ def clear_screen():
     os.system("cls" if os.name == "nt" else "clear")
 
 
+def format_cell(value) -> str:
+    """Formats a value for a table cell"""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def format_table(rows, columns: list) -> str:
+    """Formats rows as a fixed-width text table, each column as wide as
+    its widest cell
+
+    Args:
+        rows (iterable): rows, each a sequence of values in column order
+        columns (list): column names
+
+    Returns:
+        str: the table, header line first
+    """
+    rows = [[format_cell(value) for value in row] for row in rows]
+    widths = [len(column) for column in columns]
+    for row in rows:
+        widths = [max(width, len(cell)) for width, cell in zip(widths, row)]
+
+    lines = [
+        "  ".join(
+            cell.ljust(width) for cell, width in zip(cells, widths)
+        ).rstrip()
+        for cells in [columns] + rows
+    ]
+    return "\n".join(lines)
+
+
+def print_pages(
+    rows,
+    columns: list,
+    total: int,
+    offset: int = 0,
+    page_size: int = PAGE_SIZE,
+    interactive: bool = False,
+) -> int:
+    """Prints rows as fixed-width tables, one page at a time, taking the
+    rows lazily from an iterator so only one page is held in memory.
+
+    Args:
+        rows (iterable): rows, each a sequence of values in column order
+        columns (list): column names
+        total (int): number of rows in the whole listing
+        offset (int, optional): position of the first row in the whole
+            listing. Defaults to 0.
+        page_size (int, optional): rows per page. Defaults to PAGE_SIZE.
+        interactive (bool, optional): ask before printing each next page,
+            otherwise only the first page is printed. Defaults to False.
+
+    Returns:
+        int: number of rows printed
+    """
+    rows = iter(rows)
+    shown = 0
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            break
+        table = format_table(page, columns)
+        print()
+        print(table, end="\n\n")
+        shown += len(page)
+        rows_shown = f"Rows {offset + shown - len(page) + 1}-{offset + shown}"
+        print(f"{rows_shown} of {total}")
+        logger.table(rows_shown, table)
+
+        if not interactive or offset + shown >= total:
+            break
+        choice = input("Press Enter for the next page, or q to stop: ")
+        if choice.strip().lower() == "q":
+            break
+
+    if shown == 0:
+        print("\nNothing to list.")
+    return shown
+
+
+def iter_rows(storage: Storage, name: str, row, offset: int = 0):
+    """Generates the rows of a dataset for a listing, starting at offset.
+    The items are read a page at a time under the shared storage lock,
+    from one iterator kept across the pages, so each page costs its own
+    items only.
+
+    Args:
+        storage (Storage): storage holding the dataset
+        name (str): name of the dataset, 'books' or 'users'
+        row (callable): makes the row of a (key, item) pair
+        offset (int, optional): number of items to skip. Defaults to 0.
+
+    Yields:
+        tuple: row of an item
+    """
+    data = size = items = None
+    while True:
+        # the data can change between two pages
+        with storage.reading():
+            current = storage.data[name]
+            # replaced by a refresh, or changed: go on from the same
+            # position of the new data
+            if current is not data or len(current) != size:
+                data, size = current, len(current)
+                items = islice(current.items(), offset, None)
+            try:
+                rows = [row(*item) for item in islice(items, PAGE_SIZE)]
+            except RuntimeError:
+                # keys changed under the iterator, read the page again
+                data = None
+                continue
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+
+def read_rows(path: str):
+    """Streams the rows of a CSV file (with a header line) or of a JSON
+    lines file, one at a time, so the file is never held in memory
+
+    Args:
+        path (str): .csv or .jsonl file path
+
+    Yields:
+        tuple: (line number, row dict), row is None for a line which
+            can't be read as an object
+
+    Raises:
+        ValueError: if the file is neither .csv nor .jsonl
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, "r", newline="", encoding="utf-8") as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                # rows with more cells than the header are malformed
+                if None in row:
+                    row = None
+                yield reader.line_num, row
+    elif extension == ".jsonl":
+        with open(path, "r", encoding="utf-8") as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported file type, use .csv or .jsonl: {path}")
+
+
+def report_import(
+    what: str, path: str, read: int, added: int, errors: list, seconds: float
+) -> dict:
+    """Prints and logs the outcome of a bulk import: the first rejected
+    rows (all of them were logged already) and the throughput
+
+    Args:
+        what (str): what was imported, like '10 books'
+        path (str): imported file path
+        read (int): number of rows read
+        added (int): number of records added
+        errors (list): (line number, reason) of the rejected rows
+        seconds (float): time taken
+
+    Returns:
+        dict: summary with the 'read', 'added' and 'rejected' row counts,
+            'errors', 'seconds' and 'rows_per_second'
+    """
+    summary = {
+        "read": read,
+        "added": added,
+        "rejected": len(errors),
+        "errors": errors,
+        "seconds": seconds,
+        "rows_per_second": read / seconds if seconds else 0.0,
+    }
+    for line_number, error in errors[:IMPORT_REPORT_LIMIT]:
+        print(f"Rejected line {line_number}: {error}")
+    if len(errors) > IMPORT_REPORT_LIMIT:
+        print(
+            f"... and {len(errors) - IMPORT_REPORT_LIMIT} more rejected "
+            "lines, all of them are in the log"
+        )
+    message = (
+        f"Imported {what} from {path}, rejected {len(errors)} of {read} "
+        f"rows in {seconds:.2f}s ({summary['rows_per_second']:.0f} rows/s)"
+    )
+    print(message)
+    logger.info(message)
+    return summary
+
+
 # Error handler
 def handle_error(func):
     """
@@ -41,8 +244,42 @@ def handle_error(func):
 
 
 # Data Validators
+def report_error(error) -> bool:
+    """Prints and logs a validation error, if any
+
+    Args:
+        error (str | None): why the data is invalid, None if valid
+
+    Returns:
+        bool: True if there was no error else False
+    """
+    if error is None:
+        return True
+    print(error)
+    logger.info(error)
+    return False
+
+
 class UserValidator:
-    """Validator class for User input data"""
+    """Validator class for User input data
+
+    Each `validate_*` check prints and logs why it failed. The matching
+    `*_error` check returns that message instead, for bulk imports.
+    """
+
+    @staticmethod
+    def email_error(email: str):
+        """Checks the format of email
+
+        Args:
+            email (str): user email
+
+        Returns:
+            str | None: why the email is invalid, None if valid
+        """
+        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            return "Invalid email format"
+        return None
 
     @staticmethod
     def validate_email(email: str) -> bool:
@@ -54,13 +291,23 @@ class UserValidator:
         Returns:
             bool: True if email is valid else False
         """
+        return report_error(UserValidator.email_error(email))
 
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-            print("Invalid email format")
-            logger.info("Invalid email format")
-            return False
+    @staticmethod
+    def name_error(name: str):
+        """Checks the format of name
 
-        return True
+        Args:
+            name (str): user name
+
+        Returns:
+            str | None: why the name is invalid, None if valid
+        """
+        # Regular expression pattern to validate name (allows letters, digits, and whitespace
+        pattern = r"^[a-zA-Z0-9\s]+$"
+        if re.match(pattern, name):
+            return None
+        return "Invalid name format"
 
     @staticmethod
     def validate_name(name: str) -> bool:
@@ -72,79 +319,108 @@ class UserValidator:
         Returns:
             bool: True if name is valid else False
         """
-        # Regular expression pattern to validate name (allows letters, digits, and whitespace
-        pattern = r"^[a-zA-Z0-9\s]+$"
-        if re.match(pattern, name):
-            return True
-        else:
-            print("Invalid name format")
-            logger.info("Invalid name format")
-            return False
+        return report_error(UserValidator.name_error(name))
 
     @staticmethod
-    def validate_unique(users_data: dict, email: str) -> bool:
+    def unique_error(storage: Storage, email: str, user_id: str = None):
+        """Checks if another user already exists with the email, using
+        the storage's email index
+
+        Args:
+            storage (Storage): storage instance
+            email (str): user email
+            user_id (str, optional): id of the user the email is for, who
+                may already have it. Defaults to None.
+
+        Returns:
+            str | None: why the email is not unique, None if unique
+        """
+        owner = storage.find_user_by_email(email)
+        if owner is not None and owner != user_id:
+            return "User with this email already exists"
+        return None
+
+    @staticmethod
+    def validate_unique(
+        storage: Storage, email: str, user_id: str = None
+    ) -> bool:
         """Validates if email already exists or if user already exists
-        with given email
+        with given email, using the storage's email index
 
         Args:
+            storage (Storage): storage instance
             email (str): user email
-            users_data (dict): storage instance's users data
+            user_id (str, optional): id of the user the email is for, who
+                may already have it. Defaults to None.
 
         Returns:
             bool: True if all email is unique else False
         """
+        return report_error(
+            UserValidator.unique_error(storage, email, user_id=user_id)
+        )
 
-        for user_id, user_info in users_data.items():
-            if "email" in user_info and user_info["email"] == email:
-                print("User with this email already exists")
-                logger.info("User with this email already exists")
-                return False
+    @staticmethod
+    def user_data_error(name: str, email: str, storage: Storage):
+        """Executes all checks on the user input fields data, in the order
+        of `validate_user_data`
 
-        return True
+        Args:
+            name (str): user name
+            email (str): user email
+            storage (Storage): storage instance
+
+        Returns:
+            str | None: why the data is invalid, None if valid
+        """
+        return (
+            UserValidator.name_error(name)
+            or UserValidator.email_error(email)
+            or UserValidator.unique_error(storage, email)
+        )
 
     @staticmethod
-    def validate_user_data(name: str, email: str, users_data: dict) -> bool:
+    def validate_user_data(name: str, email: str, storage: Storage) -> bool:
         """Validates the user input fields data
 
         Args:
             name (str): user name
             email (str): user email
-            users_data (dict): Storage instance's users data
+            storage (Storage): storage instance
 
         Returns:
             bool: True if all inputs valid else False
         """
-        return (
-            UserValidator.validate_name(name)
-            and UserValidator.validate_email(email)
-            and UserValidator.validate_unique(users_data, email)
+        return report_error(
+            UserValidator.user_data_error(name, email, storage)
         )
 
 
 class BookValidator:
-    """Validator class for Book input data"""
+    """Validator class for Book input data
+
+    Each `validate_*` check prints and logs why it failed. The matching
+    `*_error` check returns that message instead, for bulk imports.
+    """
 
     @staticmethod
-    def validate_author_name(name: str) -> bool:
-        """Validates format for author name
+    def author_name_error(name: str):
+        """Checks the format of author name
 
         Args:
-            name (str): user name
+            name (str): author name
 
         Returns:
-            bool: True if name is valid else False
+            str | None: why the name is invalid, None if valid
         """
         # Regular expression pattern to validate name (allows letters, digits, and whitespace)
         pattern = r"^[a-zA-Z0-9\s]+$"
         if re.match(pattern, name):
-            return True
-        else:
-            print("Invalid Author Name")
-            logger.info("Invalid Author Name")
-            return False
+            return None
+        return "Invalid Author Name"
 
     @staticmethod
-    def validate_title(title: str) -> bool:
+    def validate_author_name(name: str) -> bool:
         """Validates format for author name
 
         Args:
@@ -153,15 +429,51 @@ class BookValidator:
         Returns:
             bool: True if name is valid else False
         """
+        return report_error(BookValidator.author_name_error(name))
+
+    @staticmethod
+    def title_error(title: str):
+        """Checks the format of book title
+
+        Args:
+            title (str): book title
+
+        Returns:
+            str | None: why the title is invalid, None if valid
+        """
         # Regular expression pattern to validate book title
         # Max length 100
         pattern = r"^[\w\s.,'!?:;-]{1,100}$"
         if re.match(pattern, title):
-            return True
-        else:
-            print("Invalid or unsupported title format")
-            logger.info("Invalid or unsupported title format")
-            return False
+            return None
+        return "Invalid or unsupported title format"
+
+    @staticmethod
+    def validate_title(title: str) -> bool:
+        """Validates format for author name
+
+        Args:
+            name (str): user name
+
+        Returns:
+            bool: True if name is valid else False
+        """
+        return report_error(BookValidator.title_error(title))
+
+    @staticmethod
+    def unique_error(books_data: dict, isbn: str):
+        """Checks if a book already exists with the ISBN
+
+        Args:
+            books_data (dict): storage instance's books data
+            isbn (str): book isbn
+
+        Returns:
+            str | None: why the isbn is not unique, None if unique
+        """
+        if isbn in books_data:
+            return "Book already exists with provided ISBN"
+        return None
 
     @staticmethod
     def validate_unique(books_data: dict, isbn: str) -> bool:
@@ -175,12 +487,22 @@ class BookValidator:
         Returns:
             bool: True if all email is unique else False
         """
-        if isbn in books_data.keys():
-            print("Book already exists with provided ISBN")
-            logger.info("Book already exists with provided ISBN")
-            return False
+        return report_error(BookValidator.unique_error(books_data, isbn))
 
-        return True
+    @staticmethod
+    def isbn_error(isbn: str):
+        """Checks the format of ISBN
+
+        Args:
+            isbn (str): book isbn
+
+        Returns:
+            str | None: why the isbn is invalid, None if valid
+        """
+        # Check if the ISBN consists of exactly 5 lowercase alphanumeric characters
+        if len(isbn) >= 5 and isbn.islower() and isbn.isalnum():
+            return None
+        return "Invalid isbn. Minimum length 5 characters. All lower. No special characters. Atleast one alphabet should be there."
 
     @staticmethod
     def validate_isbn(isbn: str) -> bool:
@@ -192,17 +514,28 @@ class BookValidator:
         Returns:
             bool: True if all email is unique else False
         """
-        # Check if the ISBN consists of exactly 5 lowercase alphanumeric characters
-        if len(isbn) >= 5 and isbn.islower() and isbn.isalnum():
-            return True
-        else:
-            print(
-                "Invalid isbn. Minimum length 5 characters. All lower. No special characters. Atleast one alphabet should be there."
-            )
-            logger.info(
-                "Invalid isbn. Minimum length 5 characters. All lower. No special characters. Atleast one alphabet should be there."
-            )
-            return False
+        return report_error(BookValidator.isbn_error(isbn))
+
+    @staticmethod
+    def book_data_error(title: str, author: str, isbn: str, books_data: dict):
+        """Executes all checks on provided book data, in the order of
+        `validate_book_data`
+
+        Args:
+            title (str): book title
+            author (str): book author
+            isbn (str): book isbn
+            books_data (dict): storage instance's books data
+
+        Returns:
+            str | None: why the data is invalid, None if valid
+        """
+        return (
+            BookValidator.author_name_error(author)
+            or BookValidator.title_error(title)
+            or BookValidator.isbn_error(isbn)
+            or BookValidator.unique_error(books_data, isbn)
+        )
 
     @staticmethod
     def validate_book_data(
@@ -219,11 +552,8 @@ class BookValidator:
         Returns:
             bool: True if all email is unique else False
         """
-        return (
-            BookValidator.validate_author_name(name=author)
-            and BookValidator.validate_title(title=title)
-            and BookValidator.validate_isbn(isbn=isbn)
-            and BookValidator.validate_unique(books_data=books_data, isbn=isbn)
+        return report_error(
+            BookValidator.book_data_error(title, author, isbn, books_data)
         )
 
 
@@ -0,0 +1,168 @@
+"""
+Module for the write-ahead log of the json storage
+
+Every save first records its changes as one entry of the log, synced to
+the disk, and only then writes the data files. An entry is followed by an
+'applied' mark once its files are written, so if the program dies in
+between, loading finds the entries without a mark and redoes them.
+
+Syncing is shared (group commit): one fsync covers every entry written
+before it, so saves made at the same time wait for a single disk flush.
+"""
+
+import json
+import os
+import threading
+
+from script.records import to_json
+
+
+def sync_directory(path: str) -> None:
+    """Makes the renames and new files of a directory durable
+
+    Args:
+        path (str): directory path
+    """
+    # directories can't be opened for syncing on Windows
+    if os.name != "posix":
+        return None
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """Append-only json lines log of the changes of each save.
+
+    Entries are written with `append` and made durable with `sync`, or
+    both at once with `commit`. Reading it back is done with
+    `script.storage.iter_journal`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        # orders the writes, and guards the offsets below
+        self._lock = threading.Lock()
+        # one fsync at a time, the others wait and usually find their
+        # entry already synced by it
+        self._sync_lock = threading.Lock()
+        # byte offsets of the log written and synced so far
+        self._written = 0
+        self._synced = 0
+        # running counts, for benchmarks and tests
+        self.syncs = 0
+        self.bytes_written = 0
+
+    def _open(self) -> int:
+        """Opens the log for appending, again if another process replaced
+        the file meanwhile"""
+        if self._fd is not None and not self._is_open_file():
+            self.close()
+        if self._fd is None:
+            self._fd = os.open(
+                self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+            )
+            self._written = self._synced = os.fstat(self._fd).st_size
+        return self._fd
+
+    def _is_open_file(self) -> bool:
+        """Checks the open file is still the one at the log's path"""
+        try:
+            return os.stat(self.path).st_ino == os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    def size(self) -> int:
+        """Gets the size in bytes of the log written so far"""
+        with self._lock:
+            self._open()
+            return self._written
+
+    def append(self, entry: dict) -> int:
+        """Writes an entry at the end of the log, without syncing it
+
+        Args:
+            entry (dict): json serializable entry
+
+        Returns:
+            int: byte offset of the entry in the log
+        """
+        line = json.dumps(entry, separators=(",", ":"), default=to_json)
+        payload = memoryview((line + "\n").encode("utf-8"))
+        size = len(payload)
+        with self._lock:
+            fd = self._open()
+            while payload:
+                payload = payload[os.write(fd, payload) :]
+            # other processes may have appended since the last write, the
+            # end of this one is where the file offset is now
+            self._written = os.lseek(fd, 0, os.SEEK_CUR)
+            self.bytes_written += size
+        return self._written - size
+
+    def sync(self, offset: int) -> None:
+        """Waits until the log is on the disk up to the entry at offset.
+        Entries appended meanwhile by others are synced along with it.
+
+        Args:
+            offset (int): byte offset of the entry
+        """
+        with self._sync_lock:
+            # an fsync made while this one waited covered it already
+            if self._synced > offset:
+                return None
+            with self._lock:
+                target = self._written
+                fd = self._fd
+            os.fsync(fd)
+            self._synced = target
+            self.syncs += 1
+
+    def commit(self, entry: dict) -> int:
+        """Writes an entry and waits until it is on the disk
+
+        Args:
+            entry (dict): json serializable entry
+
+        Returns:
+            int: byte offset of the entry in the log
+        """
+        offset = self.append(entry)
+        self.sync(offset)
+        return offset
+
+    def mark_applied(self, offset: int) -> None:
+        """Marks the entry at offset as written to the data files. Not
+        synced: it reaches the disk with the next synced entry, and
+        redoing an entry whose mark got lost changes nothing.
+
+        Args:
+            offset (int): byte offset of the entry
+        """
+        self.append({"applied": offset})
+
+    def reset(self) -> None:
+        """Empties the log, once every entry is applied and the data files
+        are on the disk. A new empty file replaces it, so readers can tell
+        it apart from the old one."""
+        with self._sync_lock, self._lock:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as file:
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+            sync_directory(os.path.dirname(os.path.abspath(self.path)))
+            self.close()
+
+    def close(self) -> None:
+        """Closes the log file, it is opened again on the next write"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._written = self._synced = 0
+
+
+if __name__ == "__main__":
+    pass
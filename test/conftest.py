@@ -0,0 +1,84 @@
+"""
+Fixtures shared by the test scripts
+"""
+
+import pytest
+from script.loggers import LibraryLogger
+from script.storage import Storage
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_files(tmp_path_factory):
+    """Fixture pointing the logger at temporary files for the whole
+    session, so tests don't write to the log folder. Yields the paths, as
+    arguments of `LibraryLogger.configure`."""
+    log_dir = tmp_path_factory.mktemp("log")
+    paths = {
+        "file_path": str(log_dir / "library.log"),
+        "err_file_path": str(log_dir / "error.log"),
+        "dump_file_path": str(log_dir / "tables.log"),
+    }
+    logger = LibraryLogger()
+    logger.configure(**paths)
+    yield paths
+    logger.shutdown()
+
+
+@pytest.fixture
+def open_storage(tmp_path, monkeypatch):
+    """Fixture for a function creating fresh Storage instances working on
+    temporary files."""
+
+    def open_storage(
+        journal: bool = True, backend: str = "json", data_dir=None
+    ) -> Storage:
+        """Creates a fresh Storage instance working on temporary files
+
+        Args:
+            journal (bool, optional): keep the transactions as a json lines
+                journal. Defaults to True.
+            backend (str, optional): 'json' or 'sqlite'. Defaults to 'json'.
+            data_dir (Path, optional): folder of the files, tmp_path if
+                None. Defaults to None.
+
+        Returns:
+            Storage: the new instance
+        """
+        data_dir = tmp_path if data_dir is None else data_dir
+        paths = {
+            "users": str(data_dir / "users.json"),
+            "books": str(data_dir / "books.json"),
+            "transactions": str(
+                data_dir
+                / ("transactions.jsonl" if journal else "transactions.json")
+            ),
+        }
+        monkeypatch.setattr("script.storage.DATA_FILE_PATHS", paths)
+        monkeypatch.setattr(
+            "script.storage.META_FILE_PATH", str(data_dir / "meta.json")
+        )
+        monkeypatch.setattr(
+            "script.storage.META_LOCK_PATH", str(data_dir / "meta.json.lock")
+        )
+        monkeypatch.setattr(
+            "script.storage.WAL_FILE_PATH", str(data_dir / "wal.jsonl")
+        )
+        monkeypatch.setattr(
+            "script.storage.VERSIONS_FILE_PATH",
+            str(data_dir / "versions.json"),
+        )
+        monkeypatch.setattr(
+            "script.storage.STORAGE_LOCK_PATH",
+            str(data_dir / "versions.json.lock"),
+        )
+        monkeypatch.setattr("script.storage.STORAGE_BACKEND", backend)
+        monkeypatch.setattr("script.sqlite_storage.DATA_FILE_PATHS", paths)
+        monkeypatch.setattr(
+            "script.sqlite_storage.SQLITE_DB_PATH",
+            str(data_dir / "library.db"),
+        )
+        # drop the singleton so a new instance loads the temporary files
+        monkeypatch.setattr(Storage, "_instance", None)
+        return Storage()
+
+    return open_storage
@@ -0,0 +1,73 @@
+"""
+Test Script for the batch command runner
+"""
+
+import io
+import json
+
+from script.batch import BatchRunner, main
+
+COMMANDS = """\
+# a book and a reader
+add_book "Dune" "Frank Herbert" a1000
+create_user "ana lopez" ana@example.com
+
+check_out 1 a1000
+check_out 1 a1000
+find_book author herbert
+book_transactions a1000
+check_in 1 a1000
+lend 1 a1000
+check_in 1
+"""
+
+
+def test_run_commands(open_storage) -> None:
+    """Test the results of each command, saved together at the end."""
+    storage = open_storage()
+    output = io.StringIO()
+    # Execute
+    summary = BatchRunner(storage).run(io.StringIO(COMMANDS), output=output)
+    # Validate
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [(r["line"], r["command"], r["ok"]) for r in results] == [
+        (2, "add_book", True),
+        (3, "create_user", True),
+        (5, "check_out", True),
+        (6, "check_out", False),
+        (7, "find_book", True),
+        (8, "book_transactions", True),
+        (9, "check_in", True),
+        (10, "lend", False),
+        (11, "check_in", False),
+    ]
+    assert results[1]["result"] == {"user_id": "1"}
+    assert results[3]["error"] == "Book with isbn: a1000 is not available"
+    assert results[4]["result"]["books"][0]["title"] == "dune"
+    assert len(results[5]["result"]["transactions"]) == 1
+    assert results[7]["error"] == "Unknown command: lend"
+    assert results[8]["error"] == "Usage: check_in USER_ID ISBN"
+    assert summary["commands"] == 9 and summary["failed"] == 3
+    assert summary["commits"] == 1
+    # saved: a new storage loads the changes
+    storage = open_storage()
+    assert storage.data["books"]["a1000"]["available"] is True
+    assert len(storage.data["transactions"]) == 2
+
+
+def test_commit_every(tmp_path, capsys, open_storage) -> None:
+    """Test the command line run, committing every 2 commands."""
+    open_storage()
+    path = tmp_path / "commands.txt"
+    path.write_text(
+        "".join(f'add_book "title" "author" a{i:04d}\n' for i in range(5))
+    )
+    # Execute
+    summary = main([str(path), "--commit-every", "2"])
+    # Validate
+    assert summary["commands"] == 5 and summary["commits"] == 3
+    out, err = capsys.readouterr()
+    assert len(out.splitlines()) == 5
+    assert json.loads(err)["summary"]["ops_per_sec"] > 0
+    storage = open_storage()
+    assert len(storage.data["books"]) == 5
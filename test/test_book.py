@@ -3,8 +3,11 @@ Test Script for BookManagement Subsystem:
 `sample only due to development time constraints`
 """
 
+from contextlib import contextmanager
+
 import pytest
 from script.book import BookManagement
+from script.indexes import parse_query, text_matches
 
 
 @pytest.fixture
@@ -14,10 +17,33 @@ def mock_storage():
     class MockStorage:
         def __init__(self):
             self.data = {"books": {}}
+            self.saves = 0
 
         def save_data(self):
+            self.saves += 1
+
+        @contextmanager
+        def atomic(self):
+            yield self
+            self.saves += 1
+
+        @contextmanager
+        def reading(self):
+            yield self
+
+        def mark_dirty(self, name, key=None):
+            pass
+
+        def mark_dirty_many(self, name, keys):
             pass
 
+        def search_books(self, query, field="title"):
+            return sorted(
+                isbn
+                for isbn, book_info in self.data["books"].items()
+                if text_matches(parse_query(query), book_info.get(field, ""))
+            )
+
         def validate_storage(self):
             pass
 
@@ -83,6 +109,50 @@ def test_list_books(mock_storage, capsys) -> None:
     assert "book title" in captured.out.lower()
 
 
+def test_list_books_pages(mock_storage, capsys, monkeypatch) -> None:
+    """Test for listing books page by page."""
+    bm = BookManagement(mock_storage)
+    # Mock Data
+    for number in range(1, 6):
+        mock_storage.data["books"][f"a{number}0000"] = {
+            "title": f"title {number}",
+            "author": "Author Name",
+            "available": True,
+        }
+    # Execute method: only the requested page
+    shown = bm.list_books(offset=1, limit=2)
+    captured = capsys.readouterr()
+    # Validate
+    assert shown == 2
+    assert "title 1" not in captured.out and "title 3" in captured.out
+    assert "title 4" not in captured.out
+    # Execute method: walk through all pages
+    monkeypatch.setattr("builtins.input", lambda prompt="": "")
+    assert bm.list_books(limit=2, interactive=True) == 5
+
+
+def test_iter_books_across_refresh(mock_storage, monkeypatch) -> None:
+    """Test the listing goes on from its position when the books are
+    changed, or replaced by a refresh, between two pages."""
+    monkeypatch.setattr("script.utils.PAGE_SIZE", 2)
+    bm = BookManagement(mock_storage)
+    # Mock Data
+    for number in range(1, 6):
+        mock_storage.data["books"][f"a{number}0000"] = {"title": "t"}
+    # Execute method
+    rows = bm.iter_books()
+    isbns = [next(rows)[0] for _ in range(2)]
+    # a book added to the same dict
+    mock_storage.data["books"]["a60000"] = {"title": "t"}
+    isbns += [next(rows)[0] for _ in range(2)]
+    # the dict replaced, like refresh_data does
+    mock_storage.data["books"] = dict(mock_storage.data["books"])
+    mock_storage.data["books"]["a70000"] = {"title": "t"}
+    isbns += [row[0] for row in rows]
+    # Validate
+    assert isbns == [f"a{number}0000" for number in range(1, 8)]
+
+
 def test_find_book(mock_storage, capsys) -> None:
     """Test for finding a book."""
     bm = BookManagement(mock_storage)
@@ -99,5 +169,75 @@ def test_find_book(mock_storage, capsys) -> None:
     assert "book title" in captured.out.lower()
 
 
+def test_find_book_by_title_words(mock_storage, capsys) -> None:
+    """Test for finding books by some words of their title."""
+    bm = BookManagement(mock_storage)
+    # Mock Data
+    mock_storage.data["books"]["a1234567890"] = {
+        "title": "deep in mountain",
+        "author": "sike lou",
+        "available": True,
+    }
+    # Execute method
+    bm.find_book("Mountain dee*", how="title")
+    # Validate
+    captured = capsys.readouterr()
+    assert "a1234567890" in captured.out.lower()
+
+
+def test_import_books_csv(mock_storage, tmp_path) -> None:
+    """Test for importing books from a CSV file with rejected rows."""
+    bm = BookManagement(mock_storage)
+    # Mock Data
+    mock_storage.data["books"]["a1000"] = {"title": "old", "available": True}
+    feed = tmp_path / "books.csv"
+    feed.write_text(
+        "isbn,title,author\n"
+        "a2000,First Book,Author One\n"
+        "a1000,Already There,Author Two\n"
+        "a2001,Second Book,Author@Three\n"
+        "A2000,First Again,Author One\n"
+        "a2002,Third Book,Author Four\n"
+    )
+    # Execute method
+    summary = bm.import_books(str(feed))
+    # Validate
+    assert summary["read"] == 5
+    assert summary["added"] == 2
+    assert [line for line, _ in summary["errors"]] == [3, 4, 5]
+    assert summary["errors"][2][1] == "Duplicate ISBN of line 2"
+    assert mock_storage.data["books"]["a2002"]["author"] == "author four"
+    assert mock_storage.saves == 1
+
+
+def test_import_books_jsonl(mock_storage, tmp_path) -> None:
+    """Test for importing books from a JSON lines file."""
+    bm = BookManagement(mock_storage)
+    # Mock Data
+    feed = tmp_path / "books.jsonl"
+    feed.write_text(
+        '{"isbn": "a2000", "title": "First Book", "author": "Author One"}\n'
+        "not json\n"
+        "\n"
+        '{"isbn": "a2001", "title": "Second Book"}\n'
+    )
+    # Execute method
+    summary = bm.import_books(str(feed))
+    # Validate
+    assert summary["added"] == 1
+    assert summary["errors"] == [
+        (2, "Unreadable row"),
+        (4, "Invalid Author Name"),
+    ]
+    assert summary["rows_per_second"] > 0
+
+
+def test_import_books_unsupported_file(mock_storage, tmp_path) -> None:
+    """Test for refusing files of other types."""
+    bm = BookManagement(mock_storage)
+    assert bm.import_books(str(tmp_path / "books.xml")) is None
+    assert bm.import_books(str(tmp_path / "missing.csv")) is None
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Test Script for the columnar transactions
+"""
+
+import numpy as np
+import pytest
+from script.columns import TransactionColumns
+from script.records import Transaction
+
+
+def make_transaction(user_id, isbn, action, timestamp) -> Transaction:
+    return Transaction(
+        user_id=user_id, isbn=isbn, action=action, timestamp=timestamp
+    )
+
+
+@pytest.fixture
+def transactions():
+    """Fixture for a small list of transactions."""
+    return [
+        make_transaction("1", "a1000", "checkout", "2024-03-17T10:00:00"),
+        make_transaction("2", "a1001", "checkout", "2024-03-17T11:00:00"),
+        make_transaction("1", "a1000", "checkin", "2024-03-18T10:00:00"),
+        make_transaction("1", "a1001", "checkout", "2024-03-19T10:00:00"),
+    ]
+
+
+@pytest.fixture
+def columns(transactions):
+    """Fixture for the columns of the transactions."""
+    columns = TransactionColumns()
+    columns.catch_up(transactions)
+    return columns
+
+
+def test_columns_types(columns) -> None:
+    """Test the compact column types."""
+    assert columns.column("user_id").dtype == np.int32
+    assert columns.column("action").dtype == np.uint8
+    assert columns.column("timestamp").dtype == np.dtype("datetime64[us]")
+
+
+def test_filters(columns) -> None:
+    """Test per-user, per-book, action and time window filters."""
+    assert columns.count() == 4
+    assert columns.count(user_id="1") == 3
+    assert columns.count(user_id="1", action="checkout") == 2
+    assert list(columns.positions(isbn="A1001")) == [1, 3]
+    assert columns.count(start="2024-03-17T10:30", end="2024-03-19") == 2
+    assert columns.count(user_id="404") == 0
+
+
+def test_counts_by(columns) -> None:
+    """Test counts grouped by a coded field."""
+    assert columns.counts_by("user_id") == {"1": 3, "2": 1}
+    assert columns.counts_by("isbn", action="checkin") == {"a1000": 1}
+
+
+def test_catch_up_appends_incrementally(columns, transactions) -> None:
+    """Test that only new transactions are converted."""
+    transactions.append(
+        make_transaction("2", "a1000", "checkin", "2024-03-20T10:00:00")
+    )
+    # an already converted row is not read again
+    transactions[0] = make_transaction("9", "x", "checkin", None)
+    columns.catch_up(transactions)
+    assert len(columns) == 5
+    assert columns.count(user_id="2") == 2
+    assert columns.count(user_id="9") == 0
+
+
+def test_catch_up_grows_arrays() -> None:
+    """Test appends past the allocated capacity."""
+    columns = TransactionColumns()
+    items = []
+    for i in range(3000):
+        items.append(make_transaction(str(i % 7), "a1000", "checkout", None))
+        if i % 1000 == 0:
+            columns.catch_up(items)
+    columns.catch_up(items)
+    assert columns.count(user_id="3") == len(
+        [item for item in items if item["user_id"] == "3"]
+    )
+    # missing timestamps are never inside a time window
+    assert columns.count(start="2000-01-01") == 0
@@ -0,0 +1,163 @@
+"""
+Test Script for the transactions export
+"""
+
+import csv
+import json
+
+import pytest
+from script.check import TransactionManagement
+from script.export import (
+    export_transactions,
+    filter_transactions,
+    iter_saved_transactions,
+    main,
+)
+from script.records import Book, Transaction, User
+
+
+@pytest.fixture
+def transactions():
+    """Fixture for a few transactions, as records and as dicts."""
+    return [
+        Transaction(
+            user_id="1",
+            isbn="a1000",
+            action="checkout",
+            timestamp="2024-03-17T10:00:00",
+        ),
+        {
+            "user_id": "2",
+            "isbn": "a1001",
+            "action": "checkout",
+            "timestamp": "2024-03-18T10:00:00",
+        },
+        Transaction(
+            user_id="1",
+            isbn="a1000",
+            action="checkin",
+            timestamp="2024-03-19T10:00:00.123456",
+        ),
+    ]
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch, transactions):
+    """Fixture for a transactions journal the export streams from."""
+    path = tmp_path / "transactions.jsonl"
+    path.write_text(
+        "".join(json.dumps(dict(item)) + "\n" for item in transactions)
+    )
+    monkeypatch.setattr(
+        "script.storage.DATA_FILE_PATHS", {"transactions": str(path)}
+    )
+    monkeypatch.setattr("script.storage.STORAGE_BACKEND", "json")
+    monkeypatch.setattr(
+        "script.storage.STORAGE_LOCK_PATH", str(tmp_path / "storage.lock")
+    )
+    return path
+
+
+def test_filter_transactions(transactions) -> None:
+    """Test the time range, user and isbn filters."""
+    selected = filter_transactions(
+        transactions, start="2024-03-18", end="2024-03-19T10:00:00.5"
+    )
+    assert [item["timestamp"][:10] for item in selected] == [
+        "2024-03-18",
+        "2024-03-19",
+    ]
+    assert len(list(filter_transactions(transactions, user_id=" 1 "))) == 2
+    assert len(list(filter_transactions(transactions, isbn="A1001"))) == 1
+
+
+def test_export_csv(transactions, tmp_path) -> None:
+    """Test the export of filtered transactions to a CSV file."""
+    output = tmp_path / "export.csv"
+    count = export_transactions(
+        transactions, output=str(output), user_id="1", end="2024-03-19"
+    )
+    # Validate
+    assert count == 1
+    with open(output, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert rows == [
+        {
+            "user_id": "1",
+            "isbn": "a1000",
+            "action": "checkout",
+            "timestamp": "2024-03-17T10:00:00",
+        }
+    ]
+
+
+def test_export_streams_journal_to_stdout(journal, capsys) -> None:
+    """Test the command line export of the saved transactions."""
+    count = main(["--format", "jsonl", "--isbn", "a1000"])
+    # Validate
+    assert count == 2
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["action"] for line in lines] == [
+        "checkout",
+        "checkin",
+    ]
+
+
+def test_export_rejects_bad_time(journal) -> None:
+    """Test that the command line refuses times which aren't ISO."""
+    with pytest.raises(SystemExit):
+        main(["--start", "yesterday"])
+
+
+def test_menu_export_streams_journal(journal, tmp_path, capsys) -> None:
+    """Test the menu export streams the saved transactions instead of
+    loading the history."""
+
+    class StreamOnlyStorage:
+        def validate_storage(self):
+            pass
+
+        def transaction_history(self):
+            raise AssertionError("the history is streamed")
+
+    tm = TransactionManagement(StreamOnlyStorage())
+    output = tmp_path / "export.jsonl"
+    # Execute
+    tm.export(str(output), user_id="1", isbn="")
+    # Validate
+    assert "Exported 2 checkins" in capsys.readouterr().out
+    lines = output.read_text().splitlines()
+    assert [json.loads(line)["user_id"] for line in lines] == ["1", "1"]
+
+
+def test_export_during_checkpoint(open_storage, monkeypatch) -> None:
+    """Test a checkpoint while the transactions are streamed moves none of
+    them out of the export's way, nor into it twice."""
+    monkeypatch.setattr("script.storage.SNAPSHOT_INTERVAL", 1000)
+    storage = open_storage()
+    storage.data["users"]["1"] = User(name="u", email="u@x.io", borrowed=[])
+    storage.data["books"]["a1000"] = Book(
+        title="t", author="a", available=True
+    )
+    storage.mark_dirty("users", "1")
+    storage.mark_dirty("books", "a1000")
+    tm = TransactionManagement(storage)
+    for _ in range(2):
+        tm.check_out("1", "a1000")
+        tm.check_in("1", "a1000")
+        storage.checkpoint()
+    tm.check_out("1", "a1000")
+    saved = list(iter_saved_transactions())
+    # Execute: checkpoint once the first rows are read
+    items = iter_saved_transactions()
+    exported = [next(items)]
+    tm.check_in("1", "a1000")
+    storage.checkpoint()
+    tm.check_out("1", "a1000")
+    exported.extend(items)
+    # Validate: the rows saved when the export started, once each
+    assert exported == saved
+    assert [item["action"] for item in saved] == [
+        "checkout",
+        "checkin",
+    ] * 2 + ["checkout"]
@@ -0,0 +1,63 @@
+"""
+Test Script for the locks between threads
+"""
+
+import threading
+
+import pytest
+from script.locks import ReadWriteLock
+
+
+def test_readers_share_writer_alone() -> None:
+    """Test readers hold the lock together, and a writer waits for them."""
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=5)
+    events = []
+
+    def read():
+        with lock.reading():
+            # the readers must be inside at once to pass the barrier
+            inside.wait()
+            events.append("read")
+
+    def write():
+        with lock.writing():
+            events.append("write")
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    with lock.reading():
+        for reader in readers:
+            reader.start()
+        inside.wait()
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join(timeout=0.2)
+        # Validate: the writer waits for this reader
+        assert writer.is_alive()
+    for thread in readers + [writer]:
+        thread.join(timeout=5)
+    assert sorted(events) == ["read", "read", "write"]
+
+
+def test_writer_reenters() -> None:
+    """Test the writer can read and write again inside its block, while a
+    reader can't start writing."""
+    lock = ReadWriteLock()
+    with lock.writing():
+        with lock.reading(), lock.writing():
+            pass
+    with lock.reading():
+        with pytest.raises(RuntimeError):
+            with lock.writing():
+                pass
+    # Validate: released, another thread can take it
+    taken = []
+
+    def write():
+        with lock.writing():
+            taken.append(True)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join(timeout=5)
+    assert taken == [True]
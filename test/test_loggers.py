@@ -0,0 +1,137 @@
+"""
+Test Script for the queued LibraryLogger
+"""
+
+import os
+import threading
+
+import pytest
+from script.loggers import LibraryLogger
+
+
+@pytest.fixture
+def logger(tmp_path, log_files):
+    """Points the logger at temporary files for the duration of a test"""
+    logger = LibraryLogger()
+    logger.configure(
+        "INFO",
+        queued=True,
+        file_path=str(tmp_path / "library.log"),
+        err_file_path=str(tmp_path / "error.log"),
+        dump_file_path=str(tmp_path / "tables.log"),
+    )
+    yield logger
+    logger.configure(**log_files)
+
+
+def test_queued_records_written(logger, tmp_path) -> None:
+    """Test records are written by the background thread, by level."""
+    # Execute
+    logger.debug("hidden")
+    for i in range(100):
+        logger.info(f"record {i}")
+    logger.error("broken")
+    logger.shutdown()
+    # Validate
+    lines = (tmp_path / "library.log").read_text().splitlines()
+    assert len(lines) == 101
+    assert lines[0].endswith("INFO - record 0")
+    assert lines[-1].endswith("ERROR - broken")
+    errors = (tmp_path / "error.log").read_text().splitlines()
+    assert len(errors) == 1 and errors[0].endswith("ERROR - broken")
+
+
+def test_queued_records_formatted_by_writer(
+    logger, tmp_path, monkeypatch
+) -> None:
+    """Test arguments are formatted in the writer thread, not the caller."""
+    # pytest's capture handlers on the root logger format in the caller
+    monkeypatch.setattr(logger.logger, "propagate", False)
+
+    class Argument:
+        def __str__(self):
+            threads.append(threading.current_thread())
+            return "argument"
+
+    threads = []
+    # Execute
+    logger.info("with %s", Argument())
+    logger.shutdown()
+    # Validate
+    assert threads and threading.main_thread() not in threads
+    lines = (tmp_path / "library.log").read_text().splitlines()
+    assert [line.split(" - ")[-1] for line in lines] == ["with argument"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_logs(logger, tmp_path) -> None:
+    """Test a forked child writes its records with its own thread."""
+    # Execute
+    pid = os.fork()
+    if pid == 0:
+        logger.info("from child")
+        logger.shutdown()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    logger.info("from parent")
+    logger.shutdown()
+    # Validate
+    lines = (tmp_path / "library.log").read_text().splitlines()
+    assert sorted(line.split(" - ")[-1] for line in lines) == [
+        "from child",
+        "from parent",
+    ]
+
+
+def test_lazy_messages(logger, tmp_path) -> None:
+    """Test arguments and callables are only used at an enabled level."""
+
+    def render():
+        calls.append(1)
+        return "rendered"
+
+    calls = []
+    # Execute
+    logger.debug(lambda: render())
+    logger.table("hidden", render)
+    logger.info("%s of %d", "one", 2)
+    logger.info(render)
+    logger.info("100% literal")
+    logger.shutdown()
+    # Validate
+    assert len(calls) == 1
+    lines = (tmp_path / "library.log").read_text().splitlines()
+    assert [line.split(" - ")[-1] for line in lines] == [
+        "one of 2",
+        "rendered",
+        "100% literal",
+    ]
+
+
+def test_table_dumps(logger, tmp_path, monkeypatch) -> None:
+    """Test tables go to the dump file only, capped in size."""
+    monkeypatch.setattr("script.loggers.LOG_DUMP_MAX_BYTES", 2000)
+    logger.configure(
+        "DEBUG",
+        queued=True,
+        file_path=str(tmp_path / "library.log"),
+        err_file_path=str(tmp_path / "error.log"),
+        dump_file_path=str(tmp_path / "tables.log"),
+    )
+    # Execute
+    logger.info("listed")
+    for i in range(20):
+        logger.table(f"Rows {i}", lambda: "x" * 500)
+    logger.shutdown()
+    # Validate
+    lines = (tmp_path / "library.log").read_text().splitlines()
+    assert [line.split(" - ")[-1] for line in lines] == ["listed"]
+    dump = (tmp_path / "tables.log").read_text()
+    assert "Rows 19\n" + "x" * 500 in dump
+    assert len(dump) <= 2000
+    assert sorted(os.listdir(tmp_path)) == [
+        "error.log",
+        "library.log",
+        "tables.log",
+        "tables.log.1",
+    ]
@@ -0,0 +1,201 @@
+"""
+Test Script for the JSON HTTP service, through a localhost client
+"""
+
+import asyncio
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from script.service import LibraryService
+
+
+@pytest.fixture
+def port(open_storage):
+    """Runs the service on a free localhost port, in a background event
+    loop, for the duration of a test"""
+    service = LibraryService(open_storage())
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(service.start("127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield server.sockets[0].getsockname()[1]
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    loop.close()
+    service.close()
+
+
+def request(connection, method: str, path: str, body: dict = None):
+    """Sends a request and reads its JSON response
+
+    Returns:
+        tuple: (status, payload)
+    """
+    connection.request(
+        method, path, body=None if body is None else json.dumps(body)
+    )
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_books_and_users(port) -> None:
+    """Test adding and finding books and users."""
+    client = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    book = {"title": "Dune", "author": "Frank Herbert", "isbn": "a1000"}
+    # Execute and Validate, on one kept alive connection
+    assert request(client, "POST", "/books", book) == (201, {"isbn": "a1000"})
+    status, payload = request(client, "POST", "/books", book)
+    assert status == 400 and "already exists" in payload["error"]
+    assert request(client, "GET", "/books/a1000") == (
+        200,
+        {
+            "isbn": "a1000",
+            "title": "dune",
+            "author": "frank herbert",
+            "available": True,
+        },
+    )
+    status, payload = request(client, "GET", "/books?q=frank&field=author")
+    assert [book["isbn"] for book in payload["books"]] == ["a1000"]
+    assert request(client, "GET", "/books/z9999")[0] == 404
+
+    user = {"name": "ana", "email": "ana@example.com"}
+    status, payload = request(client, "POST", "/users", user)
+    assert status == 201
+    user_id = payload["user_id"]
+    status, payload = request(client, "GET", "/users?email=ANA@example.com")
+    assert [user["user_id"] for user in payload["users"]] == [user_id]
+    status, payload = request(client, "POST", "/users", {"name": "ana"})
+    assert status == 400 and payload == {
+        "error": "Field email must be a string"
+    }
+    client.close()
+
+
+def test_check_out_and_in(port) -> None:
+    """Test checking a book out and in again, and the errors."""
+    client = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    request(
+        client,
+        "POST",
+        "/books",
+        {"title": "t", "author": "a", "isbn": "a1000"},
+    )
+    _, payload = request(
+        client, "POST", "/users", {"name": "u", "email": "u@x.io"}
+    )
+    item = {"user_id": payload["user_id"], "isbn": "a1000"}
+    # Execute and Validate
+    assert request(client, "POST", "/checkouts", item)[0] == 200
+    status, payload = request(client, "POST", "/checkouts", item)
+    assert status == 409 and "not available" in payload["error"]
+    assert request(client, "GET", "/books?available=1") == (200, {"books": []})
+    for path in ["/checkouts", "/checkins"]:
+        status, payload = request(client, "POST", path, {**item, "isbn": "z9"})
+        assert status == 404 and "No Book" in payload["error"]
+        status, payload = request(
+            client, "POST", path, {**item, "user_id": "0"}
+        )
+        assert status == 404 and "No User" in payload["error"]
+    assert request(client, "POST", "/checkins", item)[0] == 200
+    status, payload = request(client, "GET", "/books/a1000/transactions")
+    assert [t["action"] for t in payload["transactions"]] == [
+        "checkout",
+        "checkin",
+    ]
+    assert request(client, "GET", "/nowhere")[0] == 404
+    assert request(client, "DELETE", "/books")[0] == 405
+    client.close()
+
+
+def test_concurrent_lookups(port) -> None:
+    """Test many clients looking books up while another checks them out
+    and in."""
+    setup = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    for i in range(10):
+        book = {"title": f"title {i}", "author": "a", "isbn": f"a100{i}"}
+        request(setup, "POST", "/books", book)
+    _, payload = request(
+        setup, "POST", "/users", {"name": "u", "email": "u@x.io"}
+    )
+    user_id = payload["user_id"]
+
+    def look_up(i):
+        client = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        statuses = [
+            request(client, "GET", f"/books?q=title+{i % 10}")[0]
+            for _ in range(20)
+        ]
+        client.close()
+        return statuses
+
+    def check_out_and_in():
+        for i in range(10):
+            item = {"user_id": user_id, "isbn": f"a100{i}"}
+            assert request(setup, "POST", "/checkouts", item)[0] == 200
+            assert request(setup, "POST", "/checkins", item)[0] == 200
+
+    # Execute
+    with ThreadPoolExecutor(50) as pool:
+        changes = pool.submit(check_out_and_in)
+        statuses = [
+            status for s in pool.map(look_up, range(49)) for status in s
+        ]
+        changes.result()
+    # Validate
+    assert statuses == [200] * 49 * 20
+    _, payload = request(setup, "GET", "/books?available=1")
+    assert len(payload["books"]) == 10
+    setup.close()
+
+
+def test_book_named_available(port) -> None:
+    """Test a book with the ISBN 'available' is found by its path."""
+    client = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    book = {"title": "t", "author": "a", "isbn": "available"}
+    request(client, "POST", "/books", book)
+    # Execute and Validate
+    status, payload = request(client, "GET", "/books/available")
+    assert status == 200 and payload["isbn"] == "available"
+    _, payload = request(client, "GET", "/books?available=1")
+    assert [book["isbn"] for book in payload["books"]] == ["available"]
+    client.close()
+
+
+def test_lookups_during_slow_save(port, monkeypatch) -> None:
+    """Test lookups are answered while a save waits on the disk."""
+    client = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    book = {"title": "t", "author": "a", "isbn": "a1000"}
+    request(client, "POST", "/books", book)
+    syncing, release = threading.Event(), threading.Event()
+
+    def slow_fsync(fd):
+        syncing.set()
+        release.wait(10)
+
+    monkeypatch.setattr("script.wal.os.fsync", slow_fsync)
+
+    def add_book():
+        saver = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        book = {"title": "t", "author": "a", "isbn": "a1001"}
+        status = request(saver, "POST", "/books", book)[0]
+        saver.close()
+        return status
+
+    # Execute
+    with ThreadPoolExecutor(1) as pool:
+        save = pool.submit(add_book)
+        assert syncing.wait(10)
+        lookup = request(client, "GET", "/books/a1000")[0]
+        saved = save.done()
+        release.set()
+        # Validate
+        assert lookup == 200 and not saved
+        assert save.result() == 201
+    assert request(client, "GET", "/books/a1001")[0] == 200
+    client.close()
@@ -0,0 +1,98 @@
+"""
+Test Script for the startup of the program: what main.py imports, and how
+long it takes
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Modules imported by main.py, measured without running the program
+MODULES = [
+    "script.book",
+    "script.check",
+    "script.loggers",
+    "script.storage",
+    "script.user",
+    "script.utils",
+]
+
+# Budget of the imports of the program's own modules, in microseconds:
+# about 1.5 times the ~100 ms they take without pandas
+IMPORT_BUDGET_US = 150_000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_imports(modules: list) -> dict:
+    """Imports modules in a fresh interpreter with `-X importtime`
+
+    Args:
+        modules (list): names of the modules
+
+    Returns:
+        dict: {module: cumulative microseconds}, nested module names keep
+            their indentation
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {', '.join(modules)}",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # nested imports are indented below their parent
+        times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+def program_time(times: dict) -> int:
+    """Sums the import times of the program's own top level modules, with
+    what they import. Nested ones are counted in their parent, and the
+    interpreter's own startup (site, encodings) is left out."""
+    return sum(
+        cumulative
+        for name, cumulative in times.items()
+        if name.split(".")[0] in ["script", "main"]
+    )
+
+
+@pytest.fixture(scope="module")
+def import_times():
+    """Fixture for the import times of the modules of main.py."""
+    return measure_imports(MODULES)
+
+
+def test_startup_within_budget(import_times) -> None:
+    """Test the program's modules import within IMPORT_BUDGET_US."""
+    # Execute: the best of a few runs, to smooth out a busy machine
+    startup = min(
+        [program_time(import_times)]
+        + [program_time(measure_imports(MODULES)) for _ in range(2)]
+    )
+    # Validate
+    assert 0 < startup < IMPORT_BUDGET_US, f"Startup took {startup} us"
+
+
+def test_startup_does_not_import_pandas(import_times) -> None:
+    """Test pandas isn't imported at startup."""
+    assert "pandas" not in {name.strip() for name in import_times}
+
+
+def test_startup_does_not_import_numpy(import_times) -> None:
+    """Test numpy isn't imported at startup."""
+    # only the transaction columns need it, imported on first use
+    assert "numpy" not in {name.strip() for name in import_times}
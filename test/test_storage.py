@@ -0,0 +1,756 @@
+"""
+Test Script for Storage:
+`sample only due to development time constraints`
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+from script.book import BookManagement
+from script.check import TransactionManagement
+from script.export import iter_saved_transactions
+from script.records import Book, Transaction, User
+from script.storage import Storage
+from script.user import UserManagement
+
+
+@pytest.fixture
+def storage(open_storage):
+    """Fixture for a fresh Storage instance working on temporary files."""
+    return open_storage(journal=False)
+
+
+@pytest.fixture
+def journal_storage(open_storage):
+    """Fixture for a fresh Storage instance keeping a transactions journal."""
+    return open_storage()
+
+
+def test_save_only_dirty_dataset(storage, tmp_path) -> None:
+    """Test that only the marked dataset gets rewritten."""
+    storage.data["books"]["a1000"] = {"title": "t", "available": True}
+    storage.mark_dirty("books", "a1000")
+    before = storage.bytes_written
+    storage.save_data()
+    written = storage.bytes_written - before
+    # Validate
+    assert written == os.path.getsize(tmp_path / "books.json")
+    assert storage.changed_datasets() == []
+
+
+def test_records_loaded_as_slotted_types(storage, tmp_path) -> None:
+    """Test that records are held as record types and saved as plain json."""
+    storage.data["users"]["1"] = User(name="x", email="x@y.z")
+    storage.mark_dirty("users", "1")
+    storage.data["transactions"].append(
+        Transaction(user_id="1", isbn="a1000", action="checkout")
+    )
+    storage.save_data()
+    # Validate the json layout on disk, without unset fields
+    assert json.loads((tmp_path / "users.json").read_text()) == {
+        "1": {"name": "x", "email": "x@y.z"}
+    }
+    storage.load_data()
+    user = storage.data["users"]["1"]
+    assert isinstance(user, User)
+    assert not hasattr(user, "__dict__")
+    assert user == {"name": "x", "email": "x@y.z"}
+    assert "borrowed" not in user
+    assert isinstance(storage.data["transactions"][0], Transaction)
+
+
+def test_record_behaves_like_dict() -> None:
+    """Test the dict style access the managers rely on."""
+    book = Book(title="t", available=True)
+    book["available"] = False
+    assert book.get("author") is None
+    assert book.get("available") is False
+    assert dict(book) == {"title": "t", "available": False}
+    with pytest.raises(KeyError):
+        book["author"]
+    with pytest.raises(KeyError):
+        book["unknown"] = 1
+
+
+def test_transaction_values_interned() -> None:
+    """Test that repeated transaction values are shared."""
+    first = Transaction.from_dict(json.loads('{"action": "checkout"}'))
+    second = Transaction.from_dict(json.loads('{"action": "checkout"}'))
+    assert first["action"] is second["action"]
+
+
+def test_transaction_columns_follow_appends(storage) -> None:
+    """Test that the columnar transactions keep up with new ones."""
+    transactions = storage.data["transactions"]
+    transactions.append(Transaction(user_id="1", isbn="a1000"))
+    assert storage.transaction_columns().count(user_id="1") == 1
+    transactions.append(Transaction(user_id="1", isbn="a1001"))
+    columns = storage.transaction_columns()
+    assert columns.count(user_id="1") == 2
+    # reloading replaces the list, so the columns are converted again
+    storage.load_data()
+    assert storage.transaction_columns().count() == 0
+
+
+def test_atomic_saves_once(storage) -> None:
+    """Test that saves inside an atomic block are deferred to its end."""
+    before = storage.bytes_written
+    with storage.atomic():
+        for isbn in ["a1000", "a1001"]:
+            storage.data["books"][isbn] = Book(title=isbn, available=True)
+            storage.mark_dirty("books", isbn)
+            storage.save_data()
+        assert storage.bytes_written == before
+    assert storage.bytes_written > before
+    assert storage.changed_datasets() == []
+
+
+def test_atomic_rolls_back_on_error(storage) -> None:
+    """Test that a failed atomic block leaves the saved state only."""
+    storage.data["books"]["a1000"] = Book(title="t", available=True)
+    storage.mark_dirty("books", "a1000")
+    storage.data["transactions"].append(Transaction(user_id="1"))
+    storage.save_data()
+    with pytest.raises(RuntimeError):
+        with storage.atomic():
+            storage.data["books"]["a1000"]["available"] = False
+            storage.mark_dirty("books", "a1000")
+            storage.data["transactions"].append(Transaction(user_id="1"))
+            raise RuntimeError("failed")
+    # Validate
+    assert storage.data["books"]["a1000"]["available"] is True
+    assert storage.available_books() == ["a1000"]
+    assert len(storage.data["transactions"]) == 1
+    assert len(storage.find_transactions("user_id", "1")) == 1
+    assert storage.changed_datasets() == []
+
+
+def test_save_without_changes_writes_nothing(storage) -> None:
+    """Test that saving unchanged data does not touch the files."""
+    before = storage.bytes_written
+    storage.save_data()
+    assert storage.bytes_written == before
+
+
+def test_transaction_append_detected(storage) -> None:
+    """Test that appends to transactions are saved without marking."""
+    storage.data["transactions"].append({"user_id": "1", "isbn": "a1000"})
+    assert storage.changed_datasets() == ["transactions"]
+    storage.save_data()
+    # Validate data survives a reload
+    storage.load_data()
+    assert len(storage.data["transactions"]) == 1
+
+
+def test_journal_appends_only_new_lines(journal_storage, tmp_path) -> None:
+    """Test that saving a transaction appends a single line."""
+    journal = tmp_path / "transactions.jsonl"
+    journal_storage.data["transactions"].append({"user_id": "1"})
+    journal_storage.save_data()
+    size = journal.stat().st_size
+    journal_storage.data["transactions"].append({"user_id": "2"})
+    before = journal_storage.bytes_written
+    journal_storage.save_data()
+    # Validate only the new line got written
+    assert journal_storage.bytes_written - before == len('{"user_id":"2"}\n')
+    assert journal.stat().st_size == size + len('{"user_id":"2"}\n')
+    journal_storage.load_data()
+    assert journal_storage.data["transactions"] == [
+        {"user_id": "1"},
+        {"user_id": "2"},
+    ]
+
+
+def test_journal_migration(tmp_path, open_storage) -> None:
+    """Test the one-time migration from transactions.json to the journal."""
+    legacy = tmp_path / "transactions.json"
+    legacy.write_text(json.dumps([{"user_id": "1"}, {"user_id": "2"}]))
+    storage = open_storage()
+    # Validate
+    assert len(storage.data["transactions"]) == 2
+    assert (tmp_path / "transactions.jsonl").read_text().count("\n") == 2
+    assert not legacy.exists()
+
+
+def test_journal_ignores_torn_last_line(journal_storage, tmp_path) -> None:
+    """Test that a half written last line doesn't break loading."""
+    journal = tmp_path / "transactions.jsonl"
+    journal.write_text('{"user_id":"1"}\n{"user_id":')
+    journal_storage.load_data()
+    assert journal_storage.data["transactions"] == [{"user_id": "1"}]
+    # Validate the torn line was cut off before appending again
+    journal_storage.data["transactions"].append({"user_id": "2"})
+    journal_storage.save_data()
+    journal_storage.load_data()
+    assert len(journal_storage.data["transactions"]) == 2
+
+
+def test_refresh_skips_unchanged_files(storage, monkeypatch) -> None:
+    """Test that refresh doesn't re-parse files which didn't change."""
+    storage.data["books"]["a1000"] = {"title": "t", "available": True}
+    storage.mark_dirty("books", "a1000")
+    storage.save_data()
+    reloaded = []
+    monkeypatch.setattr(
+        storage, "_load_dataset", lambda name, path: reloaded.append(name)
+    )
+    storage.refresh_data()
+    # Validate
+    assert reloaded == []
+
+
+def test_refresh_reloads_changed_file(storage, tmp_path) -> None:
+    """Test that refresh picks up a file changed by someone else."""
+    (tmp_path / "users.json").write_text(json.dumps({"9": {"name": "x"}}))
+    storage.refresh_data()
+    assert storage.data["users"] == {"9": {"name": "x"}}
+
+
+def test_refresh_reads_journal_tail(journal_storage, tmp_path) -> None:
+    """Test that refresh only reads lines appended by someone else."""
+    journal_storage.data["transactions"].append({"user_id": "1"})
+    journal_storage.save_data()
+    with open(tmp_path / "transactions.jsonl", "a") as file:
+        file.write('{"user_id":"2"}\n')
+    # an unsaved local item stays after the ones read from disk
+    journal_storage.data["transactions"].append({"user_id": "3"})
+    journal_storage.refresh_data()
+    assert journal_storage.data["transactions"] == [
+        {"user_id": "1"},
+        {"user_id": "2"},
+        {"user_id": "3"},
+    ]
+
+
+def test_find_transactions(journal_storage, tmp_path) -> None:
+    """Test the transaction indexes follow appends and refreshes."""
+    transactions = journal_storage.data["transactions"]
+    transactions.append({"user_id": "1", "isbn": "a1000"})
+    transactions.append({"user_id": "2", "isbn": "a1000"})
+    assert journal_storage.find_transactions("isbn", "a1000") == transactions
+    journal_storage.save_data()
+    # someone else appends while an unsaved local item exists
+    with open(tmp_path / "transactions.jsonl", "a") as file:
+        file.write('{"user_id":"1","isbn":"a2000"}\n')
+    transactions.append({"user_id": "1", "isbn": "a3000"})
+    journal_storage.refresh_data()
+    # Validate
+    found = journal_storage.find_transactions("user_id", "1")
+    assert [item["isbn"] for item in found] == ["a1000", "a2000", "a3000"]
+
+
+def add_reader_and_book(storage) -> None:
+    """Saves a user '1' and an available book 'a1000'"""
+    storage.data["users"]["1"] = User(name="alice", email="a@example.com")
+    storage.data["books"]["a1000"] = Book(title="t", available=True)
+    storage.mark_dirty("users", "1")
+    storage.mark_dirty("books", "a1000")
+    storage.save_data()
+
+
+def test_checkout_only_appends_journal(journal_storage, tmp_path) -> None:
+    """Test that a checkout leaves the snapshot files untouched and is
+    replayed from the journal on load."""
+    add_reader_and_book(journal_storage)
+    books = (tmp_path / "books.json").read_text()
+    TransactionManagement(journal_storage).check_out("1", "a1000")
+    # Validate
+    assert (tmp_path / "books.json").read_text() == books
+    assert journal_storage.available_books() == []
+    journal_storage.load_data()
+    assert journal_storage.data["books"]["a1000"]["available"] is False
+    assert journal_storage.data["users"]["1"]["borrowed"] == ["a1000"]
+    assert journal_storage.available_books() == []
+
+
+def test_discard_restores_derived_state(journal_storage) -> None:
+    """Test that a failed unit of work drops the state its transactions
+    derived."""
+    add_reader_and_book(journal_storage)
+    tm = TransactionManagement(journal_storage)
+    with pytest.raises(RuntimeError):
+        with journal_storage.atomic():
+            tm._check_out("1", "a1000")
+            raise RuntimeError("failed")
+    # Validate
+    assert journal_storage.data["books"]["a1000"]["available"] is True
+    assert journal_storage.data["users"]["1"].get("borrowed") is None
+    assert journal_storage.available_books() == ["a1000"]
+
+
+def test_checkpoint_archives_journal(
+    journal_storage, tmp_path, monkeypatch
+) -> None:
+    """Test that every SNAPSHOT_INTERVAL transactions the state is
+    snapshot and the journal archived, so loading replays only the tail
+    while the history stays whole."""
+    monkeypatch.setattr("script.storage.SNAPSHOT_INTERVAL", 3)
+    add_reader_and_book(journal_storage)
+    tm = TransactionManagement(journal_storage)
+    for _ in range(2):
+        tm.check_out("1", "a1000")
+        tm.check_in("1", "a1000")
+    # Validate the first 3 transactions went into a segment
+    segment = tmp_path / "transactions.000001.jsonl"
+    assert segment.read_text().count("\n") == 3
+    assert (tmp_path / "transactions.jsonl").read_text().count("\n") == 1
+    snapshot = json.loads((tmp_path / "books.json").read_text())
+    assert snapshot["a1000"]["available"] is False
+    # Validate a reload reads the tail only and gets the same state
+    journal_storage.load_data()
+    assert len(journal_storage.data["transactions"]) == 1
+    assert journal_storage.available_books() == ["a1000"]
+    assert journal_storage.data["users"]["1"]["borrowed"] == []
+    history = journal_storage.find_transactions("user_id", "1")
+    assert [item["action"] for item in history] == [
+        "checkout",
+        "checkin",
+    ] * 2
+    assert journal_storage.transaction_columns().count(action="checkin") == 2
+    assert len(list(iter_saved_transactions())) == 4
+
+    # Validate a manual checkpoint starts the next segment
+    tm.check_out("1", "a1000")
+    journal_storage.checkpoint()
+    assert (tmp_path / "transactions.000002.jsonl").exists()
+    assert journal_storage.data["transactions"] == []
+    assert len(journal_storage.transaction_history()) == 5
+    assert len(journal_storage.find_transactions("isbn", "a1000")) == 5
+
+
+def test_save_is_logged_before_files(storage, tmp_path) -> None:
+    """Test that a save is synced to the write-ahead log, then applied."""
+    storage.data["books"]["a1000"] = Book(title="t", available=True)
+    storage.mark_dirty("books", "a1000")
+    storage.save_data()
+    lines = (tmp_path / "wal.jsonl").read_text().splitlines()
+    entry, mark = [json.loads(line) for line in lines]
+    # Validate
+    assert entry == {
+        "books": {
+            "set": {"a1000": {"title": "t", "available": True}},
+            "delete": [],
+        }
+    }
+    assert mark == {"applied": 0}
+    assert storage.wal.syncs == 1
+
+
+def test_recover_unapplied_save(storage, tmp_path, open_storage) -> None:
+    """Test that loading redoes a logged save which wasn't applied."""
+    storage.data["books"]["a1000"] = Book(title="t", available=True)
+    storage.mark_dirty("books", "a1000")
+    storage.data["transactions"].append(Transaction(user_id="1"))
+    # the process dies right after logging the save
+    storage.wal.commit(storage._log_entry(storage.changed_datasets()))
+    storage = open_storage(journal=False)
+    # Validate
+    assert storage.data["books"]["a1000"]["title"] == "t"
+    assert storage.find_transactions("user_id", "1") == [{"user_id": "1"}]
+    assert json.loads((tmp_path / "books.json").read_text()) == {
+        "a1000": {"title": "t", "available": True}
+    }
+    assert (tmp_path / "wal.jsonl").read_text() == ""
+
+
+def save_unit_of_work(step: int) -> None:
+    """Adds a book and a user and checks out a book in one unit of work,
+    killing the process at its step-th file system call"""
+    calls = itertools.count(1)
+    write = os.write
+
+    def crash_before(function):
+        def wrapper(*args, **kwargs):
+            if next(calls) == step:
+                # a write is cut in the middle
+                if function is write:
+                    write(args[0], args[1][: len(args[1]) // 2])
+                os._exit(1)
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    for owner, name in [
+        (os, "write"),
+        (os, "fsync"),
+        (os, "replace"),
+        (Storage, "_write_file"),
+        (Storage, "_append_journal"),
+    ]:
+        setattr(owner, name, crash_before(getattr(owner, name)))
+
+    storage = Storage()
+    with storage.atomic():
+        storage.data["books"]["a2000"] = Book(title="new", available=True)
+        storage.mark_dirty("books", "a2000")
+        storage.data["users"]["2"] = User(name="bob", email="b@example.com")
+        storage.mark_dirty("users", "2")
+        TransactionManagement(storage)._check_out("1", "a1000")
+
+
+def test_crash_at_each_step(tmp_path, open_storage) -> None:
+    """Test that killing the process at any step of a save leaves, once
+    loaded again, either all of the unit of work or none of it."""
+    context = multiprocessing.get_context("fork")
+    outcomes = []
+    for step in range(1, 50):
+        data_dir = tmp_path / f"step{step}"
+        data_dir.mkdir()
+        journal_storage = open_storage(data_dir=data_dir)
+        add_reader_and_book(journal_storage)
+        process = context.Process(target=save_unit_of_work, args=(step,))
+        process.start()
+        process.join(timeout=30)
+
+        # Validate, loading twice to check recovery is done once for all
+        for _ in range(2):
+            storage = open_storage(data_dir=data_dir)
+            done = "a2000" in storage.data["books"]
+            assert ("2" in storage.data["users"]) is done
+            assert len(storage.data["transactions"]) == int(done)
+            assert storage.available_books() == (
+                ["a2000"] if done else ["a1000"]
+            )
+            borrowed = storage.data["users"]["1"].get("borrowed") or []
+            assert borrowed == (["a1000"] if done else [])
+        outcomes.append(done)
+        if process.exitcode == 0:
+            break
+    # Validate every step was tried, and crashes hit both sides of it
+    assert process.exitcode == 0 and all(outcomes[-1:])
+    assert len(outcomes) > 5
+    assert not all(outcomes) and any(outcomes[:-1])
+
+
+def test_crash_then_checkpoint_in_other_process(
+    tmp_path, monkeypatch, open_storage
+) -> None:
+    """Test that a process checkpointing after another one crashed at any
+    step of a save keeps either all of that unit of work or none of it,
+    along with its own checkout."""
+    monkeypatch.setattr("script.storage.SNAPSHOT_INTERVAL", 1)
+    context = multiprocessing.get_context("fork")
+    outcomes = []
+    for step in range(1, 50):
+        data_dir = tmp_path / f"step{step}"
+        data_dir.mkdir()
+        storage = open_storage(data_dir=data_dir)
+        add_reader_and_book(storage)
+        storage.data["books"]["a3000"] = Book(title="other", available=True)
+        storage.mark_dirty("books", "a3000")
+        storage.save_data()
+        process = context.Process(target=save_unit_of_work, args=(step,))
+        process.start()
+        process.join(timeout=30)
+        # Execute: a checkout of this process, which checkpoints
+        with storage.atomic():
+            TransactionManagement(storage)._check_out("1", "a3000")
+
+        # Validate, once loaded again
+        storage = open_storage(data_dir=data_dir)
+        done = "a2000" in storage.data["books"]
+        assert ("2" in storage.data["users"]) is done
+        assert storage.available_books() == (
+            ["a2000"] if done else ["a1000"]
+        )
+        borrowed = storage.data["users"]["1"].get("borrowed") or []
+        assert borrowed == (["a1000", "a3000"] if done else ["a3000"])
+        history = [item["isbn"] for item in storage.transaction_history()]
+        assert history == (["a1000", "a3000"] if done else ["a3000"])
+        outcomes.append(done)
+        if process.exitcode == 0:
+            break
+    # Validate every step was tried, and crashes hit both sides of it
+    assert process.exitcode == 0 and all(outcomes[-1:])
+    assert not all(outcomes) and any(outcomes[:-1])
+
+
+def test_concurrent_saves_merged(open_storage) -> None:
+    """Test that a save made with stale data merges the changes saved by
+    another process meanwhile instead of writing over them."""
+    first = open_storage()
+    second = open_storage()
+    first.data["books"]["a1000"] = Book(title="first", available=True)
+    first.mark_dirty("books", "a1000")
+    first.data["transactions"].append(Transaction(user_id="1"))
+    first.save_data()
+    # the second one saves without having seen the first one's changes
+    second.data["books"]["a2000"] = Book(title="second", available=True)
+    second.mark_dirty("books", "a2000")
+    second.data["transactions"].append(Transaction(user_id="2"))
+    second.save_data()
+    # Validate
+    assert sorted(second.data["books"]) == ["a1000", "a2000"]
+    storage = open_storage()
+    assert sorted(storage.data["books"]) == ["a1000", "a2000"]
+    assert [item["user_id"] for item in storage.data["transactions"]] == [
+        "1",
+        "2",
+    ]
+    assert storage._versions == {"books": 2, "transactions": 2}
+
+
+def check_out_and_in(user_id: str, rounds: int, queue) -> None:
+    """Checks books out and in again, reporting the transactions made"""
+    Storage._instance = None
+    tm = TransactionManagement(Storage())
+    made = 0
+    for i in range(rounds):
+        isbn = f"a100{i % 3}"
+        # another clerk may hold the book, then this round is skipped
+        ((_, _, error),) = tm.check_out_many([(user_id, isbn)])
+        if error is None:
+            ((_, _, error),) = tm.check_in_many([(user_id, isbn)])
+            assert error is None
+            made += 2
+    queue.put(made)
+
+
+def add_shared_books(storage) -> None:
+    """Adds the books a1000 to a1002 and the users 1 to 4 who share them"""
+    for i in range(3):
+        storage.data["books"][f"a100{i}"] = Book(title="t", available=True)
+        storage.mark_dirty("books", f"a100{i}")
+    for user_id in "1234":
+        storage.data["users"][user_id] = User(name="u", email=f"{user_id}@x.y")
+        storage.mark_dirty("users", user_id)
+    storage.save_data()
+
+
+def assert_checked_in_turns(storage, made: int) -> None:
+    """Checks each shared book was checked out and in again in turns, by
+    the made transactions"""
+    history = list(storage.transaction_history())
+    assert made > 0 and len(history) == made
+    for isbn in ["a1000", "a1001", "a1002"]:
+        actions = [item["action"] for item in history if item["isbn"] == isbn]
+        # a checkout is always followed by its checkin, never another one
+        assert actions == ["checkout", "checkin"] * (len(actions) // 2)
+    assert storage.available_books() == ["a1000", "a1001", "a1002"]
+    assert all(
+        not user.get("borrowed") for user in storage.data["users"].values()
+    )
+
+
+def test_concurrent_checkouts_not_lost(monkeypatch, open_storage) -> None:
+    """Test clerks in several processes checking out the same books: no
+    transaction is lost and no book is ever checked out twice."""
+    monkeypatch.setattr("script.storage.SNAPSHOT_INTERVAL", 50)
+    storage = open_storage()
+    add_shared_books(storage)
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    processes = [
+        context.Process(target=check_out_and_in, args=(user_id, 40, queue))
+        for user_id in "1234"
+    ]
+    for process in processes:
+        process.start()
+    made = sum(queue.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join()
+    # Validate
+    storage = open_storage()
+    assert_checked_in_turns(storage, made)
+
+
+def test_threaded_checkouts(monkeypatch, open_storage) -> None:
+    """Test clerk sessions in threads sharing one storage, with lookups
+    running meanwhile: no book is ever checked out twice."""
+    monkeypatch.setattr("script.storage.SNAPSHOT_INTERVAL", 50)
+    storage = open_storage()
+    add_shared_books(storage)
+    tm = TransactionManagement(storage)
+    # isbns checked out at the moment, as told by the clerks
+    held, held_lock = set(), threading.Lock()
+    made, twice, failed = [], [], []
+
+    def clerk(user_id):
+        for i in range(60):
+            isbn = f"a100{i % 3}"
+            ((_, _, error),) = tm.check_out_many([(user_id, isbn)])
+            if error is not None:
+                continue
+            with held_lock:
+                if isbn in held:
+                    twice.append(isbn)
+                held.add(isbn)
+            storage.find_transactions("user_id", user_id)
+            # dropped before the checkin, after which it is free again
+            with held_lock:
+                held.discard(isbn)
+            ((_, _, error),) = tm.check_in_many([(user_id, isbn)])
+            made.append(2 if error is None else 1)
+
+    def lookups():
+        try:
+            for _ in range(200):
+                storage.available_books()
+                storage.find_transactions("isbn", "a1000")
+                storage.search_books("t")
+        except Exception as error:
+            failed.append(error)
+
+    threads = [threading.Thread(target=clerk, args=(u,)) for u in "1234"]
+    threads += [threading.Thread(target=lookups) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    # Validate
+    assert not twice and not failed
+    assert_checked_in_turns(storage, sum(made))
+    assert_checked_in_turns(open_storage(), sum(made))
+
+
+def test_threaded_saves_share_syncs(monkeypatch, open_storage) -> None:
+    """Test saves of threads at the same time share the write-ahead log
+    fsyncs and file writes, and all get on the disk."""
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        # a slow disk, so saves pile up behind the running fsync
+        time.sleep(0.01)
+        fsync(fd)
+
+    monkeypatch.setattr("script.wal.os.fsync", slow_fsync)
+    storage = open_storage()
+
+    def add_books(thread):
+        for i in range(10):
+            with storage.atomic():
+                storage.data["books"][f"a{thread}{i:03d}"] = Book(title="t")
+                storage.mark_dirty("books", f"a{thread}{i:03d}")
+
+    threads = [threading.Thread(target=add_books, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Validate
+    assert storage.wal.syncs < 80 // 2
+    storage = open_storage()
+    assert len(storage.data["books"]) == 80
+
+
+def test_user_ids_start_after_existing(storage) -> None:
+    """Test the id counter starts after the ids already in use."""
+    storage.data["users"]["7"] = {"name": "x", "email": "x@y.com"}
+    assert storage.allocate_user_ids() == ["8"]
+    assert storage.allocate_user_ids(count=3) == ["9", "10", "11"]
+
+
+def test_user_ids_persist(storage, open_storage) -> None:
+    """Test the id counter survives a new storage instance."""
+    storage.allocate_user_ids(count=5)
+    storage = open_storage(journal=False)
+    assert storage.allocate_user_ids() == ["6"]
+
+
+def allocate_in_process(queue) -> None:
+    """Allocates user ids one by one and reports them to the queue"""
+    storage = Storage()
+    queue.put([storage.allocate_user_ids()[0] for _ in range(50)])
+
+
+def test_user_ids_unique_across_processes(storage) -> None:
+    """Test processes allocating at the same time never share an id."""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    processes = [
+        context.Process(target=allocate_in_process, args=(queue,))
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    user_ids = [uid for _ in processes for uid in queue.get(timeout=30)]
+    for process in processes:
+        process.join()
+    # Validate
+    assert len(user_ids) == 200
+    assert sorted(map(int, user_ids)) == list(range(1, 201))
+
+
+def add_book_in_process(isbn: str) -> None:
+    """Adds a book from another storage instance, saving it"""
+    Storage._instance = None
+    storage = Storage()
+    with storage.atomic():
+        storage.data["books"][isbn] = Book(title="t", available=True)
+        storage.mark_dirty("books", isbn)
+
+
+def test_imports_after_another_process_saved(tmp_path, open_storage) -> None:
+    """Test bulk imports keep their rows when another process saved since
+    the data was read, which replaces the datasets on refresh."""
+    storage = open_storage()
+    add_shared_books(storage)
+    context = multiprocessing.get_context("fork")
+    (tmp_path / "books.csv").write_text(
+        "isbn,title,author\nb1000,t,a\nb1001,t,a\n"
+    )
+    (tmp_path / "users.csv").write_text("name,email\nv,v@x.y\nw,w@x.y\n")
+
+    def save_in_other_process(isbn):
+        process = context.Process(target=add_book_in_process, args=(isbn,))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+
+    # Execute
+    save_in_other_process("c1000")
+    books = BookManagement(storage).import_books(str(tmp_path / "books.csv"))
+    save_in_other_process("c1001")
+    users = UserManagement(storage).create_users(str(tmp_path / "users.csv"))
+    # Validate
+    assert books["added"] == 2 and users["added"] == 2
+    storage = open_storage()
+    assert {"b1000", "b1001", "c1000", "c1001"} <= set(storage.data["books"])
+    assert sorted(
+        user["email"] for user in storage.data["users"].values()
+    ) == ["1@x.y", "2@x.y", "3@x.y", "4@x.y", "v@x.y", "w@x.y"]
+
+
+def create_user_in_process(email: str) -> None:
+    """Creates a user from another storage instance, saving it"""
+    Storage._instance = None
+    UserManagement(Storage())._create_user("x", email)
+
+
+def test_create_users_checks_other_process_emails(
+    tmp_path, open_storage
+) -> None:
+    """Test bulk user creation rejects an email another process registered
+    after the data was read."""
+    storage = open_storage()
+    add_shared_books(storage)
+    (tmp_path / "users.csv").write_text("name,email\nv,v@x.y\nw,w@x.y\n")
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=create_user_in_process, args=("v@x.y",))
+    process.start()
+    process.join()
+    # Execute
+    summary = UserManagement(storage).create_users(str(tmp_path / "users.csv"))
+    # Validate
+    assert summary["added"] == 1
+    assert summary["errors"][0][0] == 2
+    storage = open_storage()
+    emails = [user["email"] for user in storage.data["users"].values()]
+    assert sorted(emails) == [
+        "1@x.y",
+        "2@x.y",
+        "3@x.y",
+        "4@x.y",
+        "v@x.y",
+        "w@x.y",
+    ]
+
+
+if __name__ == "__main__":
+    pass
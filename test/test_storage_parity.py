@@ -0,0 +1,307 @@
+"""
+Parity Test Script for the Storage backends:
+Runs the same manager operations against the json and the sqlite backend.
+"""
+
+import pytest
+from script.book import BookManagement
+from script.check import TransactionManagement
+from script.storage import Storage
+from script.user import UserManagement
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request):
+    """Fixture for the name of the backend under test."""
+    return request.param
+
+
+@pytest.fixture
+def storage(backend, open_storage):
+    """Fixture for a fresh Storage of each backend."""
+    return open_storage(backend=backend)
+
+
+def reopen(storage, backend, open_storage) -> Storage:
+    """Opens the same files again, as a new run of the program would"""
+    if getattr(storage, "connection", None) is not None:
+        storage.connection.close()
+    return open_storage(backend=backend)
+
+
+def test_backend_class(storage, backend) -> None:
+    """Test that the configured backend is the one instantiated."""
+    assert (
+        type(storage).__name__
+        == {
+            "json": "Storage",
+            "sqlite": "SQLiteStorage",
+        }[backend]
+    )
+
+
+def test_books_round_trip(storage, backend, open_storage) -> None:
+    """Test add, update and delete of books survive a reload."""
+    bm = BookManagement(storage)
+    bm.add_book("Book One", "Author One", "a10001")
+    bm.add_book("Book Two", "Author Two", "a10002")
+    bm.update_book("a10001", title="Book Uno")
+    bm.delete_book("a10002")
+    # Validate
+    storage = reopen(storage, backend, open_storage)
+    assert dict(storage.data["books"].items()) == {
+        "a10001": {
+            "title": "book uno",
+            "author": "author one",
+            "available": True,
+        }
+    }
+
+
+def test_users_round_trip(storage, backend, open_storage) -> None:
+    """Test create, update and delete of users survive a reload."""
+    um = UserManagement(storage)
+    um.create_user("Alice", "alice@example.com")
+    um.create_user("Bob", "bob@example.com")
+    um.update_user("1", name="Alice Smith")
+    um.delete_user("2")
+    # Validate
+    storage = reopen(storage, backend, open_storage)
+    assert dict(storage.data["users"].items()) == {
+        "1": {"name": "alice smith", "email": "alice@example.com"}
+    }
+
+
+def test_checkout_round_trip(storage, backend, open_storage) -> None:
+    """Test checkout and checkin survive a reload."""
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    BookManagement(storage).add_book("Book One", "Author One", "a10001")
+    tm = TransactionManagement(storage)
+    tm.check_out("1", "a10001")
+    # Validate state after checkout
+    storage = reopen(storage, backend, open_storage)
+    assert storage.data["books"]["a10001"]["available"] is False
+    assert storage.data["users"]["1"]["borrowed"] == ["a10001"]
+
+    tm = TransactionManagement(storage)
+    tm.check_in("1", "a10001")
+    # Validate state after checkin
+    storage = reopen(storage, backend, open_storage)
+    assert storage.data["books"]["a10001"]["available"] is True
+    assert storage.data["users"]["1"]["borrowed"] == []
+    actions = [item["action"] for item in storage.data["transactions"]]
+    assert actions == ["checkout", "checkin"]
+    assert len(storage.data["transactions"]) == 2
+    assert storage.data["transactions"][-1]["action"] == "checkin"
+    assert storage.find_transactions("user_id", "1") == list(
+        storage.data["transactions"]
+    )
+    assert storage.find_transactions("isbn", "a99999") == []
+
+
+def test_batch_checkout(storage, backend, open_storage) -> None:
+    """Test a batch checkout is applied whole or not at all."""
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    bm = BookManagement(storage)
+    bm.add_book("Book One", "Author One", "a10001")
+    bm.add_book("Book Two", "Author Two", "a10002")
+    tm = TransactionManagement(storage)
+    # the unknown book fails the whole batch
+    results = tm.check_out_many([("1", "a10001"), ("1", "a99999")])
+    assert [error is None for _, _, error in results] == [False, False]
+    assert storage.data["books"]["a10001"]["available"] is True
+    assert len(storage.data["transactions"]) == 0
+    assert storage.changed_datasets() == []
+
+    tm.check_out_many([("1", "a10001"), ("1", "a10002")])
+    storage = reopen(storage, backend, open_storage)
+    assert storage.data["users"]["1"]["borrowed"] == ["a10001", "a10002"]
+    assert storage.available_books() == []
+    assert len(storage.data["transactions"]) == 2
+
+
+def test_checkpoint(storage, backend, open_storage) -> None:
+    """Test the state and the history survive a checkpoint and a reload."""
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    BookManagement(storage).add_book("Book One", "Author One", "a10001")
+    tm = TransactionManagement(storage)
+    tm.check_out("1", "a10001")
+    tm.check_in("1", "a10001")
+    tm.check_out("1", "a10001")
+    storage.checkpoint()
+    tm.check_in("1", "a10001")
+    # Validate
+    storage = reopen(storage, backend, open_storage)
+    assert storage.available_books() == ["a10001"]
+    assert storage.data["users"]["1"]["borrowed"] == []
+    history = storage.find_transactions("isbn", "a10001")
+    assert [item["action"] for item in history] == [
+        "checkout",
+        "checkin",
+    ] * 2
+
+
+def test_import_books(storage, backend, tmp_path, open_storage) -> None:
+    """Test imported books are indexed and saved in one go."""
+    BookManagement(storage).add_book("Book One", "Author One", "a10001")
+    feed = tmp_path / "feed.csv"
+    feed.write_text(
+        "isbn,title,author\n"
+        "a10001,Book One,Author One\n"
+        "a20001,Deep Mountain,Sike Lou\n"
+        "a20002,Mountain Air,Sike Lou\n"
+    )
+    summary = BookManagement(storage).import_books(str(feed))
+    assert (summary["added"], summary["rejected"]) == (2, 1)
+    assert storage.changed_datasets() == []
+    assert storage.search_books("mountain") == ["a20001", "a20002"]
+    storage = reopen(storage, backend, open_storage)
+    assert storage.search_books("lou", field="author") == ["a20001", "a20002"]
+    assert storage.count_available_books() == 3
+
+
+def test_create_users(storage, backend, tmp_path, open_storage) -> None:
+    """Test users created in bulk get a block of ids and are saved."""
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    feed = tmp_path / "users.csv"
+    feed.write_text(
+        "name,email\n"
+        "Bob,bob@example.com\n"
+        "Alice Two,alice@example.com\n"
+        "Carol,carol@example.com\n"
+    )
+    summary = UserManagement(storage).create_users(str(feed))
+    assert (summary["added"], summary["rejected"]) == (2, 1)
+    assert storage.changed_datasets() == []
+    assert storage.find_user_by_email("carol@example.com") == "3"
+    storage = reopen(storage, backend, open_storage)
+    assert storage.find_users_by_name("bob") == ["2"]
+    assert storage.allocate_user_ids() == ["4"]
+
+
+def test_transaction_columns(storage) -> None:
+    """Test the columnar transactions across saves and appends."""
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    BookManagement(storage).add_book("Book One", "Author One", "a10001")
+    tm = TransactionManagement(storage)
+    tm.check_out("1", "a10001")
+    assert storage.transaction_columns().count(user_id="1") == 1
+    tm.check_in("1", "a10001")
+    columns = storage.transaction_columns()
+    assert columns.count(isbn="a10001") == 2
+    assert columns.counts_by("action") == {"checkout": 1, "checkin": 1}
+
+
+def test_available_books(storage) -> None:
+    """Test the available books follow checkouts, checkins and deletes."""
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    bm = BookManagement(storage)
+    for isbn in ["a10001", "a10002", "a10003"]:
+        bm.add_book("Book", "Author", isbn)
+    tm = TransactionManagement(storage)
+    tm.check_out("1", "a10001")
+    tm.check_out("1", "a10002")
+    tm.check_in("1", "a10002")
+    bm.delete_book("a10003")
+    # Validate
+    assert storage.available_books() == ["a10002"]
+    assert storage.count_available_books() == 1
+
+
+def test_listing_output(storage, capsys) -> None:
+    """Test the listings print the same data on every backend."""
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    BookManagement(storage).add_book("Book One", "Author One", "a10001")
+    tm = TransactionManagement(storage)
+    tm.check_out("1", "a10001")
+    capsys.readouterr()
+    # Execute
+    BookManagement(storage).list_books()
+    tm.list_transactions("1")
+    tm.check_available_books()
+    # Validate
+    out = capsys.readouterr().out
+    assert "book one" in out
+    assert "checkout" in out
+
+
+def test_unsaved_changes_tracked(storage) -> None:
+    """Test changed datasets are reported until saved."""
+    storage.data["books"]["a10001"] = {"title": "t", "available": True}
+    storage.mark_dirty("books", "a10001")
+    storage.data["transactions"].append({"user_id": "1", "isbn": "a10001"})
+    assert set(storage.changed_datasets()) == {"books", "transactions"}
+    storage.save_data()
+    assert storage.changed_datasets() == []
+
+
+def test_user_lookups(storage) -> None:
+    """Test the email and name lookups follow creates, updates, deletes."""
+    um = UserManagement(storage)
+    um.create_user("Alice", "alice@example.com")
+    um.create_user("Alice", "alice2@example.com")
+    um.create_user("Bob", "bob@example.com")
+    storage.save_data()
+    um.update_user("3", email="robert@example.com")
+    um.delete_user("2")
+    # Validate
+    assert storage.find_user_by_email("ALICE@example.com") == "1"
+    assert storage.find_user_by_email("bob@example.com") is None
+    assert storage.find_user_by_email("robert@example.com") == "3"
+    assert storage.find_users_by_name("alice") == ["1"]
+    um.create_user("Alice", "alice3@example.com")
+    assert storage.find_users_by_name("Alice") == ["1", "4"]
+
+
+def test_book_search(storage) -> None:
+    """Test the title and author search follow adds, updates, deletes."""
+    bm = BookManagement(storage)
+    bm.add_book("Deep in Mountain", "Sike Lou", "a10001")
+    bm.add_book("Deep Sea", "Sike Lou", "a10002")
+    bm.add_book("Mountain Air", "Kin Lou", "a10003")
+    bm.update_book("a10002", title="Shallow Sea")
+    bm.delete_book("a10003")
+    # Validate
+    assert storage.search_books("deep") == ["a10001"]
+    assert storage.search_books("MOUNTAIN deep") == ["a10001"]
+    assert storage.search_books("sea") == ["a10002"]
+    assert storage.search_books("mount*") == ["a10001"]
+    assert storage.search_books("lou", field="author") == [
+        "a10001",
+        "a10002",
+    ]
+    assert storage.search_books("deep air") == []
+
+
+def test_user_ids_not_reused(storage) -> None:
+    """Test a deleted user's id is not handed out again."""
+    um = UserManagement(storage)
+    um.create_user("Alice", "alice@example.com")
+    um.create_user("Bob", "bob@example.com")
+    um.delete_user("2")
+    um.create_user("Carol", "carol@example.com")
+    # Validate
+    assert sorted(storage.data["users"].keys()) == ["1", "3"]
+
+
+def test_sqlite_imports_json_files(open_storage) -> None:
+    """Test the sqlite backend starts from the existing json files."""
+    storage = open_storage()
+    UserManagement(storage).create_user("Alice", "alice@example.com")
+    BookManagement(storage).add_book("Book One", "Author One", "a10001")
+    tm = TransactionManagement(storage)
+    tm.check_out("1", "a10001")
+    # archived transactions are imported too
+    storage.checkpoint()
+    tm.check_in("1", "a10001")
+    tm.check_out("1", "a10001")
+    # Execute
+    storage = open_storage(backend="sqlite")
+    # Validate
+    assert storage.data["users"]["1"]["borrowed"] == ["a10001"]
+    assert storage.data["books"]["a10001"]["available"] is False
+    assert len(storage.data["transactions"]) == 3
+
+
+if __name__ == "__main__":
+    pass
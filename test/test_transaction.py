@@ -3,20 +3,59 @@ Test Script for TransactionManagement Subsystem:
 `sample only due to development time constraints`
 """
 
-import pytest
+import copy
+from contextlib import contextmanager
 from datetime import datetime
+
+import pytest
 from script.check import TransactionManagement
 
+
 @pytest.fixture
 def mock_storage():
     """Fixture for creating a mock Storage class."""
     class MockStorage:
         def __init__(self):
             self.data = {"transactions": [], "users": {}, "books": {}}
+            self.saves = 0
 
         def save_data(self):
+            self.saves += 1
+
+        @contextmanager
+        def atomic(self):
+            saved = copy.deepcopy(self.data)
+            try:
+                yield self
+            except BaseException:
+                self.data = saved
+                raise
+            self.saves += 1
+
+        @contextmanager
+        def reading(self):
+            yield self
+
+        def mark_dirty(self, name, key=None):
+            pass
+
+        def mark_derived(self, name, key):
             pass
 
+        def available_books(self):
+            return sorted(
+                isbn
+                for isbn, book in self.data["books"].items()
+                if book.get("available")
+            )
+
+        def find_transactions(self, field, value):
+            return [
+                transaction
+                for transaction in self.data["transactions"]
+                if transaction[field] == value
+            ]
+
         def validate_storage(self):
             pass
 
@@ -51,6 +90,77 @@ def test_check_in(mock_storage) -> None:
     # Availability should be True now
     assert mock_storage.data["books"]["b1000"]["available"]
 
+
+def test_check_out_many(mock_storage) -> None:
+    """Test for checking out a batch of books with a single save."""
+    tm = TransactionManagement(mock_storage)
+    # Prepare mock data
+    mock_storage.data["users"]["1"] = {
+        "name": "alice",
+        "email": "alice@example.com",
+    }
+    for isbn in ["b1000", "b1001", "b1002"]:
+        mock_storage.data["books"][isbn] = {"title": isbn, "available": True}
+    # Execute method
+    results = tm.check_out_many(
+        [("1", "b1000"), ("1", "b1001"), ("1", " B1002 ")]
+    )
+    # Validate
+    assert results == [
+        ("1", "b1000", None),
+        ("1", "b1001", None),
+        ("1", "b1002", None),
+    ]
+    assert mock_storage.saves == 1
+    assert mock_storage.data["users"]["1"]["borrowed"] == [
+        "b1000",
+        "b1001",
+        "b1002",
+    ]
+    assert len(mock_storage.data["transactions"]) == 3
+
+
+def test_check_out_many_failure_leaves_no_change(mock_storage) -> None:
+    """Test that a batch with a failing item applies nothing."""
+    tm = TransactionManagement(mock_storage)
+    # Prepare mock data
+    mock_storage.data["users"]["1"] = {
+        "name": "alice",
+        "email": "alice@example.com",
+    }
+    mock_storage.data["books"]["b1000"] = {
+        "title": "book 1",
+        "available": True,
+    }
+    # Execute method, the same book twice
+    results = tm.check_out_many([("1", "b1000"), ("1", "b1000")])
+    # Validate
+    assert results[0][2].startswith("Not applied")
+    assert results[1][2] == "Book with isbn: b1000 is not available"
+    assert mock_storage.data["books"]["b1000"]["available"]
+    assert "borrowed" not in mock_storage.data["users"]["1"]
+    assert mock_storage.data["transactions"] == []
+    assert mock_storage.saves == 0
+
+
+def test_check_in_many(mock_storage) -> None:
+    """Test for checking in a batch of books."""
+    tm = TransactionManagement(mock_storage)
+    # Prepare mock data
+    mock_storage.data["users"]["1"] = {
+        "name": "alice",
+        "email": "alice@example.com",
+        "borrowed": ["b1000", "b1001"],
+    }
+    for isbn in ["b1000", "b1001"]:
+        mock_storage.data["books"][isbn] = {"title": isbn, "available": False}
+    # Execute method
+    results = tm.check_in_many([("1", "b1000"), ("1", "b1001")])
+    # Validate
+    assert [error for _, _, error in results] == [None, None]
+    assert mock_storage.data["users"]["1"]["borrowed"] == []
+    assert mock_storage.data["books"]["b1001"]["available"]
+
 def test_list_transactions(mock_storage, capsys) -> None:
     """Test for listing transactions for a user."""
     tm = TransactionManagement(mock_storage)
@@ -68,6 +178,29 @@ def test_list_transactions(mock_storage, capsys) -> None:
     captured = capsys.readouterr()
     assert "all checkins and checkouts" in captured.out.lower()
 
+
+def test_list_book_transactions(mock_storage, capsys) -> None:
+    """Test for listing transactions for a book."""
+    tm = TransactionManagement(mock_storage)
+    # Prepare mock data
+    mock_storage.data["books"]["b1000"] = {
+        "title": "book 1",
+        "available": False,
+    }
+    mock_storage.data["transactions"].append(
+        {
+            "user_id": "1",
+            "isbn": "b1000",
+            "action": "checkout",
+            "timestamp": datetime.now().isoformat(),
+        }
+    )
+    # Execute method
+    tm.list_book_transactions("b1000")
+    # Validate
+    captured = capsys.readouterr()
+    assert "checkout" in captured.out.lower()
+
 def test_check_available_books(mock_storage, capsys) -> None:
     """Test for listing available books."""
     tm = TransactionManagement(mock_storage)
@@ -3,6 +3,8 @@ Test Script for UserManagement Subsystem:
 `sample only due to development time constraints`
 """
 
+from contextlib import contextmanager
+
 import pytest
 from script.user import UserManagement
 
@@ -14,9 +16,49 @@ def mock_storage():
     class MockStorage:
         def __init__(self):
             self.data = {"users": {}}
+            self.saves = 0
+            self.dirty = False
 
         def save_data(self):
-            pass
+            self.saves += 1
+
+        @contextmanager
+        def atomic(self):
+            yield self
+            # like Storage, a block without changes writes nothing
+            if self.dirty:
+                self.dirty = False
+                self.saves += 1
+
+        @contextmanager
+        def reading(self):
+            yield self
+
+        def mark_dirty(self, name, key=None):
+            self.dirty = True
+
+        def mark_dirty_many(self, name, keys):
+            self.dirty = True
+
+        def find_user_by_email(self, email):
+            for user_id, user_info in self.data["users"].items():
+                if user_info.get("email") == email:
+                    return user_id
+            return None
+
+        def allocate_user_ids(self, count=1):
+            user_ids = [
+                int(uid) for uid in self.data["users"] if uid.isdigit()
+            ]
+            first = max(user_ids, default=0) + 1
+            return [str(uid) for uid in range(first, first + count)]
+
+        def find_users_by_name(self, name):
+            return [
+                user_id
+                for user_id, user_info in self.data["users"].items()
+                if user_info.get("name") == name
+            ]
 
         def validate_storage(self):
             pass
@@ -82,6 +124,24 @@ def test_list_users(mock_storage, capsys) -> None:
     assert "alice" in captured.out.lower()
 
 
+def test_list_users_stop_paging(mock_storage, capsys, monkeypatch) -> None:
+    """Test for stopping a listing of users after the first page."""
+    um = UserManagement(mock_storage)
+    # Mock Data
+    for number in range(1, 4):
+        mock_storage.data["users"][str(number)] = {
+            "name": f"user {number}",
+            "email": f"user{number}@example.com",
+        }
+    monkeypatch.setattr("builtins.input", lambda prompt="": "q")
+    # Call method
+    shown = um.list_users(limit=2, interactive=True)
+    # Check only the first page got printed
+    captured = capsys.readouterr()
+    assert shown == 2
+    assert "user 3" not in captured.out
+
+
 def test_find_user(mock_storage, capsys) -> None:
     """Test for finding a user."""
     um = UserManagement(mock_storage)
@@ -97,5 +157,74 @@ def test_find_user(mock_storage, capsys) -> None:
     assert "alice".lower() in captured.out.lower()
 
 
+def test_create_user_duplicate_email(mock_storage, capsys) -> None:
+    """Test that a second user with the same email is rejected."""
+    um = UserManagement(mock_storage)
+    um.create_user("John Doe", "john.doe@example.com")
+    um.create_user("Jane Doe", "John.Doe@example.com")
+    # Validate only the first one got added
+    assert len(mock_storage.data["users"]) == 1
+    captured = capsys.readouterr()
+    assert "already exists" in captured.out.lower()
+
+
+def test_update_user_email(mock_storage) -> None:
+    """Test for updating the email of an existing user."""
+    um = UserManagement(mock_storage)
+    mock_storage.data["users"]["1"] = {
+        "name": "alice",
+        "email": "alice@example.com",
+    }
+    um.update_user("1", email="alice@example.org")
+    assert mock_storage.data["users"]["1"]["email"] == "alice@example.org"
+
+
+def test_create_users_from_csv(mock_storage, tmp_path) -> None:
+    """Test for creating users in bulk with duplicate emails rejected."""
+    um = UserManagement(mock_storage)
+    # Mock Data
+    mock_storage.data["users"]["1"] = {
+        "name": "alice",
+        "email": "alice@example.com",
+    }
+    feed = tmp_path / "users.csv"
+    feed.write_text(
+        "name,email\n"
+        "Bob,bob@example.com\n"
+        "Alice Two,ALICE@example.com\n"
+        "Carol,carol@example\n"
+        "Bob Again, Bob@Example.com\n"
+        "Dave,dave@example.com\n"
+    )
+    # Execute method
+    summary = um.create_users(str(feed))
+    # Validate
+    assert (summary["added"], summary["rejected"]) == (2, 3)
+    assert summary["errors"] == [
+        (3, "User with this email already exists"),
+        (4, "Invalid email format"),
+        (5, "Duplicate email of line 2"),
+    ]
+    assert mock_storage.data["users"]["2"] == {
+        "name": "bob",
+        "email": "bob@example.com",
+    }
+    assert mock_storage.data["users"]["3"]["name"] == "dave"
+    assert mock_storage.saves == 1
+
+
+def test_create_users_all_rejected(mock_storage, tmp_path) -> None:
+    """Test that nothing is saved when no row is valid."""
+    um = UserManagement(mock_storage)
+    feed = tmp_path / "users.csv"
+    feed.write_text("name,email\nBob!,bob@example.com\n")
+    # Execute method
+    summary = um.create_users(str(feed))
+    # Validate
+    assert summary["errors"] == [(2, "Invalid name format")]
+    assert mock_storage.data["users"] == {}
+    assert mock_storage.saves == 0
+
+
 if __name__ == "__main__":
     pass
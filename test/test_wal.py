@@ -0,0 +1,63 @@
+"""
+Test Script for the write-ahead log
+"""
+
+import os
+import threading
+import time
+
+from script.storage import iter_journal
+from script.wal import WriteAheadLog
+
+
+def test_commit_and_mark(tmp_path) -> None:
+    """Test entries and their applied marks are appended in order."""
+    wal = WriteAheadLog(str(tmp_path / "wal.jsonl"))
+    first = wal.commit({"books": {"set": {}}})
+    wal.mark_applied(first)
+    second = wal.commit({"users": {"set": {}}})
+    # Validate
+    items = [item for item, _ in iter_journal(wal.path)]
+    assert items == [
+        {"books": {"set": {}}},
+        {"applied": first},
+        {"users": {"set": {}}},
+    ]
+    assert first == 0 and second == wal.size() - len('{"users":{"set":{}}}\n')
+    assert wal.syncs == 2
+
+
+def test_group_commit(tmp_path, monkeypatch) -> None:
+    """Test that commits made at the same time share their fsyncs."""
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        # a slow disk, so commits pile up behind the running fsync
+        time.sleep(0.01)
+        fsync(fd)
+
+    monkeypatch.setattr("script.wal.os.fsync", slow_fsync)
+    wal = WriteAheadLog(str(tmp_path / "wal.jsonl"))
+
+    def commit_many():
+        for i in range(20):
+            wal.commit({"n": i})
+
+    threads = [threading.Thread(target=commit_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Validate
+    assert len(list(iter_journal(wal.path))) == 160
+    assert wal.syncs < 160 // 2
+
+
+def test_reset(tmp_path) -> None:
+    """Test the log is emptied, and written again from the start."""
+    wal = WriteAheadLog(str(tmp_path / "wal.jsonl"))
+    wal.commit({"n": 1})
+    wal.reset()
+    assert os.path.getsize(wal.path) == 0
+    assert wal.commit({"n": 2}) == 0
+    assert [item for item, _ in iter_journal(wal.path)] == [{"n": 2}]